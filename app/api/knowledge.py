@@ -1,49 +1,104 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from app.services.knowledge_service import KnowledgeService
 from app.core.config import settings
-from typing import Dict
+from app.core.metrics import metrics
+from app.core.registry import registry
+from typing import Dict, Optional
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
-knowledge_service = KnowledgeService()
+knowledge_service: KnowledgeService = registry.acquire("knowledge_service")
+
+def _cached_topic_response(request: Request, topic: str) -> Response:
+    """Serve a topic's pre-serialized JSON, answering 304 when the client's ETag is current"""
+    body, etag = knowledge_service.render_topic(topic)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @router.get("/query")
+@metrics.traced("knowledge")
 async def query_knowledge(query: str):
     """Query the knowledge base"""
     try:
-        result = await knowledge_service.query_knowledge_base(query)
+        with metrics.span("knowledge"):
+            result = await knowledge_service.query_knowledge_base(query)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/search")
+async def search_knowledge(request: Request, name: Optional[str] = None, category: Optional[str] = None,
+                           limit: Optional[int] = None):
+    """
+    Records matching every filter given. Numeric fields are filtered with
+    ``min_<field>`` / ``max_<field>``, e.g. ``/search?category=desserts&max_price=8``
+    or ``/search?min_bedrooms=2&max_price=300000``
+    """
+    ranges = {}
+    for field in knowledge_service.index.numeric_fields:
+        low, high = request.query_params.get(f"min_{field}"), request.query_params.get(f"max_{field}")
+        if low is not None or high is not None:
+            try:
+                ranges[field] = (float(low) if low is not None else None, float(high) if high is not None else None)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"min_{field} and max_{field} must be numbers")
+    query = knowledge_service.build_query(name, category, ranges)
+    if not query:
+        raise HTTPException(status_code=400, detail="Give at least one of name, category or a min_/max_ filter")
+    return knowledge_service.search(query, limit)
+
+@router.get("/semantic")
+async def semantic_search(query: str, top_k: Optional[int] = None):
+    """Knowledge base entries closest in meaning to the query, with similarity scores"""
+    return {"matches": await knowledge_service.semantic_search(query, top_k)}
+
+@router.get("/vectors")
+async def get_vector_stats():
+    """Embedded entries and vector index size"""
+    return knowledge_service.retriever.stats()
+
+@router.get("/complete")
+async def complete_name(prefix: str, limit: int = 10):
+    """Item names starting with a prefix, for autocomplete"""
+    return {"names": knowledge_service.index.complete(prefix, limit)}
+
 @router.get("/business-type")
 async def get_business_type():
     """Get the current business type"""
     return {"business_type": settings.BUSINESS_TYPE}
 
 @router.get("/menu")
-async def get_menu():
+async def get_menu(request: Request):
     """Get the menu (for restaurant business type)"""
     if settings.BUSINESS_TYPE != "restaurant":
         raise HTTPException(status_code=400, detail="This endpoint is only available for restaurant business type")
     
     try:
-        result = await knowledge_service.query_knowledge_base("menu")
-        return result
+        return _cached_topic_response(request, "menu")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/properties")
-async def get_properties():
+async def get_properties(request: Request):
     """Get the properties (for real estate business type)"""
     if settings.BUSINESS_TYPE != "real_estate":
         raise HTTPException(status_code=400, detail="This endpoint is only available for real estate business type")
     
     try:
-        result = await knowledge_service.query_knowledge_base("properties")
-        return result
+        return _cached_topic_response(request, "properties")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cache")
+async def get_cache_stats():
+    """Response cache hit/miss counters and the current knowledge base version"""
+    return {"version": knowledge_service.version, **knowledge_service.response_cache.stats()}
+
+@router.get("/store")
+async def get_store_stats():
+    """Stored update sequence, snapshot progress and reloads picked up from other workers"""
+    return knowledge_service.stats()
+
 @router.post("/update")
 async def update_knowledge(data: Dict = Body(...)):
     """
@@ -1,20 +1,20 @@
 from fastapi import APIRouter, Request, HTTPException, Response, Form
 from twilio.twiml.messaging_response import MessagingResponse
-from app.services.conversation_manager import ConversationManager
+from app.services.conversation_manager import conversation_manager
 from app.services.language_service import LanguageService
 from app.core.config import settings
+from app.core.executor import ExecutorSaturatedError
+from app.core.metrics import metrics
 import logging
 from typing import Optional, Dict, Any, List
 import re
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Handlers and formatting are set up once by app.core.log
 logger = logging.getLogger("SMSService")
 
 router = APIRouter(prefix="/sms", tags=["sms"])
-conversation_manager = ConversationManager()
 language_service = LanguageService()
+conversation_manager.add_end_listener(language_service.forget_session)
 
 def normalize_phone_number(phone: str) -> str:
     """
@@ -43,6 +43,7 @@ def validate_twilio_request(request: Request) -> bool:
         return False
 
 @router.post("/")
+@metrics.traced("sms")
 async def handle_sms(
     request: Request,
     Body: Optional[str] = Form(None),
@@ -54,60 +55,65 @@ async def handle_sms(
         try:
             form_data = await request.form()
         except Exception as e:
-            logger.warning(f"Could not parse form data: {str(e)}")
+            logger.warning("Could not parse form data: %s", e)
             if Body and From:
                 form_data = {"Body": Body, "From": From}
         
         message_body = (form_data.get("Body") or "").strip()
         from_number = normalize_phone_number(form_data.get("From") or "")
         
-        logger.info(f"Received request with data: {form_data}")
-        logger.info(f"Normalized phone number: {from_number}")
-        
         if not message_body or not from_number:
-            logger.warning(f"Missing required fields. Body: {message_body}, From: {from_number}")
+            logger.warning("Missing required fields", extra={"body": message_body, "from_number": from_number})
             raise HTTPException(status_code=400, detail="Missing required fields: Body and From")
         
-        logger.info(f"Processing SMS from {from_number}: {message_body}")
+        # Lazy, redacted fields rather than the raw form: numbers and texts never reach the log as-is
+        logger.info("Processing SMS", extra={"from_number": from_number, "body": message_body})
         
         session_id = from_number
         
-        # Create a new conversation if one doesn't exist for this sender
-        if not conversation_manager.get_conversation(session_id):
-            logger.info(f"Creating new conversation for {from_number}")
-            conversation = conversation_manager.create_conversation(settings.BUSINESS_TYPE, session_id)
-        else:
-            conversation = conversation_manager.get_conversation(session_id)
-            logger.info(f"Retrieved existing conversation for {from_number}")
-        
-        # Log the incoming SMS message
-        conversation_manager.add_message(session_id, "user", message_body)
-        conversation_history = conversation_manager.get_conversation_history(session_id)
-        logger.info(f"Current conversation history: {conversation_history}")
-        
-        # Generate an AI response using the language service
-        ai_response = await language_service.generate_response(message_body, conversation_history)
-        
-        # Analyze sentiment and update the conversation context
-        sentiment = await language_service.analyze_sentiment(message_body)
-        conversation_manager.update_context(session_id, "sentiment", sentiment)
-        
-        # Log the AI-generated response
-        conversation_manager.add_message(session_id, "assistant", ai_response)
+        # Load the sender's conversation (or start one) once for the whole turn
+        with conversation_manager.turn(session_id, settings.BUSINESS_TYPE) as conversation:
+            # Log the incoming SMS message
+            with metrics.span("history"):
+                conversation.add_message("user", message_body)
+                conversation_history = conversation_manager.recent_history(conversation)
+            logger.debug("Conversation has %d messages", len(conversation.log), extra={"session_id": session_id})
+            
+            # Generate an AI response using the language service
+            try:
+                ai_response = await language_service.generate_response(message_body, conversation_history, session_id)
+            except ExecutorSaturatedError:
+                # Shed with a 503: the message gets no reply, so don't leave it in the history
+                conversation.log.pop()
+                raise
+            
+            # Analyze sentiment and update the conversation context
+            with metrics.span("sentiment"):
+                sentiment = await language_service.analyze_sentiment(message_body)
+            conversation.update_context("sentiment", sentiment)
+            
+            # Log the AI-generated response
+            conversation.add_message("assistant", ai_response)
         
-        logger.info(f"Sending response to {from_number}: {ai_response}")
+        logger.info("Sending SMS reply", extra={"from_number": from_number, "reply": ai_response})
         
         # Create a Twilio MessagingResponse to reply to the SMS
-        twilio_response = MessagingResponse()
-        twilio_response.message(ai_response)
+        with metrics.span("twiml"):
+            twilio_response = MessagingResponse()
+            twilio_response.message(ai_response)
+            content = str(twilio_response)
         
-        return Response(content=str(twilio_response), media_type="application/xml")
+        return Response(content=content, media_type="application/xml")
         
     except HTTPException as he:
-        logger.error(f"HTTP error handling SMS: {str(he)}")
+        logger.error("HTTP error handling SMS: %s", he)
         raise he
+    except ExecutorSaturatedError as se:
+        logger.warning("Shedding SMS: %s", se, extra={"from_number": from_number})
+        raise HTTPException(status_code=503, detail="Service busy, please retry",
+                            headers={"Retry-After": str(se.retry_after)})
     except Exception as e:
-        logger.error(f"Error handling SMS: {str(e)}", exc_info=True)
+        logger.error("Error handling SMS: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/conversation")
@@ -118,20 +124,18 @@ async def get_conversation(From: str = "+1234567890"):
     try:
         # Normalize the phone number
         session_id = normalize_phone_number(From)
-        logger.info(f"Getting conversation for phone number: {session_id}")
-        
         conversation = conversation_manager.get_conversation(session_id)
         
         if not conversation:
-            logger.info(f"No conversation found for {session_id}")
+            logger.info("No conversation found", extra={"session_id": session_id})
             return {"messages": []}
             
-        messages = conversation_manager.get_conversation_history(session_id)
-        logger.info(f"Retrieved {len(messages)} messages for {session_id}")
+        messages = conversation.messages
+        logger.info("Retrieved %d messages", len(messages), extra={"session_id": session_id})
         return {"messages": messages}
         
     except Exception as e:
-        logger.error(f"Error getting conversation: {str(e)}", exc_info=True)
+        logger.error("Error getting conversation: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error getting conversation: {str(e)}")
     
 @router.get("/status")
@@ -1,18 +1,47 @@
-from fastapi import APIRouter, Request, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File
+from fastapi import APIRouter, Request, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Body
 from twilio.twiml.voice_response import VoiceResponse, Gather
-from app.services.conversation_manager import ConversationManager
+from app.services.conversation_manager import conversation_manager
 from app.services.speech_service import SpeechService
+from app.services.streaming_transcriber import StreamingTranscriber
+from app.services.batch_transcription import batch_transcription_service
 from app.services.language_service import LanguageService
+from app.services.tts_service import TTSService, TTSUnavailableError
+from app.services.prompt_bank import PromptBank
+from app.services.audio import pcm16_wav_header
 from app.core.config import settings
-from fastapi.responses import JSONResponse
+from app.core.executor import ExecutorSaturatedError
+from app.core.metrics import metrics
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Dict, List, Optional
+import functools
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/voice", tags=["voice"])
-conversation_manager = ConversationManager()
+
+CALL_GREETING = "Hello! Welcome to our AI customer service. How can I help you today?"
+BUSY_PROMPT = "Sorry, I'm helping a lot of callers right now. Could you say that again?"
+
 speech_service = SpeechService()
 language_service = LanguageService()
+tts_service = TTSService()
+prompt_bank = PromptBank(tts_service, language_service, extra_texts=[CALL_GREETING, BUSY_PROMPT])
+conversation_manager.add_end_listener(language_service.forget_session)
+
+def _speak(response: VoiceResponse, text: str):
+    """Play the pre-rendered audio for a fixed reply; anything else is spoken by Twilio"""
+    with metrics.span("tts"):
+        url = prompt_bank.url(text)
+        if url is not None:
+            response.play(url)
+        else:
+            response.say(text)
+    metrics.annotate("speech", "play" if url is not None else "say")
 
 @router.post("/voice")
+@metrics.traced("call")
 async def handle_call(request: Request):
     """Handle incoming voice calls"""
     try:
@@ -23,7 +52,7 @@ async def handle_call(request: Request):
         response = VoiceResponse()
         
         # Add a greeting
-        response.say("Hello! Welcome to our AI customer service. How can I help you today?")
+        _speak(response, CALL_GREETING)
         
         # Gather user input
         gather = Gather(
@@ -40,45 +69,67 @@ async def handle_call(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/voice/handle-input")
+@metrics.traced("voice")
 async def handle_input(request: Request, session_id: str):
     """Handle user speech input"""
     try:
         form_data = await request.form()
         speech_result = form_data.get('SpeechResult', '')
         
-        # Add user message to conversation
-        conversation_manager.add_message(session_id, "user", speech_result)
-        
-        # Get conversation history
-        conversation_history = conversation_manager.get_conversation_history(session_id)
-        
-        # Generate response using language service
-        ai_response = await language_service.generate_response(speech_result, conversation_history)
-        
-        # Analyze sentiment
-        sentiment = await language_service.analyze_sentiment(speech_result)
-        
-        # Update conversation context with sentiment
-        conversation_manager.update_context(session_id, "sentiment", sentiment)
-        
-        # Add AI response to conversation
-        conversation_manager.add_message(session_id, "assistant", ai_response)
-        
-        # Create a response
-        response = VoiceResponse()
-        
-        # Say the AI response
-        response.say(ai_response)
+        # One session read and one write per turn; a call that outlived its
+        # session (idle expiry or eviction) simply starts afresh
+        with conversation_manager.turn(session_id, settings.BUSINESS_TYPE) as conversation:
+            with metrics.span("history"):
+                # Add user message to conversation
+                conversation.add_message("user", speech_result)
+                
+                # Get the recent conversation history
+                conversation_history = conversation_manager.recent_history(conversation)
+            
+            # Generate response using language service
+            try:
+                ai_response = await language_service.generate_response(speech_result, conversation_history, session_id)
+            except ExecutorSaturatedError:
+                # The caller is asked to repeat it, so it mustn't stay in the history unanswered
+                conversation.log.pop()
+                # Answer Twilio fast and ask the caller to repeat rather than blowing the webhook deadline
+                response = VoiceResponse()
+                _speak(response, BUSY_PROMPT)
+                response.append(Gather(
+                    input='speech',
+                    action=f'/api/v1/voice/handle-input?session_id={session_id}',
+                    method='POST',
+                    language='en-US',
+                    speechTimeout='auto'
+                ))
+                return response
+            
+            # Analyze sentiment
+            with metrics.span("sentiment"):
+                sentiment = await language_service.analyze_sentiment(speech_result)
+            
+            # Update conversation context with sentiment
+            conversation.update_context("sentiment", sentiment)
+            
+            # Add AI response to conversation
+            conversation.add_message("assistant", ai_response)
         
-        # Add another gather to continue the conversation
-        gather = Gather(
-            input='speech',
-            action=f'/api/v1/voice/handle-input?session_id={session_id}',
-            method='POST',
-            language='en-US',
-            speechTimeout='auto'
-        )
-        response.append(gather)
+        with metrics.span("twiml"):
+            # Create a response
+            response = VoiceResponse()
+            
+            # Speak the AI response (pre-rendered audio when it is a fixed reply)
+            _speak(response, ai_response)
+            
+            # Add another gather to continue the conversation
+            gather = Gather(
+                input='speech',
+                action=f'/api/v1/voice/handle-input?session_id={session_id}',
+                method='POST',
+                language='en-US',
+                speechTimeout='auto'
+            )
+            response.append(gather)
         
         return response
     except Exception as e:
@@ -94,28 +145,80 @@ async def get_conversation(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, mode: str = "file", sample_rate: int = 16000,
+                             encoding: str = "pcm16"):
+    """
+    Transcribe audio sent over a WebSocket.
+
+    mode=file (default): every binary frame is a complete audio file.
+    mode=stream: frames are raw mono audio (pcm16 or mulaw at sample_rate);
+    partial and final transcripts are pushed back as the caller speaks.
+    """
     await websocket.accept()
+    if mode == "stream":
+        await _stream_transcription(websocket, sample_rate, encoding)
+        return
     try:
         while True:
             # Receive audio data
             audio_data = await websocket.receive_bytes()
             
             # Process the audio and get transcription
-            transcription = await speech_service.transcribe_audio(audio_data)
+            try:
+                transcription = await speech_service.transcribe_audio(audio_data)
+            except ExecutorSaturatedError as se:
+                await websocket.send_text(json.dumps({
+                    "error": "busy",
+                    "retry_after": se.retry_after
+                }))
+                continue
             
             # Send back the transcription
             await websocket.send_text(json.dumps({
                 "transcription": transcription
             }))
     except WebSocketDisconnect:
-        print("Client disconnected")
+        logger.debug("WebSocket client disconnected")
     except Exception as e:
         await websocket.send_text(json.dumps({
             "error": str(e)
         }))
 
+async def _stream_transcription(websocket: WebSocket, sample_rate: int, encoding: str):
+    async def send(event):
+        await websocket.send_text(json.dumps(event))
+
+    # Partials favour latency: greedy decoding, no retries at higher temperature
+    transcribe = functools.partial(speech_service.transcribe_samples,
+                                   temperature=0.0, condition_on_previous_text=False)
+    try:
+        transcriber = StreamingTranscriber(transcribe, send, sample_rate=sample_rate, encoding=encoding)
+    except ValueError as e:
+        await send({"type": "error", "error": str(e)})
+        await websocket.close()
+        return
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                transcriber.cancel()
+                return
+            if message.get("bytes"):
+                transcriber.feed(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("event") == "stop":
+                # Client finished sending: flush the last segment, then close
+                await transcriber.close()
+                await send({"type": "done"})
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        transcriber.cancel()
+    except Exception as e:
+        transcriber.cancel()
+        await send({"type": "error", "error": str(e)})
+
 @router.post("/transcribe")
+@metrics.traced("transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     try:
         # Read the uploaded file
@@ -127,6 +230,9 @@ async def transcribe_audio(file: UploadFile = File(...)):
         return JSONResponse(content={
             "transcription": transcription
         })
+    except ExecutorSaturatedError as se:
+        raise HTTPException(status_code=503, detail="Service busy, please retry",
+                            headers={"Retry-After": str(se.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -136,4 +242,92 @@ async def voice_status():
         "status": "active",
         "model": settings.WHISPER_MODEL,
         "service": "whisper"
-    } 
\ No newline at end of file
+    } 
+
+@router.get("/whisper")
+async def whisper_status():
+    """Per-tier Whisper traffic, p95 latency and confidence, for tuning downgrades"""
+    return speech_service.stats()
+
+@router.get("/tts")
+async def synthesize_speech(request: Request, text: str, voice: Optional[str] = None, stream: bool = False):
+    """
+    Speak ``text`` as WAV. Repeated text is served from the audio cache;
+    stream=true sends each sentence as soon as it is synthesized.
+    """
+    if voice is not None and voice not in await tts_service.get_available_voices():
+        raise HTTPException(status_code=404, detail=f"Unknown voice: {voice}")
+    try:
+        if stream:
+            sample_rate = await tts_service.sample_rate(voice)
+
+            async def audio():
+                yield pcm16_wav_header(sample_rate)
+                async for chunk in tts_service.stream(text, voice):
+                    yield chunk
+            return StreamingResponse(audio(), media_type="audio/wav")
+        # Content-addressed, so the cache key doubles as a permanent ETag
+        etag = f'"{tts_service.cache.key(voice or tts_service.voice, text)[:20]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        _, audio = await tts_service.synthesize(text, voice)
+        return Response(content=audio, media_type="audio/wav", headers={"ETag": etag})
+    except TTSUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ExecutorSaturatedError as se:
+        raise HTTPException(status_code=503, detail="Service busy, please retry",
+                            headers={"Retry-After": str(se.retry_after)})
+
+@router.get("/tts/voices")
+async def tts_voices():
+    """Installed Piper voices and the default"""
+    return {"default": tts_service.voice, "voices": await tts_service.get_available_voices()}
+
+@router.get("/tts/cache")
+async def tts_cache_status():
+    """Synthesized audio cache size, hits and evictions"""
+    return tts_service.stats()
+
+@router.get("/prompts")
+async def prompt_bank_status():
+    """Pre-rendered prompts served to callers with <Play>"""
+    return prompt_bank.stats()
+
+@router.post("/batch", status_code=202)
+async def submit_batch(files: List[UploadFile] = File(...), language: Optional[str] = None):
+    """Queue recorded calls for bulk transcription; poll the returned job"""
+    items = [(file.filename, await file.read()) for file in files]
+    return batch_transcription_service.submit(items, language).to_dict()
+
+@router.post("/batch/manifest", status_code=202)
+async def submit_batch_manifest(manifest: Dict = Body(...)):
+    """Queue recordings listed as paths under BATCH_TRANSCRIPTION_ROOT"""
+    files = manifest.get("files")
+    if not isinstance(files, list) or not files or not all(isinstance(path, str) for path in files):
+        raise HTTPException(status_code=400, detail="Manifest must contain a non-empty 'files' list of paths")
+    try:
+        items = batch_transcription_service.resolve_manifest(files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return batch_transcription_service.submit(items, manifest.get("language")).to_dict()
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """Progress of a bulk transcription job"""
+    job = batch_transcription_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/batch/{job_id}/results")
+async def stream_batch_results(job_id: str):
+    """Stream results as JSON lines while the job runs, ending when it finishes"""
+    job = batch_transcription_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def lines():
+        async for result in job.stream():
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
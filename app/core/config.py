@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,10 +18,100 @@ class Settings:
     # Pinecone Settings
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_ENVIRONMENT: str = os.getenv("PINECONE_ENVIRONMENT", "")
+    PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "knowledge-base")  # Used when VECTOR_BACKEND=pinecone
     
     # AI Model Settings
     WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "base")  # Options: tiny, base, small, medium, large
+    WHISPER_TIERS: str = os.getenv("WHISPER_TIERS", "tiny")  # Smaller models to fall back to under load
+    WHISPER_QUANTIZE_INT8: bool = os.getenv("WHISPER_QUANTIZE_INT8", "false").lower() == "true"  # CPU only
+    WHISPER_DOWNGRADE_QUEUE_DEPTH: int = int(os.getenv("WHISPER_DOWNGRADE_QUEUE_DEPTH", "4"))  # 0 disables
+    WHISPER_DOWNGRADE_P95_MS: float = float(os.getenv("WHISPER_DOWNGRADE_P95_MS", "5000"))  # 0 disables
+    WHISPER_LATENCY_WINDOW_SECONDS: float = float(os.getenv("WHISPER_LATENCY_WINDOW_SECONDS", "60"))
     LANGUAGE_MODEL: str = os.getenv("LANGUAGE_MODEL", "llama2-7b")  # Default language model
+    PRELOAD_MODELS: bool = os.getenv("PRELOAD_MODELS", "true").lower() == "true"  # Load shared models at startup
+
+    # Inference Executor Settings
+    INFERENCE_MAX_WORKERS: int = int(os.getenv("INFERENCE_MAX_WORKERS", "2"))  # Concurrent model calls
+    INFERENCE_MAX_QUEUE: int = int(os.getenv("INFERENCE_MAX_QUEUE", "8"))  # Waiting calls before rejecting
+    INFERENCE_TIMEOUT_SECONDS: float = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "10"))  # Stay under Twilio's 15s
+    INFERENCE_RETRY_AFTER_SECONDS: int = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "2"))
+
+    # Generation Settings
+    GENERATION_MAX_BATCH_SIZE: int = int(os.getenv("GENERATION_MAX_BATCH_SIZE", "8"))  # Prompts per generate call
+    GENERATION_MAX_WAIT_MS: float = float(os.getenv("GENERATION_MAX_WAIT_MS", "10"))  # Wait to fill a batch
+    GENERATION_CONTEXT_TOKENS: int = int(os.getenv("GENERATION_CONTEXT_TOKENS", "1024"))  # Prompt + reply budget
+    GENERATION_MAX_NEW_TOKENS: int = int(os.getenv("GENERATION_MAX_NEW_TOKENS", "60"))  # Reserved for the reply
+    GENERATION_MAX_SESSIONS: int = int(os.getenv("GENERATION_MAX_SESSIONS", "1000"))  # Tokenized histories kept
+    GENERATION_KV_CACHE_MB: int = int(os.getenv("GENERATION_KV_CACHE_MB", "256"))  # Per-session past key/values
+    
+    # Streaming Transcription Settings (/voice/ws?mode=stream)
+    STREAM_VAD_THRESHOLD: float = float(os.getenv("STREAM_VAD_THRESHOLD", "0.01"))  # RMS energy counted as speech
+    STREAM_SILENCE_MS: int = int(os.getenv("STREAM_SILENCE_MS", "600"))  # Pause that ends a segment
+    STREAM_PARTIAL_INTERVAL_MS: int = int(os.getenv("STREAM_PARTIAL_INTERVAL_MS", "500"))  # Partial result cadence
+    STREAM_WINDOW_SECONDS: float = float(os.getenv("STREAM_WINDOW_SECONDS", "8"))  # Audio decoded per partial
+    STREAM_MAX_SEGMENT_SECONDS: float = float(os.getenv("STREAM_MAX_SEGMENT_SECONDS", "15"))  # Force a final
+    STREAM_OVERLAP_MS: int = int(os.getenv("STREAM_OVERLAP_MS", "500"))  # Overlap between split segments
+    AUDIO_MAX_SECONDS: float = float(os.getenv("AUDIO_MAX_SECONDS", "600"))  # Longest streamed upload accepted
+    
+    # Batch Transcription Settings (/voice/batch)
+    BATCH_TRANSCRIPTION_WORKERS: int = int(os.getenv("BATCH_TRANSCRIPTION_WORKERS", "0"))  # 0 = one per CPU core
+    BATCH_TRANSCRIPTION_BATCH_SIZE: int = int(os.getenv("BATCH_TRANSCRIPTION_BATCH_SIZE", "8"))  # 30s windows per decode
+    BATCH_TRANSCRIPTION_MAX_JOBS: int = int(os.getenv("BATCH_TRANSCRIPTION_MAX_JOBS", "100"))  # Finished jobs kept for polling
+    BATCH_TRANSCRIPTION_ROOT: str = os.getenv("BATCH_TRANSCRIPTION_ROOT", "recordings")  # Base dir for manifest paths
+    
+    # Conversation Session Settings
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")  # memory, or sqlite to share across workers
+    SESSION_SQLITE_PATH: str = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+    SESSION_IDLE_TTL_SECONDS: float = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))  # Expire idle conversations
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))  # LRU-evict beyond this
+    SESSION_MAX_MB: int = int(os.getenv("SESSION_MAX_MB", "256"))  # Estimated memory for all conversations
+    SESSION_MAX_MESSAGES: int = int(os.getenv("SESSION_MAX_MESSAGES", "200"))  # Older turns are compacted away
+    SESSION_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+    SESSION_HISTORY_WINDOW: int = int(os.getenv("SESSION_HISTORY_WINDOW", "50"))  # Recent turns passed to generation
+    SESSION_WAL_PATH: str = os.getenv("SESSION_WAL_PATH", "")  # Write-ahead log for memory sessions; empty disables
+    SESSION_WAL_FSYNC: bool = os.getenv("SESSION_WAL_FSYNC", "false").lower() == "true"
+    SESSION_WAL_MAX_MB: int = int(os.getenv("SESSION_WAL_MAX_MB", "64"))  # Checkpoint the log beyond this size
+    
+    # Response Cache Settings
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    
+    # Knowledge Base Settings
+    KNOWLEDGE_QUERY_LIMIT: int = int(os.getenv("KNOWLEDGE_QUERY_LIMIT", "20"))  # Records returned per query
+    KNOWLEDGE_SNAPSHOT_EVERY: int = int(os.getenv("KNOWLEDGE_SNAPSHOT_EVERY", "100"))  # Logged updates per snapshot
+    KNOWLEDGE_LOG_FSYNC: bool = os.getenv("KNOWLEDGE_LOG_FSYNC", "true").lower() == "true"  # fsync every update
+    KNOWLEDGE_RELOAD_INTERVAL_SECONDS: float = float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL_SECONDS", "2"))  # Poll for other workers' updates; 0 = off
+    KNOWLEDGE_EMBEDDING_MODEL: str = os.getenv("KNOWLEDGE_EMBEDDING_MODEL", "")  # Hugging Face encoder; empty = hashed features
+    KNOWLEDGE_EMBEDDING_DIM: int = int(os.getenv("KNOWLEDGE_EMBEDDING_DIM", "512"))  # Hashed feature dimensions
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "local")  # local (NumPy), or pinecone
+    VECTOR_TOP_K: int = int(os.getenv("VECTOR_TOP_K", "5"))  # Semantic matches returned
+    VECTOR_MIN_SCORE: float = float(os.getenv("VECTOR_MIN_SCORE", "0.25"))  # Cosine similarity cut-off
+    VECTOR_ANN_MIN_VECTORS: int = int(os.getenv("VECTOR_ANN_MIN_VECTORS", "20000"))  # Cluster index beyond this
+    VECTOR_ANN_PROBES: int = int(os.getenv("VECTOR_ANN_PROBES", "8"))  # Clusters scanned per query
+    
+    # Text-to-Speech Settings
+    TTS_VOICE: str = os.getenv("TTS_VOICE", "en_US-amy-medium")  # Default Piper voice
+    TTS_VOICES_DIR: str = os.getenv("TTS_VOICES_DIR", "models/piper")  # <voice>.onnx and <voice>.onnx.json files
+    TTS_USE_CUDA: bool = os.getenv("TTS_USE_CUDA", "false").lower() == "true"
+    TTS_CACHE_DIR: str = os.getenv("TTS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "tts_cache")  # Empty = temp dir
+    TTS_CACHE_MAX_MB: int = int(os.getenv("TTS_CACHE_MAX_MB", "512"))  # Synthesized audio kept on disk
+    TTS_MEMORY_CACHE_MB: int = int(os.getenv("TTS_MEMORY_CACHE_MB", "64"))  # ...and in memory
+    PROMPT_BANK_ENABLED: bool = os.getenv("PROMPT_BANK_ENABLED", "true").lower() == "true"  # <Play> fixed replies
+    PROMPT_BANK_DIR: str = os.getenv("PROMPT_BANK_DIR") or os.path.join(tempfile.gettempdir(), "prompt_bank")
+    PROMPT_BANK_GRACE_SECONDS: float = float(os.getenv("PROMPT_BANK_GRACE_SECONDS", "3600"))  # Before unused files go
+    PUBLIC_BASE_URL: str = os.getenv("PUBLIC_BASE_URL", "")  # e.g. https://agent.example.com; empty = relative URLs
+    
+    # Observability Settings
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "2000"))  # Log requests slower than this; 0 = off
+    SLOW_REQUEST_SAMPLE_RATE: float = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))  # Fraction of them logged
+
+    # Logging Settings
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # Options: text, json (one object per line)
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records waiting to be written; more are dropped
+    LOG_MAX_FIELD_CHARS: int = int(os.getenv("LOG_MAX_FIELD_CHARS", "1024"))  # Longer messages/fields are truncated
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # Requests whose INFO/DEBUG records are kept
+    LOG_REDACT_PII: bool = os.getenv("LOG_REDACT_PII", "true").lower() == "true"  # Mask phone numbers and message text
     
     # Business Settings
     BUSINESS_TYPE: str = os.getenv("BUSINESS_TYPE", "restaurant")  # Default business type
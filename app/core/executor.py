@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TIMEOUT = object()
+
+
+class ExecutorSaturatedError(Exception):
+    """
+    Raised when the inference queue is full and the caller should retry later
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference executor saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that runs blocking model calls (GPT-2 generation,
+    Whisper transcription) off the event loop.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a thread; anything beyond that is rejected immediately with
+    ExecutorSaturatedError so webhooks can answer fast instead of timing out.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: Optional[float], retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        return self._pool
+
+    def _invoke(self, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            result = func()
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+        with self._lock:
+            self._completed += 1
+        return result
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Any = _DEFAULT_TIMEOUT, **kwargs) -> Any:
+        """
+        Run ``func(*args, **kwargs)`` on the inference pool.
+
+        ``timeout`` defaults to the configured per-request timeout; pass None to
+        wait indefinitely (e.g. for model loading). Raises asyncio.TimeoutError
+        when the call overruns (the thread finishes in the background) and
+        ExecutorSaturatedError when the queue is full.
+        """
+        if timeout is _DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        with self._lock:
+            if self._queued + self._active >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturatedError(self.retry_after)
+            self._queued += 1
+        try:
+            future = self._get_pool().submit(self._invoke, functools.partial(func, *args, **kwargs))
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            logger.warning("Inference call %s timed out after %ss", getattr(func, "__name__", func), timeout)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue-depth and outcome counters for monitoring
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout,
+                "queue_depth": self._queued,
+                "active": self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        """
+        Stop the worker threads; a new pool is created on the next call
+        """
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            # Cancelled futures never reach _invoke, so forget their queue slots
+            self._queued = 0
+
+
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_MAX_WORKERS,
+    max_queue=settings.INFERENCE_MAX_QUEUE,
+    timeout=settings.INFERENCE_TIMEOUT_SECONDS,
+    retry_after=settings.INFERENCE_RETRY_AFTER_SECONDS,
+)
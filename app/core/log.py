@@ -0,0 +1,278 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import copy
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else was passed through ``extra`` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# Fields holding what a customer said or typed: logged as their length only
+TEXT_FIELDS = {"body", "speech", "transcript", "text", "reply"}
+# Fields holding a phone number (SMS session ids are the sender's number)
+PHONE_FIELDS = {"phone", "from_number", "to_number", "session_id"}
+# E.164 numbers as the SMS route normalizes them, wherever they appear in a message
+_PHONE_RE = re.compile(r"\+\d{7,15}\b")
+
+# Per-request state, set by RequestLogContext: (request id, whether its INFO/DEBUG records are kept)
+_request: ContextVar[Optional[Tuple[str, bool]]] = ContextVar("log_request", default=None)
+_request_ids = itertools.count(1)
+
+
+def redact_phone(value: Any) -> str:
+    """
+    Keep the last four digits of a phone number, enough to tell callers apart
+    """
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) < 7:
+        return str(value)
+    return f"***{digits[-4:]}"
+
+
+def _redact_text(value: Any) -> str:
+    return f"<{len(str(value))} chars>"
+
+
+def _cap(text: str, limit: int) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+class RecordSampler(logging.Filter):
+    """
+    Runs in the caller before a record is queued: stamps it with the
+    current request id and drops INFO/DEBUG records of requests that weren't
+    sampled. Warnings and errors are always kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request = _request.get()
+        if request is None:
+            return True
+        record.request_id = request[0]
+        if request[1] or record.levelno >= logging.WARNING:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class SampledLogger(logging.Logger):
+    """
+    Logger whose INFO/DEBUG calls return before building a record when the
+    current request wasn't sampled, so an unsampled request pays one
+    ContextVar lookup per call. RecordSampler still drops such records for
+    loggers created before setup_logging.
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level < logging.WARNING:
+            request = _request.get()
+            if request is not None and not request[1]:
+                _state.sampler.sampled_out += 1
+                return False
+        return super().isEnabledFor(level)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the queue is full the
+    record is dropped and counted. Only the message's %-arguments are
+    interpolated on the caller's side (the record may reference objects that
+    change after the call); redaction, capping, encoding and I/O happen on
+    the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RedactingFormatter(logging.Formatter):
+    def __init__(self, fmt: Optional[str] = None, redact: bool = True, max_field_chars: int = 1024):
+        super().__init__(fmt)
+        self.redact = redact
+        self.max_field_chars = max_field_chars
+
+    def _message(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if self.redact:
+            message = _PHONE_RE.sub(lambda match: redact_phone(match.group()), message)
+        return _cap(message, self.max_field_chars)
+
+    def _fields(self, record: logging.LogRecord) -> Dict[str, Any]:
+        fields = {}
+        for key, value in record.__dict__.items():
+            if key in _RECORD_ATTRIBUTES or key.startswith("_"):
+                continue
+            if self.redact and key in TEXT_FIELDS and value is not None:
+                value = _redact_text(value)
+            elif self.redact and key in PHONE_FIELDS and value is not None:
+                value = redact_phone(value)
+            elif not isinstance(value, (int, float, bool)) and value is not None:
+                value = _cap(value if isinstance(value, str) else repr(value), self.max_field_chars)
+            fields[key] = value
+        return fields
+
+
+class JSONFormatter(_RedactingFormatter):
+    """
+    One JSON object per line: time, level, logger, message and any ``extra``
+    fields, with phone numbers and customer text redacted
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": self._message(record),
+        }
+        entry.update(self._fields(record))
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(_RedactingFormatter):
+    """
+    The app's usual ``time - logger - level - message`` line, followed by
+    any ``extra`` fields as key=value pairs
+    """
+
+    def __init__(self, redact: bool = True, max_field_chars: int = 1024):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s', redact, max_field_chars)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = self._message(record)
+        line = super().formatMessage(record)
+        fields = self._fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class RequestLogContext:
+    """
+    ASGI middleware giving every HTTP request and WebSocket a log request id
+    and deciding once, at LOG_SAMPLE_RATE, whether its INFO/DEBUG records are kept
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = settings.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.prefix = f"{os.getpid():x}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        token = _request.set((f"{self.prefix}-{next(_request_ids):x}", sampled))
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            _request.reset(token)
+
+
+class _LogState:
+    def __init__(self):
+        self.handler: Optional[BoundedQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        self.sampler = RecordSampler()
+        self.exit_hook = False
+
+
+_state = _LogState()
+
+
+def setup_logging():
+    """
+    Route the root logger through a bounded queue to a single listener
+    thread that formats (JSON or text, redacted and capped) and writes to
+    stderr. Request handlers only pay for a level check and, for records
+    that are kept, an enqueue. Safe to call more than once, including after
+    shutdown_logging.
+    """
+    if _state.listener is not None:
+        return
+    # None of the formats print the caller's file/line, thread or process: skip looking them up
+    # for every record (the logging HOWTO's "Optimization" section)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.setLoggerClass(SampledLogger)
+    formatter_class = JSONFormatter if settings.LOG_FORMAT == "json" else TextFormatter
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter_class(redact=settings.LOG_REDACT_PII, max_field_chars=settings.LOG_MAX_FIELD_CHARS))
+    handler = BoundedQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    handler.addFilter(_state.sampler)
+    root = logging.getLogger()
+    # Including the direct handler a previous shutdown_logging left behind
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    _state.handler = handler
+    _state.listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _state.listener.start()
+    if not _state.exit_hook:
+        # Looks the listener up when it runs, so it covers whichever setup_logging came last
+        atexit.register(shutdown_logging)
+        _state.exit_hook = True
+
+
+def shutdown_logging():
+    """
+    Write out whatever is still queued and stop the listener thread. The
+    root logger then writes straight to stderr, so records logged
+    afterwards (at exit, or before setup_logging runs again) aren't queued
+    with nothing left to write them.
+    """
+    listener, _state.listener = _state.listener, None
+    if listener is None:
+        return
+    root = logging.getLogger()
+    for output in listener.handlers:
+        root.addHandler(output)
+    root.removeHandler(_state.handler)
+    listener.stop()
+
+
+def log_stats() -> Dict[str, Any]:
+    handler = _state.handler
+    return {
+        "queued": handler.queue.qsize() if handler is not None else 0,
+        "dropped": handler.dropped if handler is not None else 0,
+        "sampled_out": _state.sampler.sampled_out,
+    }
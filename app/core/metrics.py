@@ -0,0 +1,254 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+slow_request_logger = logging.getLogger("app.slow_requests")
+
+# Latency buckets in seconds: 1 ms up to past Twilio's 15 s webhook deadline
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with fixed buckets, one series per label
+    combination. ``observe`` is a bisect and three additions and takes no
+    lock: spans are recorded on the event loop thread, and a lost increment
+    from a rare cross-thread race costs less than a lock on every span.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Label values -> [count per bucket (non-cumulative, +Inf last)..., total count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2) + [0.0])
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        return {labels: list(series) for labels, series in list(self._series.items())}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                  for labels, value in values]
+        return lines
+
+
+class Gauge:
+    """
+    A value read from a callback at scrape time (queue depth, live sessions)
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {_format_value(self.callback())}")
+        except Exception as e:
+            logger.error(f"Could not read gauge {self.name}: {str(e)}")
+        return lines
+
+
+class Trace:
+    """
+    Timings of one request through a pipeline: its spans in order plus
+    attributes such as where the reply came from
+    """
+
+    __slots__ = ("pipeline", "started", "spans", "attributes")
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.attributes: Dict[str, Any] = {}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class _Span:
+    # A class rather than @contextmanager: no generator per span, a few hundred nanoseconds all told
+    __slots__ = ("_metrics", "stage", "_started")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self._metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        elapsed = time.perf_counter() - self._started
+        trace = _current_trace.get()
+        if trace is None:
+            self._metrics.stage_seconds.observe(elapsed, ("other", self.stage))
+        else:
+            self._metrics.stage_seconds.observe(elapsed, (trace.pipeline, self.stage))
+            trace.spans.append((self.stage, elapsed))
+        return False
+
+
+class _TraceScope:
+    __slots__ = ("_metrics", "trace", "_token")
+
+    def __init__(self, metrics: "Metrics", pipeline: str):
+        self._metrics = metrics
+        self.trace = Trace(pipeline)
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _current_trace.reset(self._token)
+        self._metrics.finish(self.trace, failed=exc_type is not None)
+        return False
+
+
+class Metrics:
+    """
+    In-process latency metrics for the SMS and voice pipelines.
+
+    A request runs inside ``trace(pipeline)``; each stage inside it (speech
+    recognition, intent match, knowledge lookup, generation, TTS, TwiML) in
+    ``span(stage)``. Spans feed a per-pipeline, per-stage histogram and the
+    trace records the request's total time, labelled with where the reply
+    came from (a keyword rule, the knowledge base or GPT-2). ``render``
+    produces the Prometheus text format served on /metrics. Requests slower
+    than SLOW_REQUEST_MS are logged with their spans, sampled at
+    SLOW_REQUEST_SAMPLE_RATE.
+    """
+
+    def __init__(self, slow_request_ms: Optional[float] = None, slow_request_sample_rate: Optional[float] = None):
+        self.slow_request_seconds = (settings.SLOW_REQUEST_MS if slow_request_ms is None else slow_request_ms) / 1000
+        self.slow_request_sample_rate = (settings.SLOW_REQUEST_SAMPLE_RATE if slow_request_sample_rate is None
+                                         else slow_request_sample_rate)
+        self.stage_seconds = Histogram("agent_stage_duration_seconds", "Time spent in each pipeline stage",
+                                       ("pipeline", "stage"))
+        self.request_seconds = Histogram("agent_request_duration_seconds",
+                                         "End-to-end request time by pipeline and reply source",
+                                         ("pipeline", "reply"))
+        self.errors = Counter("agent_request_errors_total", "Requests that raised an error", ("pipeline",))
+        self.slow_requests = Counter("agent_slow_requests_total", "Requests slower than SLOW_REQUEST_MS",
+                                     ("pipeline",))
+        self._metrics: List[Any] = [self.request_seconds, self.stage_seconds, self.errors, self.slow_requests]
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def trace(self, pipeline: str) -> _TraceScope:
+        return _TraceScope(self, pipeline)
+
+    def traced(self, pipeline: str):
+        """
+        Decorator running an async endpoint inside ``trace(pipeline)``
+        """
+        def decorate(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.trace(pipeline):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @staticmethod
+    def annotate(key: str, value: Any):
+        """
+        Attach an attribute to the current request's trace, if there is one
+        """
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes[key] = value
+
+    def finish(self, trace: Trace, failed: bool = False):
+        elapsed = time.perf_counter() - trace.started
+        self.request_seconds.observe(elapsed, (trace.pipeline, str(trace.attributes.get("reply", "none"))))
+        if failed:
+            self.errors.inc((trace.pipeline,))
+        if 0 < self.slow_request_seconds <= elapsed:
+            self.slow_requests.inc((trace.pipeline,))
+            if random.random() < self.slow_request_sample_rate:
+                slow_request_logger.warning(json.dumps({
+                    "pipeline": trace.pipeline,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "failed": failed,
+                    "spans": [{"stage": stage, "ms": round(seconds * 1000, 2)} for stage, seconds in trace.spans],
+                    **trace.attributes,
+                }, default=str))
+
+    def register(self, metric: Any):
+        """
+        Add another histogram, counter or gauge to the /metrics output
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _read_rss_bytes() -> int:
+    """
+    Current resident set size of this process, in bytes (0 if unavailable)
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is a peak value, but it is the best we can do off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+
+def _estimate_model_bytes(obj: Any) -> int:
+    """
+    Estimate the tensor memory held by a model, pipeline or service
+    """
+    model = getattr(obj, "model", obj)
+    parameters = getattr(model, "parameters", None)
+    if callable(parameters):
+        try:
+            total = sum(p.numel() * p.element_size() for p in model.parameters())
+            buffers = getattr(model, "buffers", None)
+            if callable(buffers):
+                total += sum(b.numel() * b.element_size() for b in model.buffers())
+            return total
+        except Exception:
+            return 0
+    estimate = getattr(obj, "estimate_memory_bytes", None)
+    if callable(estimate):
+        try:
+            return int(estimate())
+        except Exception:
+            return 0
+    return 0
+
+
+class _Entry:
+    __slots__ = ("factory", "eager", "instance", "refcount", "rss_bytes", "loaded")
+
+    def __init__(self, factory: Callable[[], Any], eager: bool):
+        self.factory = factory
+        self.eager = eager
+        self.instance = None
+        self.refcount = 0
+        self.rss_bytes = 0
+        self.loaded = False
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of heavyweight models and shared services.
+
+    Each entry is loaded once, handed out to every caller that acquires it and
+    dropped again when the last reference is released or the app shuts down.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        self._started = False
+
+    def register(self, name: str, factory: Callable[[], Any], eager: bool = False):
+        """
+        Register a factory for a shared instance. Re-registering an existing
+        name keeps the original factory so module reloads stay idempotent.
+        """
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(factory, eager)
+            elif eager:
+                self._entries[name].eager = True
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._entries
+
+    def _load(self, name: str, entry: _Entry):
+        rss_before = _read_rss_bytes()
+        logger.info("Loading shared instance: %s", name)
+        entry.instance = entry.factory()
+        entry.loaded = True
+        entry.rss_bytes = max(_read_rss_bytes() - rss_before, 0)
+        logger.info("Loaded shared instance %s (+%.1f MB RSS)", name, entry.rss_bytes / (1024 * 1024))
+
+    def acquire(self, name: str) -> Any:
+        """
+        Get the shared instance for ``name``, loading it on first use
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(f"No factory registered for {name}")
+            if not entry.loaded:
+                self._load(name, entry)
+            entry.refcount += 1
+            return entry.instance
+
+    def peek(self, name: str) -> Optional[Any]:
+        """
+        Get the shared instance if it is already loaded, without taking a reference
+        """
+        entry = self._entries.get(name)
+        return entry.instance if entry is not None and entry.loaded else None
+
+    def release(self, name: str):
+        """
+        Drop one reference; the instance is unloaded when none remain and the
+        app is not running (loaded models stay warm while serving)
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.refcount == 0:
+                return
+            entry.refcount -= 1
+            if entry.refcount == 0 and not self._started:
+                self._unload(name, entry)
+
+    def _unload(self, name: str, entry: _Entry):
+        instance = entry.instance
+        entry.instance = None
+        entry.loaded = False
+        entry.rss_bytes = 0
+        close = getattr(instance, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.error(f"Error closing shared instance {name}: {str(e)}")
+        logger.info("Unloaded shared instance: %s", name)
+
+    def startup(self):
+        """
+        Load every eager entry. Failures are logged so the app can still start
+        with its placeholder fallbacks.
+        """
+        with self._lock:
+            self._started = True
+            for name, entry in self._entries.items():
+                if entry.eager and not entry.loaded:
+                    try:
+                        self._load(name, entry)
+                    except Exception as e:
+                        logger.error(f"Error preloading {name}: {str(e)}")
+
+    def shutdown(self):
+        """
+        Unload every instance regardless of outstanding references
+        """
+        with self._lock:
+            self._started = False
+            for name, entry in self._entries.items():
+                if entry.loaded:
+                    self._unload(name, entry)
+                entry.refcount = 0
+
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        Report memory held by each loaded instance plus the process RSS
+        """
+        models: List[Dict[str, Any]] = []
+        with self._lock:
+            for name, entry in self._entries.items():
+                models.append({
+                    "name": name,
+                    "loaded": entry.loaded,
+                    "refcount": entry.refcount,
+                    "eager": entry.eager,
+                    "rss_bytes": entry.rss_bytes,
+                    "model_bytes": _estimate_model_bytes(entry.instance) if entry.loaded else 0,
+                })
+        return {"process_rss_bytes": _read_rss_bytes(), "models": models}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ("value", "size", "last_access")
+
+    def __init__(self, value: Any, size: int, last_access: float):
+        self.value = value
+        self.size = size
+        self.last_access = last_access
+
+
+class SessionStore:
+    """
+    In-memory session map bounded by idle time, session count and total size.
+
+    Sessions idle for longer than ``idle_ttl_seconds`` expire; when there are
+    more than ``max_sessions`` sessions or their estimated sizes add up to
+    more than ``max_bytes``, the least recently used are evicted.
+    ``on_evict(key, reason)`` runs for every session removed by the store
+    itself (not for ``pop``), with reason "idle", "sessions" or "bytes".
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, idle_ttl_seconds: float,
+                 on_evict: Optional[Callable[[Hashable, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.on_evict = on_evict
+        self._clock = clock
+        self._slots: "OrderedDict[Hashable, _Slot]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions: Dict[str, int] = {"idle": 0, "sessions": 0, "bytes": 0}
+        self.sweeps = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        The session for ``key`` (marking it recently used), or None if absent or idle too long
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        now = self._clock()
+        if now - slot.last_access > self.idle_ttl_seconds:
+            self._evict(key, "idle")
+            return None
+        slot.last_access = now
+        self._slots.move_to_end(key)
+        return slot.value
+
+    def set(self, key: Hashable, value: Any, size: int):
+        previous = self._slots.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+        self._slots[key] = _Slot(value, size, self._clock())
+        self.total_bytes += size
+        self._enforce_limits()
+
+    def size(self, key: Hashable) -> int:
+        slot = self._slots.get(key)
+        return slot.size if slot is not None else 0
+
+    def resize(self, key: Hashable, size: int):
+        """
+        Record a session's new estimated size (e.g. after a message was added)
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return
+        self.total_bytes += size - slot.size
+        slot.size = size
+        slot.last_access = self._clock()
+        self._slots.move_to_end(key)
+        self._enforce_limits()
+
+    def pop(self, key: Hashable) -> Any:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return None
+        self.total_bytes -= slot.size
+        return slot.value
+
+    def values(self) -> List[Any]:
+        return [slot.value for slot in self._slots.values()]
+
+    def _enforce_limits(self):
+        # The most recently used session is never evicted for size, so a
+        # single oversized conversation can't evict itself mid-request
+        while len(self._slots) > self.max_sessions:
+            self._evict(next(iter(self._slots)), "sessions")
+        while self.total_bytes > self.max_bytes and len(self._slots) > 1:
+            self._evict(next(iter(self._slots)), "bytes")
+
+    def _evict(self, key: Hashable, reason: str):
+        self.pop(key)
+        self.evictions[reason] += 1
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, reason)
+            except Exception as e:
+                logger.error(f"Session eviction callback failed for {key}: {str(e)}")
+
+    def sweep(self) -> int:
+        """
+        Expire every idle session now; returns how many were removed
+        """
+        self.sweeps += 1
+        cutoff = self._clock() - self.idle_ttl_seconds
+        expired: List[Hashable] = []
+        # Slots are kept in access order, so idle ones are all at the front
+        for key, slot in self._slots.items():
+            if slot.last_access >= cutoff:
+                break
+            expired.append(key)
+        for key in expired:
+            self._evict(key, "idle")
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._slots),
+            "max_sessions": self.max_sessions,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "evictions": dict(self.evictions),
+            "sweeps": self.sweeps,
+        }
@@ -2,9 +2,21 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from app.api import voice, knowledge, sms
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.log import RequestLogContext, log_stats, setup_logging, shutdown_logging
+
+# Before the routers are imported, so their services' start-up records go through the queue too
+setup_logging()
+
+from app.api import voice, knowledge, sms
+from app.core.executor import inference_executor
+from app.core.metrics import Gauge, metrics
+from app.core.registry import registry
+from app.services.batch_transcription import batch_transcription_service
+from app.services.conversation_manager import conversation_manager
+from app.services.prompt_bank import PROMPT_ROUTE
 import os
 
 app = FastAPI(
@@ -22,8 +34,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request ids and per-request sampling for log records
+app.add_middleware(RequestLogContext)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount(PROMPT_ROUTE, StaticFiles(directory=voice.prompt_bank.directory), name="prompts")
 
 # Configure templates
 templates = Jinja2Templates(directory="app/templates")
@@ -33,6 +49,40 @@ app.include_router(voice.router, prefix=settings.API_V1_STR)
 app.include_router(knowledge.router, prefix=settings.API_V1_STR)
 app.include_router(sms.router, prefix=settings.API_V1_STR)
 
+# Scraped alongside the latency histograms
+metrics.register(Gauge("agent_inference_queue_depth", "Model calls waiting for an inference thread",
+                       lambda: inference_executor.stats()["queue_depth"]))
+metrics.register(Gauge("agent_inference_active", "Model calls running on inference threads",
+                       lambda: inference_executor.stats()["active"]))
+metrics.register(Gauge("agent_log_queue_depth", "Log records waiting to be written",
+                       lambda: log_stats()["queued"]))
+metrics.register(Gauge("agent_log_records_dropped", "Log records dropped because the log queue was full",
+                       lambda: log_stats()["dropped"]))
+
+@app.on_event("startup")
+async def startup():
+    """Load shared models once per worker before serving requests"""
+    # Again after a previous shutdown stopped the log listener (e.g. an app restarted in tests)
+    setup_logging()
+    if settings.PRELOAD_MODELS:
+        await run_in_threadpool(registry.startup)
+    conversation_manager.start_sweeper()
+    # The instance the routes and language services hold, which outlives a registry shutdown
+    await knowledge.knowledge_service.start()
+    voice.prompt_bank.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop inference threads and workers and release shared models"""
+    conversation_manager.stop_sweeper()
+    knowledge.knowledge_service.stop_watcher()
+    voice.prompt_bank.stop()
+    conversation_manager.close()
+    batch_transcription_service.shutdown()
+    inference_executor.shutdown()
+    registry.shutdown()
+    shutdown_logging()
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -49,6 +99,31 @@ async def api_root():
         "api_version": settings.API_V1_STR
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-stage and per-request latency histograms in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/models")
+async def models_status():
+    """Report the shared models loaded in this worker and their memory use"""
+    return registry.memory_report()
+
+@app.get("/api/v1/inference")
+async def inference_status():
+    """Report inference executor queue depth, outcome counters and batching stats"""
+    stats = inference_executor.stats()
+    generator = registry.peek("text_generator")
+    if generator is not None:
+        stats["generation"] = generator.stats()
+    stats["batch_transcription"] = batch_transcription_service.stats()
+    return stats
+
+@app.get("/api/v1/sessions")
+async def sessions_status():
+    """Report stored conversations, their size and eviction counters"""
+    return conversation_manager.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
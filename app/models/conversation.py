@@ -1,34 +1,141 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+import sys
+import time
 
 class Message(BaseModel):
+    """A conversation turn as returned by the API"""
     role: str  # 'user' or 'assistant'
     content: str
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = Field(default_factory=datetime.now)
 
-class Conversation(BaseModel):
-    session_id: str
-    messages: List[Message] = []
-    context: Dict = {}
-    business_type: str
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
+    @classmethod
+    def from_entry(cls, entry: "LogEntry") -> "Message":
+        return cls(role=entry.role, content=entry.content, timestamp=datetime.fromtimestamp(entry.timestamp))
+
+class LogEntry:
+    """
+    One turn of a conversation log. Supports ``entry["role"]`` style access
+    so it can stand in for the history dicts the language services take.
+    """
+    __slots__ = ("offset", "role", "content", "timestamp")
+
+    def __init__(self, offset: int, role: str, content: str, timestamp: float):
+        self.offset = offset  # Position in the conversation since it started, stable across compaction
+        self.role = sys.intern(role)  # Every entry shares one "user"/"assistant" string
+        self.content = content
+        self.timestamp = timestamp  # Epoch seconds
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "timestamp": datetime.fromtimestamp(self.timestamp)}
+
+class ConversationLog:
+    """
+    Append-only message log. Entries keep their absolute offset, so callers
+    can ask for "the last N turns" or "every turn since offset X" without
+    copying the whole history; compaction only drops entries from the front.
+    """
+    __slots__ = ("_entries", "base", "content_bytes", "flushed")
+
+    def __init__(self, base: int = 0):
+        self._entries: List[LogEntry] = []
+        self.base = base  # Offset of the oldest retained entry (= turns compacted away)
+        self.content_bytes = 0
+        self.flushed = base  # End offset already written to the write-ahead log or session store
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def end(self) -> int:
+        """Offset the next appended entry will get"""
+        return self.base + len(self._entries)
+
+    def append(self, role: str, content: str, timestamp: Optional[float] = None) -> LogEntry:
+        entry = LogEntry(self.end, role, content, time.time() if timestamp is None else timestamp)
+        self._entries.append(entry)
+        self.content_bytes += len(content)
+        return entry
+
+    def pop(self) -> LogEntry:
+        """
+        Remove the newest entry, e.g. a message whose turn was abandoned before it was stored
+        """
+        entry = self._entries.pop()
+        self.content_bytes -= len(entry.content)
+        self.flushed = min(self.flushed, self.end)
+        return entry
+
+    def last(self, count: int) -> List[LogEntry]:
+        return self._entries[-count:] if count > 0 else []
+
+    def since(self, offset: int) -> List[LogEntry]:
+        return self._entries[max(0, offset - self.base):]
+
+    def entries(self) -> List[LogEntry]:
+        return self._entries
+
+    def compact(self, keep: int) -> int:
+        """
+        Drop all but the newest ``keep`` entries; returns how many were dropped
+        """
+        dropped = len(self._entries) - keep
+        if dropped <= 0:
+            return 0
+        self.content_bytes -= sum(len(entry.content) for entry in self._entries[:dropped])
+        del self._entries[:dropped]
+        self.base += dropped
+        self.flushed = max(self.flushed, self.base)
+        return dropped
+
+class Conversation:
+    """
+    Live conversation state. A plain slotted object rather than a Pydantic
+    model: it is created and appended to on every turn, and only converted
+    to API models (``Message``) when history is returned to a client.
+    """
+    __slots__ = ("session_id", "business_type", "log", "context", "context_flushed", "created_at", "updated_at",
+                 "version")
+
+    def __init__(self, session_id: str, business_type: str, log: Optional[ConversationLog] = None,
+                 context: Optional[Dict] = None, created_at: Optional[float] = None,
+                 updated_at: Optional[float] = None, version: int = 0):
+        self.session_id = session_id
+        self.business_type = business_type
+        self.log = log if log is not None else ConversationLog()
+        self.context = context if context is not None else {}
+        self.context_flushed = True  # False once the context changed since it was written to the write-ahead log
+        self.created_at = time.time() if created_at is None else created_at  # Epoch seconds
+        self.updated_at = self.created_at if updated_at is None else updated_at
+        self.version = version  # Stored version this copy was loaded at (0 = never stored), for shared backends
+
+    @property
+    def messages(self) -> List[Message]:
+        """Retained turns as API models; the hot path reads ``log`` directly"""
+        return [Message.from_entry(entry) for entry in self.log.entries()]
+
+    @property
+    def compacted_messages(self) -> int:
+        """Oldest turns dropped to respect the per-conversation cap"""
+        return self.log.base
 
     def add_message(self, role: str, content: str):
-        message = Message(role=role, content=content)
-        self.messages.append(message)
-        self.updated_at = datetime.now()
+        self.updated_at = self.log.append(role, content).timestamp
 
     def get_context(self) -> Dict:
         return self.context
 
     def update_context(self, key: str, value: any):
         self.context[key] = value
-        self.updated_at = datetime.now()
+        self.context_flushed = False
+        self.updated_at = time.time()
 
 class BusinessConfig(BaseModel):
     type: str
     name: str
     settings: Dict
-    knowledge_base: Optional[Dict] = None 
\ No newline at end of file
+    knowledge_base: Optional[Dict] = None
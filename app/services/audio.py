@@ -0,0 +1,231 @@
+from typing import NamedTuple, Optional
+import io
+import struct
+import subprocess
+import wave
+import numpy as np
+
+# Whisper models expect 16 kHz mono float32 samples in [-1, 1]
+WHISPER_SAMPLE_RATE = 16000
+
+# Leading bytes of compressed/container formats that need ffmpeg to decode
+_COMPRESSED_SIGNATURES = (
+    b"ID3",                # MP3 with ID3 tag
+    b"OggS",               # Ogg (Opus, Vorbis)
+    b"fLaC",               # FLAC
+    b"\x1a\x45\xdf\xa3",   # Matroska / WebM
+    b"#!AMR",              # AMR
+)
+
+
+# WAVE format tags that can be fed to the streaming transcriber as-is
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_MULAW = 0x0007
+
+
+class AudioDecodeError(Exception):
+    """Raised when an audio payload cannot be decoded"""
+
+
+class AudioTooLongError(AudioDecodeError):
+    """Raised when streamed audio exceeds the configured maximum duration"""
+
+
+class WavFormat(NamedTuple):
+    format_tag: int
+    channels: int
+    sample_rate: int
+    sample_width: int
+    data_offset: int  # Byte offset of the first sample
+
+
+class AudioStreamBuffer:
+    """
+    Growable byte buffer for assembling streamed audio in linear time.
+    Capacity doubles as chunks arrive (never past ``max_bytes``), so each
+    byte is copied O(1) times instead of once per chunk as with ``bytes +=``.
+    """
+
+    def __init__(self, max_bytes: int, initial_capacity: int = 64 * 1024):
+        self.max_bytes = max_bytes
+        self._buffer = bytearray(min(initial_capacity, max_bytes))
+        self.size = 0
+
+    def append(self, chunk: bytes):
+        end = self.size + len(chunk)
+        if end > self.max_bytes:
+            raise AudioTooLongError(f"Audio exceeds the {self.max_bytes} byte limit")
+        if end > len(self._buffer):
+            grown = bytearray(min(max(end, 2 * len(self._buffer)), self.max_bytes))
+            grown[:self.size] = memoryview(self._buffer)[:self.size]
+            self._buffer = grown
+        self._buffer[self.size:end] = chunk
+        self.size = end
+
+    def view(self) -> memoryview:
+        return memoryview(self._buffer)[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def pcm16_to_float32(data: bytes) -> np.ndarray:
+    """
+    Convert little-endian signed 16-bit PCM to float32 samples
+    """
+    usable = len(data) - (len(data) % 2)
+    return np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0
+
+
+def _mulaw_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.uint8)
+    sign = codes & 0x80
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = ((mantissa.astype(np.int32) << 3) + 0x84) << exponent.astype(np.int32)
+    linear = np.where(sign != 0, 0x84 - magnitude, magnitude - 0x84)
+    return (linear / 32768.0).astype(np.float32)
+
+
+_MULAW_TABLE = _mulaw_table()
+
+
+def mulaw_to_float32(data: bytes) -> np.ndarray:
+    """
+    Convert 8-bit G.711 mu-law (Twilio media streams) to float32 samples
+    """
+    return _MULAW_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Linear-interpolation resampling; adequate for speech going into Whisper
+    """
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = int(round(len(samples) * target_rate / sample_rate))
+    positions = np.arange(target_length, dtype=np.float64) * (sample_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def parse_wav_header(data: bytes) -> Optional[WavFormat]:
+    """
+    Read the ``fmt `` chunk and locate the ``data`` chunk of a (possibly
+    truncated) WAV payload. None if the header isn't complete yet.
+    """
+    if not is_wav(data):
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if body + 16 > len(data):
+                return None
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            fmt = (format_tag, channels, sample_rate, bits // 8)
+        elif chunk_id == b"data":
+            return WavFormat(*fmt, data_offset=body) if fmt is not None else None
+        # Chunks are word-aligned
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def pcm16_wav_header(sample_rate: int, data_bytes: Optional[int] = None, channels: int = 1) -> bytes:
+    """
+    44-byte header for 16-bit PCM WAV. Without ``data_bytes`` the sizes are
+    left at their maximum, the usual convention for a WAV streamed before its
+    length is known.
+    """
+    data_size = 0xFFFFFFFF if data_bytes is None else data_bytes
+    riff_size = 0xFFFFFFFF if data_bytes is None else 36 + data_bytes
+    block_align = channels * 2
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", riff_size, b"WAVE", b"fmt ", 16, WAVE_FORMAT_PCM,
+                       channels, sample_rate, sample_rate * block_align, block_align, 16, b"data", data_size)
+
+
+def pcm16_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    return pcm16_wav_header(sample_rate, len(pcm)) + pcm
+
+
+def is_compressed(data: bytes) -> bool:
+    """
+    Whether the payload is a compressed/container format that needs ffmpeg
+    """
+    if data.startswith(_COMPRESSED_SIGNATURES):
+        return True
+    if len(data) >= 12 and data[4:8] == b"ftyp":  # MP4 / M4A
+        return True
+    # Bare MPEG audio frame sync
+    return len(data) >= 2 and data[0] == 0xFF and (data[1] & 0xE0) == 0xE0
+
+
+def _wav_to_float32(data: bytes) -> np.ndarray:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {width} bytes")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return resample(samples, sample_rate)
+
+
+def _ffmpeg_to_float32(data: bytes) -> np.ndarray:
+    """
+    Decode compressed audio by piping it through ffmpeg, without temp files
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(WHISPER_SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        result = subprocess.run(command, input=data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise AudioDecodeError("ffmpeg is required to decode compressed audio")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"ffmpeg could not decode audio: {e.stderr.decode(errors='replace').strip()}")
+    return pcm16_to_float32(result.stdout)
+
+
+def decode_audio(data: bytes, raw_sample_rate: Optional[int] = None) -> np.ndarray:
+    """
+    Decode an audio payload to 16 kHz mono float32 samples in memory.
+
+    PCM WAV files are parsed directly and every other container (compressed
+    or not: MP3, AIFF, CAF...) goes through an ffmpeg pipe. Headerless data
+    is only taken as raw 16-bit little-endian mono PCM when the caller says
+    so by passing its ``raw_sample_rate``.
+    """
+    if not data:
+        return np.zeros(0, dtype=np.float32)
+    if is_wav(data):
+        try:
+            return _wav_to_float32(data)
+        except (wave.Error, EOFError):
+            # Float or extensible WAV that the wave module can't read
+            return _ffmpeg_to_float32(data)
+    if raw_sample_rate is not None and not is_compressed(data):
+        return resample(pcm16_to_float32(data), raw_sample_rate)
+    return _ffmpeg_to_float32(data)
@@ -0,0 +1,313 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+import numpy as np
+import whisper
+from app.core.config import settings
+from app.services.audio import AudioDecodeError, decode_audio
+from app.services.whisper_tiers import load_whisper_model
+
+logger = logging.getLogger(__name__)
+
+# One item of a batch job: display name plus either the audio bytes or a file path
+BatchItem = Tuple[str, Union[bytes, str]]
+
+# Loaded once per pool worker by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name: str, quantize: bool, threads: int):
+    global _worker_model
+    import torch
+    # Workers split the cores between them instead of each grabbing all of them
+    torch.set_num_threads(threads)
+    _worker_model = load_whisper_model(model_name, quantize, device="cpu")
+
+
+# Whisper timestamps are multiples of 20 ms
+_TIMESTAMP_SAMPLES = whisper.audio.SAMPLE_RATE // 50
+
+
+class _WindowDecoder:
+    """
+    Decodes a batch of 30-second windows with Whisper, with timestamps
+    """
+
+    def __init__(self, model, language: Optional[str]):
+        self.model = model
+        self.options = whisper.DecodingOptions(fp16=False, language=language)
+        self.tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                                                         language=language, task="transcribe")
+        self.timestamp_begin = self.tokenizer.timestamp_begin
+
+    def decode(self, windows: List[np.ndarray]) -> List[Tuple[List[int], Optional[str]]]:
+        """
+        (tokens, language) for each window
+        """
+        import torch
+        mel = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(window), n_mels=self.model.dims.n_mels)
+                           for window in windows]).to(self.model.device)
+        return [(result.tokens, result.language) for result in whisper.decode(self.model, mel, self.options)]
+
+    def text(self, tokens: List[int]) -> str:
+        return self.tokenizer.decode(tokens).strip()
+
+
+def _split_window(tokens: List[int], timestamp_begin: int, window_samples: int) -> Tuple[List[int], int]:
+    """
+    Text tokens of the complete segments of a decoded window, and how many
+    samples to advance to the next window.
+
+    As in ``whisper.transcribe``: when the window ends inside a segment (no
+    closing timestamp), that segment's tokens are dropped and the next
+    window starts where it began, so speech crossing the boundary is decoded
+    whole instead of being cut in two.
+    """
+    is_timestamp = [token >= timestamp_begin for token in tokens]
+    ends_complete = is_timestamp[-2:] == [False, True]
+    boundaries = [i for i in range(1, len(tokens)) if is_timestamp[i - 1] and is_timestamp[i]]
+    if boundaries and not ends_complete:
+        cut = boundaries[-1]
+        advance = (tokens[cut - 1] - timestamp_begin) * _TIMESTAMP_SAMPLES
+        # Never stall on a window that ends where it started
+        if advance > 0:
+            return [token for token in tokens[:cut] if token < timestamp_begin], advance
+    return [token for token in tokens if token < timestamp_begin], window_samples
+
+
+def _transcribe_recordings(recordings: List[np.ndarray], batch_size: int,
+                           decoder) -> List[Tuple[str, Optional[str]]]:
+    """
+    (text, language) of each recording.
+
+    Each recording is read in 30-second windows that start where the last
+    complete segment of the previous window ended. That makes a file's
+    windows sequential, so batching is across files: each round decodes the
+    next window of every unfinished recording, ``batch_size`` at a time. A
+    batch holding one long recording decodes one window per step.
+    """
+    window_samples = whisper.audio.N_SAMPLES
+    texts: List[List[str]] = [[] for _ in recordings]
+    languages: List[Optional[str]] = [None] * len(recordings)
+    seeks = [0] * len(recordings)
+    active = [index for index, samples in enumerate(recordings) if len(samples)]
+    while active:
+        for offset in range(0, len(active), batch_size):
+            chunk = active[offset:offset + batch_size]
+            windows = [recordings[index][seeks[index]:seeks[index] + window_samples] for index in chunk]
+            for index, (tokens, language) in zip(chunk, decoder.decode(windows)):
+                text_tokens, advance = _split_window(tokens, decoder.timestamp_begin, window_samples)
+                texts[index].append(decoder.text(text_tokens))
+                languages[index] = language
+                seeks[index] += advance
+        active = [index for index in active if seeks[index] < len(recordings[index])]
+    return [(" ".join(text for text in parts if text), language) for parts, language in zip(texts, languages)]
+
+
+def _transcribe_batch(items: List[BatchItem], batch_size: int, language: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Transcribe a batch of recordings inside a pool worker
+    """
+    results: List[Dict[str, Any]] = []
+    recordings: List[Tuple[Dict[str, Any], np.ndarray]] = []
+    for name, source in items:
+        result: Dict[str, Any] = {"name": name}
+        results.append(result)
+        try:
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    source = f.read()
+            samples = decode_audio(source)
+        except (OSError, AudioDecodeError) as e:
+            result["error"] = str(e)
+            continue
+        result["duration"] = len(samples) / whisper.audio.SAMPLE_RATE
+        recordings.append((result, samples))
+
+    if not recordings:
+        return results
+    transcripts = _transcribe_recordings([samples for _, samples in recordings], batch_size,
+                                         _WindowDecoder(_worker_model, language))
+    for (result, _), (text, detected) in zip(recordings, transcripts):
+        result["text"] = text
+        result["language"] = detected
+    return results
+
+
+class TranscriptionJob:
+    """
+    Progress and results of one bulk transcription request
+    """
+
+    def __init__(self, job_id: str, total: int):
+        self.job_id = job_id
+        self.total = total
+        self.status = "queued"
+        self.results: List[Dict[str, Any]] = []
+        self.errors = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    async def add_results(self, results: List[Dict[str, Any]]):
+        async with self._changed:
+            self.status = "running"
+            self.results.extend(results)
+            self.errors += sum(1 for result in results if "error" in result)
+            self._changed.notify_all()
+
+    async def finish(self, status: str = "completed"):
+        async with self._changed:
+            self.status = status
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield results as they complete, ending once the job has finished
+        """
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.results) > sent or self.done)
+                pending = self.results[sent:]
+                finished = self.done
+            for result in pending:
+                yield result
+            sent += len(pending)
+            if finished and sent == len(self.results):
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.results),
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BatchTranscriptionService:
+    """
+    Bulk transcription of recorded calls.
+
+    Jobs are split into batches that run on a process pool; every worker
+    process loads its own Whisper model once and keeps it for its lifetime,
+    so throughput scales with the number of workers (and cores).
+    """
+
+    def __init__(self, model_name: Optional[str] = None, workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, executor: Optional[Executor] = None,
+                 transcribe_batch: Callable[..., List[Dict[str, Any]]] = _transcribe_batch):
+        self.model_name = model_name or settings.WHISPER_MODEL
+        self.workers = workers or settings.BATCH_TRANSCRIPTION_WORKERS or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.BATCH_TRANSCRIPTION_BATCH_SIZE
+        self.max_jobs = settings.BATCH_TRANSCRIPTION_MAX_JOBS
+        self._executor = executor
+        self._transcribe_batch = transcribe_batch
+        self.jobs: "OrderedDict[str, TranscriptionJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawn: forked children would inherit torch's thread pools and locks
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, settings.WHISPER_QUANTIZE_INT8, threads),
+            )
+            logger.info(f"Started {self.workers} transcription workers ({threads} threads each)")
+        return self._executor
+
+    def resolve_manifest(self, paths: List[str]) -> List[BatchItem]:
+        """
+        Map manifest entries to files under BATCH_TRANSCRIPTION_ROOT
+        """
+        root = os.path.realpath(settings.BATCH_TRANSCRIPTION_ROOT)
+        items = []
+        for path in paths:
+            full_path = os.path.realpath(os.path.join(root, path))
+            if os.path.commonpath([root, full_path]) != root:
+                raise ValueError(f"Manifest entry outside the recordings directory: {path}")
+            items.append((path, full_path))
+        return items
+
+    def submit(self, items: List[BatchItem], language: Optional[str] = None) -> TranscriptionJob:
+        """
+        Queue a job and return immediately; poll ``get`` or ``stream`` results
+        """
+        job = TranscriptionJob(uuid.uuid4().hex, len(items))
+        self.jobs[job.job_id] = job
+        self._evict_finished()
+        self._tasks[job.job_id] = asyncio.ensure_future(self._run(job, items, language))
+        return job
+
+    def get(self, job_id: str) -> Optional[TranscriptionJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: TranscriptionJob, items: List[BatchItem], language: Optional[str]):
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        indexed = list(enumerate(items))
+
+        async def run_batch(batch: List[Tuple[int, BatchItem]]):
+            try:
+                results = await loop.run_in_executor(pool, self._transcribe_batch,
+                                                     [item for _, item in batch], self.batch_size, language)
+            except Exception as e:
+                logger.error(f"Transcription batch failed: {str(e)}")
+                results = [{"name": name, "error": str(e)} for _, (name, _) in batch]
+            for (index, _), result in zip(batch, results):
+                result["index"] = index
+            await job.add_results(results)
+
+        try:
+            await asyncio.gather(*(run_batch(indexed[i:i + self.batch_size])
+                                   for i in range(0, len(indexed), self.batch_size)))
+            await job.finish()
+        except asyncio.CancelledError:
+            await job.finish("failed")
+            raise
+        finally:
+            self._tasks.pop(job.job_id, None)
+
+    def _evict_finished(self):
+        # Keep the most recent jobs; running jobs are never dropped
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "jobs": len(self.jobs),
+            "running": len(self._tasks),
+        }
+
+    def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+batch_transcription_service = BatchTranscriptionService()
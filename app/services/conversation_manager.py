@@ -1,13 +1,79 @@
-from typing import Dict, Optional
-from app.models.conversation import Conversation, Message
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.conversation import Conversation, LogEntry
+from app.services.conversation_wal import ConversationWAL
+from app.services.session_backends import MemorySessionBackend, SessionBackend, SQLiteSessionBackend
+import asyncio
 import uuid
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+
+def create_session_backend(kind: Optional[str] = None) -> SessionBackend:
+    """
+    Session backend selected by SESSION_BACKEND ("memory" or "sqlite")
+    """
+    kind = kind or settings.SESSION_BACKEND
+    max_sessions = settings.SESSION_MAX_SESSIONS
+    max_bytes = settings.SESSION_MAX_MB * 1024 * 1024
+    idle_ttl = settings.SESSION_IDLE_TTL_SECONDS
+    if kind == "sqlite":
+        return SQLiteSessionBackend(settings.SESSION_SQLITE_PATH, max_sessions, max_bytes, idle_ttl)
+    if kind != "memory":
+        raise ValueError(f"Unknown session backend: {kind}")
+    return MemorySessionBackend(max_sessions, max_bytes, idle_ttl)
+
+
+def create_conversation_wal(backend: SessionBackend) -> Optional[ConversationWAL]:
+    """
+    Write-ahead log for in-memory conversations when SESSION_WAL_PATH is set.
+    Other backends already persist every turn, so they never get one.
+    """
+    if not settings.SESSION_WAL_PATH or not isinstance(backend, MemorySessionBackend):
+        return None
+    return ConversationWAL(settings.SESSION_WAL_PATH, fsync=settings.SESSION_WAL_FSYNC)
+
+
 class ConversationManager:
-    def __init__(self):
-        self.conversations: Dict[str, Conversation] = {}
+    def __init__(self, backend: Optional[SessionBackend] = None, max_messages: Optional[int] = None,
+                 wal: Optional[ConversationWAL] = None, history_window: Optional[int] = None):
+        self.backend = backend or create_session_backend()
+        self.backend.on_evict = self._on_evict
+        self.max_messages = max_messages or settings.SESSION_MAX_MESSAGES
+        self.history_window = history_window or settings.SESSION_HISTORY_WINDOW
+        self.compactions = 0
+        self._end_listeners: List[Callable[[str], None]] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self.wal = wal if wal is not None else create_conversation_wal(self.backend)
+        self.wal_max_bytes = settings.SESSION_WAL_MAX_MB * 1024 * 1024
+        if self.wal is not None:
+            self._recover()
+
+    def _recover(self):
+        """
+        Reload the conversations that were live when the process last stopped
+        """
+        conversations = self.wal.replay(self.backend.store.idle_ttl_seconds)
+        for conversation in conversations.values():
+            if len(conversation.log) > self.max_messages:
+                self._compact(conversation)
+            self.backend.put(conversation)
+        if conversations:
+            logger.info(f"Recovered {len(conversations)} conversations from {self.wal.path}")
+        self.wal.checkpoint(self.backend.conversations())
+
+    def add_end_listener(self, listener: Callable[[str], None]):
+        """
+        Register a callback run with the session id whenever a conversation ends
+        (explicitly or by eviction), so per-session caches elsewhere live exactly
+        as long as the conversation
+        """
+        self._end_listeners.append(listener)
 
-    
     def create_conversation(self, business_type: str, session_id: Optional[str] = None) -> Conversation:
         if session_id is None:
             session_id = str(uuid.uuid4())
@@ -15,14 +81,40 @@ class ConversationManager:
             session_id=session_id,
             business_type=business_type
         )
-        self.conversations[session_id] = conversation
+        self.save(conversation)
         return conversation
 
     def get_conversation(self, session_id: str) -> Optional[Conversation]:
         """
         Retrieve an existing conversation
         """
-        return self.conversations.get(session_id)
+        return self.backend.get(session_id)
+
+    @contextmanager
+    def turn(self, session_id: str, business_type: str) -> Iterator[Conversation]:
+        """
+        Load (or start) a conversation once, let the caller work on it for the
+        whole turn, then store it once: one backend read and one write per
+        turn however many messages and context updates the turn makes
+        """
+        with metrics.span("session_load"):
+            conversation = self.backend.get(session_id)
+            if conversation is None:
+                conversation = Conversation(session_id=session_id, business_type=business_type)
+        try:
+            yield conversation
+        finally:
+            with metrics.span("session_save"):
+                self.save(conversation)
+
+    def save(self, conversation: Conversation):
+        if len(conversation.log) > self.max_messages:
+            self._compact(conversation)
+        self.backend.put(conversation)
+        if self.wal is not None:
+            self.wal.append_turn(conversation)
+            if self.wal.size_bytes() > self.wal_max_bytes:
+                self.wal.checkpoint(self.backend.conversations())
 
     def add_message(self, session_id: str, role: str, content: str):
         """
@@ -31,9 +123,18 @@ class ConversationManager:
         conversation = self.get_conversation(session_id)
         if conversation:
             conversation.add_message(role, content)
+            self.save(conversation)
         else:
             raise ValueError(f"Conversation {session_id} not found")
 
+    def _compact(self, conversation: Conversation):
+        """
+        Drop the oldest turns down to 3/4 of the cap, so compaction runs once
+        every max_messages/4 appends rather than on every one
+        """
+        conversation.log.compact(max(1, self.max_messages * 3 // 4))
+        self.compactions += 1
+
     def update_context(self, session_id: str, key: str, value: any):
         """
         Update the context of a conversation
@@ -41,22 +142,89 @@ class ConversationManager:
         conversation = self.get_conversation(session_id)
         if conversation:
             conversation.update_context(key, value)
+            self.save(conversation)
         else:
             raise ValueError(f"Conversation {session_id} not found")
 
+    @staticmethod
+    def history(conversation: Conversation) -> list:
+        """
+        The message history of a conversation already in hand
+        """
+        return [entry.to_dict() for entry in conversation.log.entries()]
+
+    def recent_history(self, conversation: Conversation) -> List[LogEntry]:
+        """
+        The last SESSION_HISTORY_WINDOW turns, straight from the conversation
+        log without copying the rest of the history
+        """
+        return conversation.log.last(self.history_window)
+
     def get_conversation_history(self, session_id: str) -> list:
         """
         Get the message history of a conversation
         """
         conversation = self.get_conversation(session_id)
         if conversation:
-            return [{"role": msg.role, "content": msg.content, "timestamp": msg.timestamp} 
-                   for msg in conversation.messages]
+            return self.history(conversation)
         return []
 
     def end_conversation(self, session_id: str):
         """
         End and clean up a conversation
         """
-        if session_id in self.conversations:
-            del self.conversations[session_id] 
\ No newline at end of file
+        if self.backend.delete(session_id):
+            self._notify_end(session_id)
+
+    def _on_evict(self, session_id: str, reason: str):
+        logger.info("Evicted conversation (%s)", reason, extra={"session_id": session_id})
+        self._notify_end(session_id)
+
+    def _notify_end(self, session_id: str):
+        if self.wal is not None:
+            self.wal.end(session_id)
+        for listener in self._end_listeners:
+            listener(session_id)
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = self.backend.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {str(e)}")
+                continue
+            if removed:
+                logger.info(f"Expired or evicted {removed} conversations")
+
+    def start_sweeper(self, interval: Optional[float] = None):
+        """
+        Expire idle conversations in the background on the running event loop
+        """
+        if self._sweeper is None or self._sweeper.done():
+            interval = interval or settings.SESSION_SWEEP_INTERVAL_SECONDS
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever(interval))
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.backend.stats()
+        stats["max_messages"] = self.max_messages
+        stats["compactions"] = self.compactions
+        stats["history_window"] = self.history_window
+        if self.wal is not None:
+            stats["wal"] = {"path": self.wal.path, "bytes": self.wal.size_bytes(), "records": self.wal.records}
+        return stats
+
+    def close(self):
+        if self.wal is not None:
+            self.wal.checkpoint(self.backend.conversations())
+            self.wal.close()
+        self.backend.close()
+
+
+# Shared by the SMS and voice routers
+conversation_manager = ConversationManager()
@@ -0,0 +1,148 @@
+from typing import Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+from app.models.conversation import Conversation, ConversationLog
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationWAL:
+    """
+    Durable write-ahead log of conversation turns, one compact JSON array per line:
+
+        ["n", session_id, business_type, created_at]        conversation started
+        ["m", session_id, offset, role, content, timestamp]  message appended
+        ["c", session_id, context]                           context replaced
+        ["e", session_id]                                    conversation ended
+
+    New messages, and the whole context when it changed, are appended once
+    per turn. ``replay`` rebuilds the live
+    conversations after a restart; ``checkpoint`` rewrites the file with only
+    those conversations so it doesn't grow without bound.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self.records = 0
+
+    @staticmethod
+    def _records(conversation: Conversation, start: int, context: bool) -> List[str]:
+        log = conversation.log
+        lines = []
+        if start == 0:
+            lines.append(json.dumps(["n", conversation.session_id, conversation.business_type,
+                                     round(conversation.created_at, 3)], separators=(",", ":")))
+        for entry in log.since(start):
+            lines.append(json.dumps(["m", conversation.session_id, entry.offset, entry.role, entry.content,
+                                     round(entry.timestamp, 3)], separators=(",", ":")))
+        if context and conversation.context:
+            lines.append(json.dumps(["c", conversation.session_id, conversation.context], separators=(",", ":")))
+        return lines
+
+    def _write(self, lines: List[str]):
+        if not lines:
+            return
+        with self._lock:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records += len(lines)
+
+    def append_turn(self, conversation: Conversation):
+        """
+        Write the messages added, and the context if it changed, since the
+        conversation was last flushed
+        """
+        log = conversation.log
+        if log.flushed >= log.end and log.end > 0 and conversation.context_flushed:
+            return
+        self._write(self._records(conversation, log.flushed, not conversation.context_flushed))
+        log.flushed = log.end
+        conversation.context_flushed = True
+
+    def end(self, session_id: str):
+        self._write([json.dumps(["e", session_id], separators=(",", ":"))])
+
+    def replay(self, idle_ttl_seconds: Optional[float] = None) -> Dict[str, Conversation]:
+        """
+        Conversations still open at the end of the log, skipping any idle
+        for longer than ``idle_ttl_seconds``
+        """
+        conversations: Dict[str, Conversation] = {}
+        with self._lock:
+            self._file.flush()
+            with open(self.path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final write from a crash; everything before it is intact
+                        logger.warning(f"Skipping unreadable WAL record at {self.path}:{number}")
+                        continue
+                    kind, session_id = record[0], record[1]
+                    if kind == "n":
+                        conversations[session_id] = Conversation(
+                            session_id=session_id, business_type=record[2],
+                            created_at=record[3])
+                    elif kind == "e":
+                        conversations.pop(session_id, None)
+                    elif kind == "c" and session_id in conversations:
+                        conversations[session_id].context = record[2]
+                    elif kind == "m" and session_id in conversations:
+                        _, _, offset, role, content, timestamp = record
+                        log = conversations[session_id].log
+                        if offset < log.end:
+                            continue  # Already applied (written again by a checkpoint)
+                        if offset > log.end and not len(log):
+                            log.base = offset  # Older turns were compacted away before a checkpoint
+                        log.append(role, content, timestamp)
+        cutoff = time.time() - idle_ttl_seconds if idle_ttl_seconds else None
+        live = {}
+        for session_id, conversation in conversations.items():
+            log = conversation.log
+            log.flushed = log.end
+            last_active = log.entries()[-1].timestamp if len(log) else conversation.created_at
+            if cutoff is None or last_active >= cutoff:
+                conversation.updated_at = last_active
+                live[session_id] = conversation
+        return live
+
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def checkpoint(self, conversations: Iterable[Conversation]):
+        """
+        Atomically replace the log with just the given (live) conversations
+        """
+        lines = []
+        for conversation in conversations:
+            lines.extend(self._records(conversation, 0, True))
+        temp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + ("\n" if lines else ""))
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        for conversation in conversations:
+            conversation.log.flushed = conversation.log.end
+            conversation.context_flushed = True
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,167 @@
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import torch
+from transformers import pipeline
+from app.core.batching import MicroBatcher
+from app.core.config import settings
+from app.core.executor import inference_executor
+from app.services.kv_cache import SessionKVCache, select_cache, slice_cache, stack_caches
+from app.services.prompt_builder import PromptBuilder
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationService:
+    """
+    GPT-2 text generation shared by every LanguageService in the process.
+
+    Prompts are built as token ids by a PromptBuilder that keeps each session's
+    tokenized history inside the context window. Concurrent prompts are
+    micro-batched: they are left-padded and decoded in a single ``generate``
+    call instead of one forward pass per conversation. The past key/values of
+    each session are kept between turns so a follow-up only runs its new
+    tokens through the model; the cache hits of a batch are continued
+    together in one more ``generate`` call.
+    """
+
+    def __init__(self, model_name: str = "gpt2", model=None, tokenizer=None, do_sample: bool = True):
+        self.model_name = model_name
+        if model is None or tokenizer is None:
+            text_pipeline = pipeline("text-generation", model=model_name)
+            model, tokenizer = text_pipeline.model, text_pipeline.tokenizer
+        self.model = model
+        self.tokenizer = tokenizer
+        self.do_sample = do_sample
+        # GPT-2 has no pad token; pad on the left so every prompt ends where generation starts
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+        self.model.eval()
+        context_tokens = min(settings.GENERATION_CONTEXT_TOKENS,
+                             getattr(self.model.config, "n_positions", settings.GENERATION_CONTEXT_TOKENS))
+        self.prompt_builder = PromptBuilder(
+            self.tokenizer,
+            context_tokens=context_tokens,
+            max_new_tokens=settings.GENERATION_MAX_NEW_TOKENS,
+            max_sessions=settings.GENERATION_MAX_SESSIONS,
+        )
+        self.kv_cache = SessionKVCache(max_bytes=settings.GENERATION_KV_CACHE_MB * 1024 * 1024)
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            inference_executor,
+            max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+            max_wait_ms=settings.GENERATION_MAX_WAIT_MS,
+        )
+
+    def build_prompt(self, session_id: Optional[str], conversation_history: list, user_input: str) -> List[int]:
+        """
+        Token ids of the prompt for the next assistant turn
+        """
+        return self.prompt_builder.build(session_id, conversation_history, user_input)
+
+    async def generate(self, input_ids: List[int], session_id: Optional[str] = None) -> str:
+        """
+        Generate a continuation of the prompt ``input_ids`` (the prompt itself is not included)
+        """
+        return await self.batcher.submit((session_id, input_ids))
+
+    def forget(self, session_id: str):
+        """
+        Drop everything cached for a conversation that has ended
+        """
+        self.prompt_builder.forget(session_id)
+        self.kv_cache.discard(session_id)
+
+    def _generate_batch(self, requests: List[Tuple[Optional[str], List[int]]]) -> List[str]:
+        results: List[Optional[str]] = [None] * len(requests)
+        hits, misses = [], []
+        for index, (session_id, input_ids) in enumerate(requests):
+            cached = self.kv_cache.take(session_id, input_ids) if session_id is not None else None
+            if cached is None:
+                misses.append(index)
+            else:
+                hits.append((index, cached))
+        if hits:
+            texts = self._generate_cached([requests[index] for index, _ in hits], [cached for _, cached in hits])
+            for (index, _), text in zip(hits, texts):
+                results[index] = text
+        if misses:
+            texts = self._generate_padded([requests[index] for index in misses])
+            for index, text in zip(misses, texts):
+                results[index] = text
+        return results
+
+    def _sample(self, input_ids, attention_mask, past_key_values=None):
+        with torch.no_grad():
+            return self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                max_new_tokens=self.prompt_builder.max_new_tokens,
+                num_return_sequences=1,
+                do_sample=self.do_sample,
+                pad_token_id=self.tokenizer.pad_token_id,
+                return_dict_in_generate=True,
+            )
+
+    def _generate_cached(self, requests: List[Tuple[Optional[str], List[int]]],
+                         cached: List[Tuple[Any, int]]) -> List[str]:
+        """
+        Continue every cache hit in one ``generate`` call.
+
+        Each row is laid out as ``[pad] prefix [pad] new tokens``: the cached
+        prefixes are left-padded to the longest one (their keys/values padded
+        with zeros) and the new tokens to the longest suffix, with the
+        attention mask hiding both gaps. Rows are padded to the longest
+        prefix plus the longest suffix, so a batch mixing a long and a short
+        conversation spends attention on the padding; that is still far
+        cheaper than one ``generate`` call per hit.
+        """
+        pad_token_id = self.tokenizer.pad_token_id
+        prefix_length = max(prefix for _, prefix in cached)
+        prompt_length = prefix_length + max(len(ids) - prefix for (_, ids), (_, prefix) in zip(requests, cached))
+        input_ids = torch.full((len(requests), prompt_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), prompt_length), dtype=torch.long)
+        for row, ((_, ids), (_, prefix)) in enumerate(zip(requests, cached)):
+            new_start = prompt_length - (len(ids) - prefix)
+            input_ids[row, prefix_length - prefix:prefix_length] = torch.tensor(ids[:prefix], dtype=torch.long)
+            input_ids[row, new_start:] = torch.tensor(ids[prefix:], dtype=torch.long)
+            attention_mask[row, prefix_length - prefix:prefix_length] = 1
+            attention_mask[row, new_start:] = 1
+        past_key_values = stack_caches([cache for cache, _ in cached], prefix_length)
+        output = self._sample(input_ids, attention_mask, past_key_values)
+        cached_length = output.past_key_values.get_seq_length()
+        generated = torch.arange(prompt_length, cached_length)
+        for row, (session_id, _) in enumerate(requests):
+            # Keep this row's keys/values without the gaps for the session's next turn
+            positions = torch.cat([attention_mask[row].nonzero().flatten(), generated])
+            self.kv_cache.put(session_id, output.sequences[row, positions].tolist(),
+                              select_cache(output.past_key_values, row, positions))
+        return self.tokenizer.batch_decode(output.sequences[:, prompt_length:], skip_special_tokens=True)
+
+    def _generate_padded(self, requests: List[Tuple[Optional[str], List[int]]]) -> List[str]:
+        pad_token_id = self.tokenizer.pad_token_id
+        prompt_length = max(len(ids) for _, ids in requests)
+        input_ids = torch.full((len(requests), prompt_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), prompt_length), dtype=torch.long)
+        for row, (_, ids) in enumerate(requests):
+            input_ids[row, prompt_length - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, prompt_length - len(ids):] = 1
+        output = self._sample(input_ids, attention_mask)
+        cached_length = output.past_key_values.get_seq_length()
+        for row, (session_id, ids) in enumerate(requests):
+            if session_id is None:
+                continue
+            # Keep this row's keys/values without its left padding for the session's next turn
+            start = prompt_length - len(ids)
+            self.kv_cache.put(session_id, output.sequences[row, start:cached_length].tolist(),
+                              slice_cache(output.past_key_values, row, start, cached_length))
+        return self.tokenizer.batch_decode(output.sequences[:, prompt_length:], skip_special_tokens=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "batching": self.batcher.stats(),
+            "prompts": self.prompt_builder.stats(),
+            "kv_cache": self.kv_cache.stats(),
+        }
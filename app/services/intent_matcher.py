@@ -0,0 +1,104 @@
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+import re
+import threading
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+
+
+class IntentMatch(NamedTuple):
+    namespace: str
+    intent: str
+    phrase: str
+    priority: int
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("’", "'"))
+
+
+def _forms(word: str) -> FrozenSet[str]:
+    """
+    The word plus its naive plural forms, so "appetizers" and "dishes" match
+    "appetizer" and "dish" without falling back to substring matching
+    """
+    return frozenset((word, word + "s", word + "es"))
+
+
+class IntentMatcher:
+    """
+    Whole-word multi-phrase matcher shared by the keyword rules of the
+    language, knowledge and sentiment code paths.
+
+    All phrases of a namespace are compiled into one index keyed by their
+    first word (in every accepted form), so matching a message is one
+    tokenizing regex pass plus a dict lookup per word. Every matching phrase
+    is reported, including overlapping ones such as "allergic" and
+    "allergic to", without the substring misfires of ``word in text``
+    ("main" in "remain").
+    """
+
+    def __init__(self):
+        self._rules: List[Tuple[str, str, Tuple[str, ...], int]] = []
+        self._index: Optional[Dict[str, Dict[str, List[Tuple[Tuple[FrozenSet[str], ...], IntentMatch]]]]] = None
+        self._lock = threading.Lock()
+
+    def add(self, namespace: str, intent: str, phrases: Iterable[str], priority: int = 0):
+        """
+        Register phrases for an intent; lower priority values win in ``best``
+        """
+        with self._lock:
+            self._rules.append((namespace, intent, tuple(phrases), priority))
+            self._index = None
+
+    def _compile(self):
+        with self._lock:
+            if self._index is None:
+                index: Dict = {}
+                for namespace, intent, phrases, priority in self._rules:
+                    by_first_word = index.setdefault(namespace, {})
+                    for phrase in phrases:
+                        words = tokenize(phrase)
+                        if not words:
+                            continue
+                        tail = tuple(_forms(word) for word in words[1:])
+                        entry = (tail, IntentMatch(namespace, intent, phrase, priority))
+                        for form in _forms(words[0]):
+                            by_first_word.setdefault(form, []).append(entry)
+                self._index = index
+            return self._index
+
+    def match(self, text: str, namespace: str) -> List[IntentMatch]:
+        """
+        Every matched phrase of ``namespace`` in ``text``, ordered by priority.
+        Each phrase is reported once even if it occurs several times.
+        """
+        index = self._index if self._index is not None else self._compile()
+        by_first_word = index.get(namespace)
+        if not by_first_word:
+            return []
+        tokens = tokenize(text)
+        found = []
+        for position, token in enumerate(tokens):
+            entries = by_first_word.get(token)
+            if entries is None:
+                continue
+            for tail, hit in entries:
+                if tail:
+                    following = tokens[position + 1:position + 1 + len(tail)]
+                    if len(following) < len(tail) or not all(
+                            word in forms for word, forms in zip(following, tail)):
+                        continue
+                if hit not in found:
+                    found.append(hit)
+        found.sort(key=lambda hit: hit.priority)
+        return found
+
+    def best(self, text: str, namespace: str) -> Optional[str]:
+        """
+        Highest-priority intent of ``namespace`` in ``text``, if any
+        """
+        matches = self.match(text, namespace)
+        return matches[0].intent if matches else None
+
+
+intent_matcher = IntentMatcher()
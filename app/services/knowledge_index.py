@@ -0,0 +1,304 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import difflib
+import re
+from app.services.intent_matcher import tokenize
+
+# Item fields that name a record and are searchable by name
+NAME_FIELDS = ("name", "address")
+
+# Item fields whose value is a category of its own (e.g. a property's "type")
+CATEGORY_FIELDS = ("type",)
+
+# Words that never identify an item by themselves
+_STOPWORDS = frozenset((
+    "the", "and", "for", "you", "your", "have", "has", "with", "what", "whats", "any", "are", "how", "much",
+    "does", "can", "get", "give", "show", "tell", "about", "some", "something", "there", "this", "that",
+    "want", "like", "would", "please", "under", "over", "below", "above", "less", "more", "than", "least",
+    "most", "between", "cheaper", "price", "cost", "dollars", "bedroom", "bedrooms", "bathroom", "bathrooms",
+    "square", "feet", "menu", "dish", "dishes", "item", "items", "anything", "options", "all", "one",
+    "who", "where", "when", "which", "many", "near", "good", "best", "cheap", "cheapest",
+))
+
+# Unit words after a number and the numeric field they constrain (price when there is none)
+_UNIT_FIELDS = [
+    (re.compile(r"^(?:bed(?:room)?s?|br)\b"), "bedrooms"),
+    (re.compile(r"^(?:bath(?:room)?s?|ba)\b"), "bathrooms"),
+    (re.compile(r"^(?:sq\.?\s*f(?:ee)?t|square\s+f(?:ee|oo)t|sqft)\b"), "square_feet"),
+]
+
+_NUMBER = r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*([km])?\b"
+_UPPER = r"under|below|less than|cheaper than|up to|at most|no more than|max(?:imum)?|within"
+_LOWER = r"over|above|more than|at least|min(?:imum)?|from"
+_BETWEEN_RE = re.compile(rf"between\s+{_NUMBER}\s*(?:and|-|to)\s*{_NUMBER}\s*")
+_BOUND_RE = re.compile(rf"(?:({_UPPER})|({_LOWER}))\s+{_NUMBER}\s*")
+_EXACT_RE = re.compile(rf"(?<![\w$.])(\d+)\s*-?\s*")
+
+
+def _number(digits: str, suffix: Optional[str]) -> float:
+    value = float(digits.replace(",", ""))
+    return value * {"k": 1_000, "m": 1_000_000}.get(suffix or "", 1)
+
+
+def _unit_field(rest: str) -> Optional[str]:
+    for pattern, field in _UNIT_FIELDS:
+        if pattern.match(rest):
+            return field
+    return None
+
+
+class NumericRange(NamedTuple):
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+    def merge(self, other: "NumericRange") -> "NumericRange":
+        low = other.low if self.low is None else self.low if other.low is None else max(self.low, other.low)
+        high = other.high if self.high is None else self.high if other.high is None else min(self.high, other.high)
+        return NumericRange(low, high)
+
+
+class KnowledgeQuery(NamedTuple):
+    words: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+    ranges: Tuple[Tuple[str, NumericRange], ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.words or self.categories or self.ranges)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "names": list(self.words),
+            "categories": list(self.categories),
+            "ranges": {field: {"min": r.low, "max": r.high} for field, r in self.ranges},
+        }
+
+
+class _ParsedRecord(NamedTuple):
+    record: Dict[str, Any]
+    section: str
+    categories: Tuple[str, ...]
+    words: Tuple[str, ...]
+
+
+class KnowledgeIndex:
+    """
+    In-memory indexes over the records of a knowledge base.
+
+    Every list of dicts in the knowledge base (menu sections, properties,
+    agents) becomes a set of records. Record names are indexed by word for
+    exact, prefix (bisect over the sorted vocabulary) and fuzzy lookup;
+    categories (the section a record came from and its "type") map to record
+    ids; each numeric field such as ``price``, ``bedrooms`` or
+    ``square_feet`` gets a sorted index so range filters are two bisects
+    instead of a scan.
+
+    Given the ``previous`` index, sections the knowledge base still shares
+    with it are not parsed or tokenized again.
+    """
+
+    def __init__(self, knowledge_base: Dict[str, Any], previous: Optional["KnowledgeIndex"] = None):
+        self.records: List[Dict[str, Any]] = []
+        self._names: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+        self._categories: Dict[str, Set[int]] = {}
+        self.sections: Set[str] = set()  # Top-level knowledge base keys, e.g. "menu", "property"
+        self._numeric: Dict[str, Tuple[List[float], List[int]]] = {}
+        # Per top-level key: the section object and its parsed records, reused by the next index
+        # when an update leaves the section untouched (updates are copy-on-write, so identity suffices)
+        self._parsed: Dict[str, Tuple[Any, List[_ParsedRecord]]] = {}
+        self.reparsed = 0
+        for key, value in knowledge_base.items():
+            cached = previous._parsed.get(key) if previous is not None else None
+            if cached is not None and cached[0] is value:
+                parsed = cached[1]
+            else:
+                parsed = []
+                self._parse_section(value, (key,), parsed)
+                self.reparsed += 1
+            self._parsed[key] = (value, parsed)
+            for entry in parsed:
+                self._add_record(entry)
+        self._vocabulary = sorted(self._names)
+        self._build_numeric()
+
+    def _parse_section(self, value: Any, path: Tuple[str, ...], parsed: List["_ParsedRecord"]):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                self._parse_section(child, path + (key,), parsed)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    parsed.append(self._parse_record(item, path))
+
+    def _parse_record(self, item: Dict[str, Any], path: Tuple[str, ...]) -> "_ParsedRecord":
+        categories = [" ".join(key.split("_")) for key in path]
+        categories += [str(item[field]) for field in CATEGORY_FIELDS if isinstance(item.get(field), str)]
+        words = [word for field in NAME_FIELDS if isinstance(item.get(field), str) for word in tokenize(item[field])]
+        return _ParsedRecord({**item, "category": path[-1]}, self._singular(categories[0].lower()),
+                             tuple(self._singular(category.lower()) for category in categories), tuple(words))
+
+    def _add_record(self, entry: "_ParsedRecord"):
+        record_id = len(self.records)
+        self.records.append(entry.record)
+        self.sections.add(entry.section)
+        for category in entry.categories:
+            self._categories.setdefault(category, set()).add(record_id)
+        for word in entry.words:
+            self._names.setdefault(word, set()).add(record_id)
+
+    def _build_numeric(self):
+        values: Dict[str, List[Tuple[float, int]]] = {}
+        for record_id, record in enumerate(self.records):
+            for field, value in record.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.setdefault(field, []).append((float(value), record_id))
+        for field, pairs in values.items():
+            pairs.sort()
+            self._numeric[field] = ([value for value, _ in pairs], [record_id for _, record_id in pairs])
+
+    @staticmethod
+    def _singular(word: str) -> str:
+        # Naive but consistent: only used to compare category names with each other
+        if word.endswith("ies") and len(word) > 4:
+            return word[:-3] + "y"
+        if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            return word[:-1]
+        return word
+
+    def _category_key(self, phrase: str) -> Optional[str]:
+        phrase = phrase.lower().replace("_", " ")
+        for key in (self._singular(phrase), phrase[:-2] if phrase.endswith("es") else None):
+            if key in self._categories:
+                return key
+        return None
+
+    def is_section(self, category: str) -> bool:
+        """
+        Whether ``category`` names a whole top-level section (the menu, all properties)
+        """
+        return self._category_key(category) in self.sections
+
+    @property
+    def numeric_fields(self) -> List[str]:
+        return sorted(self._numeric)
+
+    def lookup_word(self, word: str, prefix: bool = True, fuzzy: bool = True) -> Set[int]:
+        """
+        Records whose name contains ``word``, a word it prefixes, or (failing
+        both) a close spelling of it
+        """
+        word = word.lower()
+        if word in self._names:
+            return set(self._names[word])
+        ids: Set[int] = set()
+        start = bisect_left(self._vocabulary, word)
+        for name_word in self._vocabulary[start:] if prefix else ():
+            if not name_word.startswith(word):
+                break
+            ids |= self._names[name_word]
+        if not ids and fuzzy and len(word) >= 4:
+            for match in difflib.get_close_matches(word, self._vocabulary, n=3, cutoff=0.8):
+                ids |= self._names[match]
+        return ids
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Names of records with a word starting with ``prefix``
+        """
+        ids = self.lookup_word(prefix, fuzzy=False) if prefix else set()
+        return sorted({self._display_name(self.records[i]) for i in ids})[:limit]
+
+    @staticmethod
+    def _display_name(record: Dict[str, Any]) -> str:
+        return next((record[field] for field in NAME_FIELDS if isinstance(record.get(field), str)), "")
+
+    def in_category(self, category: str) -> Set[int]:
+        key = self._category_key(category)
+        return set(self._categories[key]) if key is not None else set()
+
+    def in_range(self, field: str, numeric_range: NumericRange) -> Set[int]:
+        if field not in self._numeric:
+            return set()
+        values, ids = self._numeric[field]
+        start = 0 if numeric_range.low is None else bisect_left(values, numeric_range.low)
+        end = len(values) if numeric_range.high is None else bisect_right(values, numeric_range.high)
+        return set(ids[start:end])
+
+    def parse(self, text: str) -> KnowledgeQuery:
+        """
+        Pull name words, categories and numeric ranges out of a question like
+        "any desserts under $8?" or "2 bedroom homes below 300k"
+        """
+        text = text.lower()
+        ranges: Dict[str, NumericRange] = {}
+
+        def add_range(field: Optional[str], numeric_range: NumericRange):
+            field = field or "price"
+            if field in self._numeric:
+                ranges[field] = ranges.get(field, NumericRange()).merge(numeric_range)
+
+        def between(match: re.Match) -> str:
+            rest = text[match.end():]
+            add_range(_unit_field(rest), NumericRange(_number(match[1], match[2]), _number(match[3], match[4])))
+            return " "
+
+        def bound(match: re.Match) -> str:
+            value = _number(match[3], match[4])
+            add_range(_unit_field(text[match.end():]),
+                      NumericRange(high=value) if match[1] else NumericRange(low=value))
+            return " "
+
+        text = _BETWEEN_RE.sub(between, text)
+        text = _BOUND_RE.sub(bound, text)
+        for match in _EXACT_RE.finditer(text):
+            field = _unit_field(text[match.end():])
+            if field is not None:
+                value = float(match[1])
+                add_range(field, NumericRange(value, value))
+
+        words = tokenize(text)
+        categories = []
+        for size in (2, 1):
+            for i in range(len(words) - size + 1):
+                phrase = " ".join(words[i:i + size])
+                if self._category_key(phrase) is not None and not any(
+                        phrase in category for category in categories):
+                    categories.append(phrase)
+        category_words = {word for category in categories for word in category.split()}
+        # Whole words only (plus typos): prefixes of everyday words misfire, e.g. "call" -> "Calamari"
+        name_words = tuple(word for word in words
+                           if len(word) >= 3 and not word.isdigit() and word not in _STOPWORDS
+                           and word not in category_words and self.lookup_word(word, prefix=False))
+        return KnowledgeQuery(name_words, tuple(categories), tuple(ranges.items()))
+
+    def search(self, query: KnowledgeQuery, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Records matching every part of the query. Each name word narrows the
+        results only if some remaining record matches it, so a stray word
+        doesn't wipe out an otherwise good match.
+        """
+        candidates: Optional[Set[int]] = None
+        for category in query.categories:
+            ids = self.in_category(category)
+            candidates = ids if candidates is None else candidates & ids
+        for field, numeric_range in query.ranges:
+            ids = self.in_range(field, numeric_range)
+            candidates = ids if candidates is None else candidates & ids
+        for word in query.words:
+            ids = self.lookup_word(word)
+            narrowed = ids if candidates is None else candidates & ids
+            if narrowed:
+                candidates = narrowed
+        if candidates is None:
+            return []
+        ordered = self._order(candidates, query)
+        return [self.records[i] for i in ordered[:limit]]
+
+    def _order(self, ids: Iterable[int], query: KnowledgeQuery) -> List[int]:
+        # Records matching more name words first; otherwise cheapest (or in knowledge base order)
+        def key(record_id: int):
+            record = self.records[record_id]
+            hits = sum(1 for word in query.words if record_id in self.lookup_word(word))
+            price = record.get("price")
+            return -hits, price if isinstance(price, (int, float)) else float("inf"), record_id
+        return sorted(ids, key=key)
@@ -0,0 +1,180 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import os
+import zlib
+import numpy as np
+from app.core.config import settings
+from app.services.intent_matcher import tokenize
+from app.services.vector_index import VectorIndex, create_vector_index
+
+logger = logging.getLogger(__name__)
+
+# A knowledge base entry to embed: id -> (text, record returned to callers)
+Documents = Dict[str, Tuple[str, Dict[str, Any]]]
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embeddings: words and character trigrams hashed
+    into a fixed number of signed buckets. Trigrams let misspellings and
+    plurals land near the right entry. Uses crc32 rather than ``hash`` so
+    vectors are identical across processes and restarts.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        features = []
+        for word in tokenize(text):
+            features.append((word, 1.0))
+            padded = f"<{word}>"
+            features.extend((padded[i:i + 3], 0.3) for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dimension] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class TransformerEmbedder:
+    """
+    Mean-pooled sentence embeddings from a Hugging Face encoder, e.g.
+    "sentence-transformers/all-MiniLM-L6-v2"
+    """
+
+    def __init__(self, model_name: str):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        self._torch = torch
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.dimension = self.model.config.hidden_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, max_length=256, return_tensors="pt")
+        with self._torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return self._torch.nn.functional.normalize(pooled, dim=1).numpy()
+
+
+def create_embedder():
+    """
+    Embedder selected by KNOWLEDGE_EMBEDDING_MODEL; hashed features when unset
+    """
+    if settings.KNOWLEDGE_EMBEDDING_MODEL:
+        return TransformerEmbedder(settings.KNOWLEDGE_EMBEDDING_MODEL)
+    return HashingEmbedder(settings.KNOWLEDGE_EMBEDDING_DIM)
+
+
+class KnowledgeRetriever:
+    """
+    Semantic search over knowledge base entries.
+
+    ``sync`` takes the full set of documents each time the knowledge base
+    changes but only embeds documents that are new or whose text changed,
+    and deletes the ones that disappeared, so an update touching one menu
+    item costs one embedding rather than re-embedding the whole tenant.
+
+    A remote index outlives the process, so its digests are saved to
+    ``digests_path`` after every sync. After a restart only the entries that
+    changed meanwhile are embedded again, and ids whose entries were removed
+    while the process was down are deleted from the index.
+    """
+
+    def __init__(self, embedder=None, index: Optional[VectorIndex] = None, batch_size: int = 64,
+                 digests_path: Optional[str] = None):
+        self.embedder = embedder or create_embedder()
+        # Not ``index or ...``: an empty index has no length and is falsy
+        self.index = index if index is not None else create_vector_index(self.embedder.dimension)
+        self.batch_size = batch_size
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        # A local index starts empty, so digests from a previous run would skip entries it never got
+        self.digests_path = digests_path if self.remote else None
+        self._digests: Dict[str, str] = self._load_digests()
+        self.embedded = 0
+
+    @property
+    def remote(self) -> bool:
+        return self.index.remote
+
+    def _fingerprint(self) -> str:
+        """
+        The index and embedding the saved digests describe; vectors from a
+        different model or in a different index are all embedded again
+        """
+        return ":".join([getattr(self.index, "index_name", type(self.index).__name__),
+                         getattr(self.index, "namespace", ""),
+                         getattr(self.embedder, "model_name", type(self.embedder).__name__),
+                         str(self.embedder.dimension)])
+
+    def _load_digests(self) -> Dict[str, str]:
+        if self.digests_path is None:
+            return {}
+        try:
+            with open(self.digests_path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable embedding digests {self.digests_path}: {str(e)}")
+            return {}
+        if stored.get("fingerprint") != self._fingerprint():
+            logger.info(f"Embedding digests in {self.digests_path} are for another index or model")
+            return {}
+        return stored["digests"]
+
+    def _save_digests(self):
+        # Workers sharing the index write the same digests; a per-process temp file keeps them apart
+        temp_path = f"{self.digests_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"fingerprint": self._fingerprint(), "digests": self._digests}, f)
+        os.replace(temp_path, self.digests_path)
+
+    def sync(self, documents: Documents) -> Dict[str, int]:
+        digests = {doc_id: hashlib.sha1(text.encode("utf-8")).hexdigest() for doc_id, (text, _) in documents.items()}
+        changed = [doc_id for doc_id, digest in digests.items() if self._digests.get(doc_id) != digest]
+        removed = [doc_id for doc_id in self._digests if doc_id not in digests]
+        for start in range(0, len(changed), self.batch_size):
+            batch = changed[start:start + self.batch_size]
+            vectors = self.embedder.embed([documents[doc_id][0] for doc_id in batch])
+            self.index.upsert((doc_id, vector, {"digest": digests[doc_id]}) for doc_id, vector in zip(batch, vectors))
+        if removed:
+            self.index.delete(removed)
+        self.embedded += len(changed)
+        self._digests = digests
+        self.documents = {doc_id: record for doc_id, (_, record) in documents.items()}
+        if changed or removed:
+            if self.digests_path is not None:
+                self._save_digests()
+            logger.info(f"Embedded {len(changed)} and removed {len(removed)} knowledge base entries")
+        return {"embedded": len(changed), "removed": len(removed), "total": len(digests)}
+
+    def search_batch(self, texts: Sequence[str], top_k: int, min_score: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """
+        Best matching records for each text, with their similarity as ``score``
+        """
+        vectors = self.embedder.embed(texts)
+        results = []
+        for response in self.index.query_batch(vectors, top_k=top_k, include_metadata=False):
+            results.append([{**self.documents[match["id"]], "score": round(match["score"], 4)}
+                            for match in response["matches"]
+                            if match["score"] >= min_score and match["id"] in self.documents])
+        return results
+
+    def search(self, text: str, top_k: int, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        return self.search_batch([text], top_k, min_score)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self.documents), "embedded": self.embedded, **self.index.describe_index_stats()}
@@ -1,26 +1,87 @@
-from typing import Dict, List, Optional
-import os
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+import asyncio
 import json
+import hashlib
+import os
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.registry import registry
+from app.services.intent_matcher import intent_matcher, tokenize
+from app.services.knowledge_index import KnowledgeIndex, KnowledgeQuery, NumericRange
+from app.services.knowledge_retriever import Documents, KnowledgeRetriever
+from app.services.knowledge_store import Changes, KnowledgeStore, apply_update
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Knowledge base topics in priority order: (type, keywords, knowledge base key, default)
+KNOWLEDGE_RULES = [
+    ("menu", ["menu", "food", "eat", "eating"], "menu", {}),
+    ("hours", ["hours", "open", "close", "closed", "closing"], "hours", "Hours not available"),
+    ("location", ["location", "address", "where"], "location", "Location not available"),
+    ("contact", ["contact", "phone", "call"], "contact", "Contact not available"),
+    ("properties", ["property", "properties", "house", "apartment"], "properties", []),
+    ("agents", ["agent", "realtor", "broker"], "agents", []),
+]
+KNOWLEDGE_TOPICS = {topic: (key, default) for topic, _, key, default in KNOWLEDGE_RULES}
+
+for _priority, (_topic, _keywords, _, _) in enumerate(KNOWLEDGE_RULES):
+    intent_matcher.add("knowledge", _topic, _keywords, _priority)
+
+
+class KnowledgeSnapshot(NamedTuple):
+    """
+    One version of the knowledge base and its index. Never modified: an
+    update builds a new snapshot and swaps it in, so a reader that took
+    ``service.snapshot`` keeps a consistent view without any locking.
+    """
+    version: int  # Bumped on every change; part of every cache key so stale replies are never served
+    seq: int  # Last stored update included
+    knowledge_base: Dict[str, Any]
+    index: KnowledgeIndex
+
+
 class KnowledgeService:
     def __init__(self):
         self.business_type = settings.BUSINESS_TYPE
-        self.knowledge_base = self._load_knowledge_base()
         self.knowledge_file = f"knowledge_{self.business_type}.json"
-        
+        self.store = KnowledgeStore(self.knowledge_file, settings.KNOWLEDGE_SNAPSHOT_EVERY, settings.KNOWLEDGE_LOG_FSYNC)
+        self._update_lock = asyncio.Lock()
+        knowledge_base = self._load_knowledge_base()
+        self.snapshot = KnowledgeSnapshot(0, self.store.seq, knowledge_base, KnowledgeIndex(knowledge_base))
+        self.response_cache = TTLCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+        # Filled by ``start``, off the event loop; empty until then
+        self.retriever = KnowledgeRetriever(digests_path=os.path.splitext(self.knowledge_file)[0] + ".vectors.json")
+        self._retriever_synced = False
+        self._generation = self.store.generation()
+        self._watcher: Optional[asyncio.Task] = None
+        self._initial_sync: Optional[asyncio.Task] = None
+        self._change_listeners: List[Callable[[], None]] = []
+        # Stored but not yet applied in memory: (knowledge base, seq) to publish again
+        self._unpublished: Optional[Tuple[Dict[str, Any], int]] = None
+        self.reloads = 0
+
+    @property
+    def knowledge_base(self) -> Dict[str, Any]:
+        return self.snapshot.knowledge_base
+
+    @property
+    def index(self) -> KnowledgeIndex:
+        return self.snapshot.index
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
     def _load_knowledge_base(self) -> Dict:
         """
         Load knowledge base based on business type
         """
-        # Try to load from file first
+        # Try to load from file first (snapshot plus any logged updates)
         try:
-            if os.path.exists(self.knowledge_file):
-                with open(self.knowledge_file, 'r') as f:
-                    return json.load(f)
+            stored = self.store.load()
+            if stored is not None:
+                return stored
         except Exception as e:
             logger.error(f"Error loading knowledge base from file: {str(e)}")
             
@@ -97,58 +158,287 @@ class KnowledgeService:
         """
         Query the knowledge base based on the user's question
         """
-        query_lower = query.lower()
-        
-        # Simple keyword-based querying
-        if "menu" in query_lower or "food" in query_lower or "eat" in query_lower:
-            return {"type": "menu", "data": self.knowledge_base.get("menu", {})}
-        elif "hours" in query_lower or "open" in query_lower or "close" in query_lower:
-            return {"type": "hours", "data": self.knowledge_base.get("hours", "Hours not available")}
-        elif "location" in query_lower or "address" in query_lower or "where" in query_lower:
-            return {"type": "location", "data": self.knowledge_base.get("location", "Location not available")}
-        elif "contact" in query_lower or "phone" in query_lower or "call" in query_lower:
-            return {"type": "contact", "data": self.knowledge_base.get("contact", "Contact not available")}
-        elif "property" in query_lower or "house" in query_lower or "apartment" in query_lower:
-            return {"type": "properties", "data": self.knowledge_base.get("properties", [])}
-        elif "agent" in query_lower or "realtor" in query_lower or "broker" in query_lower:
-            return {"type": "agents", "data": self.knowledge_base.get("agents", [])}
-        else:
-            return {"type": "unknown", "data": "I don't have information about that."}
-            
-    async def update_knowledge_base(self, data: Dict):
+        # Questions about particular items ("desserts under $8", "2-bedroom under 300k")
+        # get just the matching records; anything else gets the whole topic
+        structured = self.index.parse(query)
+        if structured.words or structured.ranges or any(
+                not self.index.is_section(category) for category in structured.categories):
+            return self.search(structured)
+        # Keyword-based topic lookup, highest-priority topic wins
+        topic = intent_matcher.best(query, "knowledge")
+        if topic is None:
+            matches = await self.semantic_search(query)
+            if matches:
+                return {"type": "semantic", "data": matches}
+        return self._topic_result(topic)
+
+    async def semantic_search(self, query: str, top_k: Optional[int] = None) -> List[Dict]:
+        """
+        Knowledge base entries closest in meaning to ``query``
+        """
+        top_k = top_k or settings.VECTOR_TOP_K
+        if not self._retriever_synced:
+            return []
+        if self.retriever.remote:
+            return await asyncio.to_thread(self.retriever.search, query, top_k, settings.VECTOR_MIN_SCORE)
+        return self.retriever.search(query, top_k, settings.VECTOR_MIN_SCORE)
+
+    @staticmethod
+    def _documents(snapshot: KnowledgeSnapshot) -> Documents:
+        """
+        Every record (menu items, properties, agents, FAQs) plus each plain-text
+        topic (hours, location...) as a document to embed
+        """
+        documents: Documents = {}
+        for record in snapshot.index.records:
+            key = record.get("id") or record.get("name") or record.get("address") or len(documents)
+            doc_id = f"{record['category']}:{key}"
+            while doc_id in documents:
+                doc_id += "+"
+            text = " ".join([record["category"].replace("_", " ")] +
+                            [value for value in record.values() if isinstance(value, str)])
+            documents[doc_id] = (text, record)
+        for key, value in snapshot.knowledge_base.items():
+            if isinstance(value, str):
+                documents[f"topic:{key}"] = (f"{key.replace('_', ' ')}: {value}", {"topic": key, "answer": value})
+        return documents
+
+    def search(self, query: KnowledgeQuery, limit: Optional[int] = None) -> Dict:
+        """
+        Records matching a structured query, at most ``limit`` of them
+        """
+        limit = limit or settings.KNOWLEDGE_QUERY_LIMIT
+
+        def build() -> Dict:
+            records = self.index.search(query)
+            return {"type": "records", "query": query.to_dict(), "total": len(records), "data": records[:limit]}
+        return self.cached(("search", query, limit), build)
+
+    def build_query(self, name: Optional[str] = None, category: Optional[str] = None,
+                    ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None) -> KnowledgeQuery:
+        """
+        Structured query from explicit filters, e.g. ``ranges={"price": (None, 10)}``
+        """
+        return KnowledgeQuery(
+            tuple(tokenize(name)) if name else (),
+            (category,) if category else (),
+            tuple((field, NumericRange(low, high)) for field, (low, high) in (ranges or {}).items()),
+        )
+
+    def _topic_result(self, topic: Optional[str]) -> Dict:
+        def build() -> Dict:
+            if topic is None:
+                return {"type": "unknown", "data": "I don't have information about that."}
+            key, default = KNOWLEDGE_TOPICS[topic]
+            return {"type": topic, "data": self.knowledge_base.get(key, default)}
+        return self.cached(("topic", topic), build)
+
+    def cached(self, key: Tuple[Hashable, ...], factory: Callable[[], Any]) -> Any:
+        """
+        Cache a value derived from the knowledge base until it expires or the
+        knowledge base changes
+        """
+        return self.response_cache.get_or_set((self.version,) + key, factory)
+
+    def render_topic(self, topic: str) -> Tuple[bytes, str]:
+        """
+        Pre-serialized JSON body and ETag for a topic's query result
+        """
+        def build() -> Tuple[bytes, str]:
+            body = json.dumps(self._topic_result(topic)).encode("utf-8")
+            # Content-derived so clients keep their copy when an update didn't touch this topic
+            return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        return self.cached(("rendered", topic), build)
+
+    def add_change_listener(self, listener: Callable[[], None]):
+        """
+        Register a callback run whenever a new version of the knowledge base is
+        published, whether updated here or reloaded from another worker
+        """
+        self._change_listeners.append(listener)
+
+    def _build(self, knowledge_base: Dict[str, Any], seq: int) -> KnowledgeSnapshot:
+        """
+        The next snapshot, with only the sections an update touched reindexed
+        and only the entries whose text changed re-embedded
+        """
+        snapshot = KnowledgeSnapshot(self.version + 1, seq, knowledge_base, KnowledgeIndex(knowledge_base, self.index))
+        self.retriever.sync(self._documents(snapshot))
+        return snapshot
+
+    async def _publish(self, knowledge_base: Dict[str, Any], seq: int):
         """
-        Update the knowledge base with new information and persist to file
+        Build the new snapshot off the event loop, then swap it in; readers
+        pick it up on their next access. If building fails (e.g. the remote
+        index is down) the knowledge base is kept to publish again by
+        ``retry_publish``, and later updates apply on top of it.
         """
         try:
-            # Update in-memory knowledge base
-            for key, value in data.items():
-                if key in self.knowledge_base:
-                    if isinstance(self.knowledge_base[key], dict) and isinstance(value, dict):
-                        # Merge dictionaries
-                        self.knowledge_base[key].update(value)
-                    elif isinstance(self.knowledge_base[key], list) and isinstance(value, list):
-                        # Merge lists
-                        self.knowledge_base[key].extend(value)
-                    else:
-                        # Replace value
-                        self.knowledge_base[key] = value
-                else:
-                    # Add new key
-                    self.knowledge_base[key] = value
-            
-            # Persist to file
-            with open(self.knowledge_file, 'w') as f:
-                json.dump(self.knowledge_base, f, indent=2)
-                
+            self.snapshot = await asyncio.to_thread(self._build, knowledge_base, seq)
+        except Exception:
+            self._unpublished = (knowledge_base, seq)
+            raise
+        self._unpublished = None
+        self._retriever_synced = True
+        self.response_cache.clear()
+        for listener in self._change_listeners:
+            listener()
+
+    def _catch_up(self, changes: Changes) -> Dict[str, Any]:
+        """
+        The knowledge base with updates stored by other workers applied
+        """
+        knowledge_base, entries = changes
+        if knowledge_base is None:
+            knowledge_base = self.knowledge_base if self._unpublished is None else self._unpublished[0]
+        for _, update in entries:
+            knowledge_base = apply_update(knowledge_base, update)
+        return knowledge_base
+
+    async def update_knowledge_base(self, data: Dict):
+        """
+        Update the knowledge base with new information and persist it.
+        Returns whether the update was stored: once it is in the log it is
+        reported as successful, even if applying it here has to be retried.
+        """
+        # One update at a time, so the log order and the in-memory order agree
+        async with self._update_lock:
+            try:
+                if not self.store.has_snapshot:
+                    # First update of a built-in default knowledge base: store the base it applies to
+                    await self.store.run(self.store.snapshot, json.dumps(self.knowledge_base), self.store.seq)
+                # Logged before it is applied, so an acknowledged update is never lost
+                changes, seq = await self.store.run(self.store.append, data)
+            except Exception as e:
+                logger.error(f"Error updating knowledge base: {str(e)}")
+                return False
+
+            knowledge_base = apply_update(self._catch_up(changes), data)
+            try:
+                await self._publish(knowledge_base, seq)
+            except Exception as e:
+                logger.error(f"Stored knowledge base update {seq} but applying it failed, retrying: {str(e)}")
+            try:
+                if self.store.needs_snapshot:
+                    await self.store.run(self.store.snapshot, json.dumps(knowledge_base), seq)
+            except Exception as e:
+                # The log still holds every update; the next update tries the snapshot again
+                logger.error(f"Error writing knowledge base snapshot: {str(e)}")
+
             logger.info(f"Successfully updated knowledge base with {len(data)} items")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error updating knowledge base: {str(e)}")
+
+    async def retry_publish(self) -> bool:
+        """
+        Apply a stored update whose publishing failed; returns whether one
+        was pending
+        """
+        async with self._update_lock:
+            if self._unpublished is None:
+                return False
+            await self._publish(*self._unpublished)
+            logger.info(f"Applied knowledge base update {self.snapshot.seq} on retry")
+            return True
+
+    async def refresh(self) -> bool:
+        """
+        Apply updates other worker processes have stored; returns whether
+        anything changed
+        """
+        # Taken before reading, so a write racing the read is picked up next time
+        generation = self.store.generation()
+        if generation == self._generation:
             return False
-            
+        async with self._update_lock:
+            changes = await self.store.run(self.store.changes_since)
+            self._generation = generation
+            knowledge_base, entries = changes
+            if knowledge_base is None and not entries:
+                return False
+            await self._publish(self._catch_up(changes), self.store.seq)
+            self.reloads += 1
+            logger.info(f"Reloaded knowledge base at update {self.store.seq} "
+                        f"({'snapshot and ' if knowledge_base is not None else ''}{len(entries)} updates)")
+            return True
+
+    async def sync_retriever(self) -> bool:
+        """
+        Embed the current knowledge base into the vector index off the event
+        loop. A failure (e.g. the remote index is unreachable) is logged
+        rather than raised; semantic search returns nothing and the watcher
+        retries until a sync succeeds.
+        """
+        async with self._update_lock:
+            if self._retriever_synced:
+                return True
+            try:
+                await asyncio.to_thread(self.retriever.sync, self._documents(self.snapshot))
+            except Exception as e:
+                logger.error(f"Embedding the knowledge base failed: {str(e)}")
+                return False
+            self._retriever_synced = True
+            return True
+
+    async def start(self, interval: Optional[float] = None):
+        """
+        Embed the knowledge base and start the watcher. A local index is
+        filled before the app serves requests; a remote one in the
+        background, so a slow or unreachable index can't hold up startup.
+        """
+        if self.retriever.remote:
+            self._initial_sync = asyncio.get_running_loop().create_task(self.sync_retriever())
+        else:
+            await self.sync_retriever()
+        self.start_watcher(interval)
+
+    async def _watch_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if not self._retriever_synced:
+                await self.sync_retriever()
+            try:
+                await self.retry_publish()
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Knowledge base reload failed: {str(e)}")
+
+    def start_watcher(self, interval: Optional[float] = None):
+        """
+        Poll the store in the background so updates made through any worker
+        reach this one within ``interval`` seconds
+        """
+        interval = interval or settings.KNOWLEDGE_RELOAD_INTERVAL_SECONDS
+        if interval > 0 and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.get_running_loop().create_task(self._watch_forever(interval))
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        if self._initial_sync is not None:
+            self._initial_sync.cancel()
+            self._initial_sync = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"version": self.version, "reloads": self.reloads, **self.store.stats()}
+
     def get_menu_data(self) -> Optional[Dict]:
         """
         Get menu data for the current business type
         """
-        return self.knowledge_base.get("menu") 
\ No newline at end of file
+        return self.knowledge_base.get("menu")
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Rough size of the in-memory knowledge base, for the model registry report
+        """
+        return len(json.dumps(self.knowledge_base))
+
+    def close(self):
+        self.stop_watcher()
+        self.store.close()
+
+
+# One knowledge base per process, shared by the knowledge API and every LanguageService
+registry.register("knowledge_service", KnowledgeService, eager=True)
+ 
\ No newline at end of file
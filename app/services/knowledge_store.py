@@ -0,0 +1,268 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one worker only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def apply_update(knowledge_base: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A new knowledge base with an update merged in: dicts are merged, lists
+    extended and anything else replaced (the semantics of /knowledge/update).
+
+    Copy-on-write: ``knowledge_base`` is left untouched and the result shares
+    every top-level section the update doesn't mention, so readers holding
+    the old knowledge base never see it change.
+    """
+    merged = dict(knowledge_base)
+    for key, value in data.items():
+        current = merged.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            merged[key] = {**current, **value}
+        elif isinstance(current, list) and isinstance(value, list):
+            merged[key] = current + value
+        else:
+            merged[key] = value
+    return merged
+
+
+# Log entries and what they apply on top of: (snapshot or None, [(seq, update), ...])
+Changes = Tuple[Optional[Dict[str, Any]], List[Tuple[int, Dict[str, Any]]]]
+
+_SNAPSHOT_SEQ_RE = re.compile(rb'\{"seq":(\d+),')
+
+
+class KnowledgeStore:
+    """
+    Durable knowledge base storage: a JSON snapshot plus an append-only log
+    of the updates made since.
+
+    An update appends one line to the log instead of rewriting the whole
+    knowledge base. After ``snapshot_every`` logged updates the current
+    state is written to a new snapshot (temp file, fsync, rename) and the
+    log starts over, so a crash at any point leaves either the old or the
+    new snapshot intact. Every log entry carries a sequence number and the
+    snapshot records the last one it includes, so entries are never applied
+    twice. All writes go through a single writer thread and, across worker
+    processes, an exclusive lock on ``<snapshot>.lock``.
+
+    Several worker processes can share one store. ``seq`` is the last update
+    this process has seen; ``changes_since`` returns what other workers
+    logged after it, and ``generation`` is a cheap fingerprint of the files
+    so a poller only reads them when something was written.
+    """
+
+    def __init__(self, snapshot_path: str, snapshot_every: int = 100, fsync: bool = True):
+        self.snapshot_path = snapshot_path
+        self.log_path = os.path.splitext(snapshot_path)[0] + ".log"
+        self.lock_path = snapshot_path + ".lock"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0  # Sequence number of the last update applied
+        self.logged = 0  # Updates in the log since the snapshot
+        self.snapshots = 0
+        self._lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_snapshot(self) -> Tuple[Optional[Dict[str, Any]], int]:
+        if not os.path.exists(self.snapshot_path):
+            return None, 0
+        with open(self.snapshot_path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and set(data) == {"seq", "knowledge_base"}:
+            return data["knowledge_base"], data["seq"]
+        # A plain knowledge base JSON file, as written before the change log existed
+        return data, 0
+
+    def _read_log(self, after_seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        entries = []
+        if not os.path.exists(self.log_path):
+            return entries
+        with open(self.log_path, "r") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Only the last line can be torn (a crash mid-append); it was never acknowledged
+                    logger.warning(f"Skipping unreadable knowledge log entry at {self.log_path}:{number}")
+                    continue
+                if entry["seq"] > after_seq:
+                    entries.append((entry["seq"], entry["update"]))
+        return entries
+
+    def _truncate_torn_tail(self):
+        # Later appends would otherwise be glued onto the partial line and lost with it
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        The stored knowledge base (snapshot plus logged updates), or None if nothing is stored yet
+        """
+        with self._exclusive():
+            self._truncate_torn_tail()
+        knowledge_base, seq = self._read_snapshot()
+        entries = self._read_log(seq)
+        if knowledge_base is None and not entries:
+            return None
+        knowledge_base = knowledge_base if knowledge_base is not None else {}
+        for seq, update in entries:
+            knowledge_base = apply_update(knowledge_base, update)
+        self.seq = seq
+        self.logged = len(entries)
+        if entries:
+            logger.info(f"Replayed {len(entries)} knowledge base updates from {self.log_path}")
+        return knowledge_base
+
+    def _write_file(self, path: str, content: str):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _snapshot_seq(self) -> int:
+        # The seq leads the snapshot, so it can be read without parsing the knowledge base
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                match = _SNAPSHOT_SEQ_RE.match(f.read(32))
+        except FileNotFoundError:
+            return 0
+        return int(match[1]) if match else 0
+
+    def _changes_since(self, seq: int) -> Changes:
+        # Caller holds the exclusive lock, so no snapshot can drop log entries mid-read
+        snapshot_seq = self._snapshot_seq()
+        knowledge_base = None
+        if snapshot_seq > seq:
+            # Entries up to snapshot_seq have left the log: start again from the snapshot
+            knowledge_base, seq = self._read_snapshot()
+        logged = self._read_log(snapshot_seq)
+        entries = [(s, update) for s, update in logged if s > seq]
+        self.logged = len(logged)
+        self.seq = entries[-1][0] if entries else seq
+        return knowledge_base, entries
+
+    def changes_since(self) -> Changes:
+        """
+        Updates other workers stored since this process last caught up,
+        plus the snapshot they apply to when one has replaced the log
+        entries in between (None otherwise)
+        """
+        with self._exclusive():
+            return self._changes_since(self.seq)
+
+    def append(self, update: Dict[str, Any]) -> Tuple[Changes, int]:
+        """
+        Durably log an update. Returns the changes other workers made first
+        (as ``changes_since``), which the caller applies before its own
+        update, and the update's sequence number.
+        """
+        with self._exclusive():
+            changes = self._changes_since(self.seq)
+            seq = self.seq + 1
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"seq": seq, "update": update}, separators=(",", ":")) + "\n")
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self.seq = seq
+            self.logged += 1
+            return changes, seq
+
+    @staticmethod
+    def _fingerprint(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def generation(self) -> Tuple[Optional[Tuple[int, int, int]], ...]:
+        """
+        Changes whenever any process appends to the log or writes a snapshot
+        """
+        return self._fingerprint(self.snapshot_path), self._fingerprint(self.log_path)
+
+    @property
+    def has_snapshot(self) -> bool:
+        return os.path.exists(self.snapshot_path)
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return self.logged >= self.snapshot_every
+
+    def snapshot(self, serialized_knowledge_base: str, seq: int):
+        """
+        Replace the snapshot with ``serialized_knowledge_base`` (the state after
+        update ``seq``) and drop the log entries it now includes. Skipped when
+        another worker already wrote a snapshot at or past ``seq``: replacing
+        it would lose the updates it folded in and already dropped from the log.
+        """
+        with self._exclusive():
+            existing = self._snapshot_seq() if self.has_snapshot else -1
+            if existing >= seq:
+                self.logged = len(self._read_log(existing))
+                logger.info(f"Skipped knowledge base snapshot at update {seq}: one at update {existing} exists")
+                return
+            self._write_file(self.snapshot_path, f'{{"seq":{seq},"knowledge_base":{serialized_knowledge_base}}}')
+            remaining = [json.dumps({"seq": s, "update": u}, separators=(",", ":"))
+                         for s, u in self._read_log(seq)]
+            self._write_file(self.log_path, "".join(line + "\n" for line in remaining))
+            self.logged = len(remaining)
+            self.snapshots += 1
+        logger.info(f"Wrote knowledge base snapshot at update {seq}")
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-writer")
+        return self._writer
+
+    async def run(self, func, *args) -> Any:
+        """
+        Run a write on the single writer thread, off the event loop
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), func, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "snapshot": self.snapshot_path,
+            "seq": self.seq,
+            "logged_since_snapshot": self.logged,
+            "snapshot_every": self.snapshot_every,
+            "snapshots": self.snapshots,
+        }
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import torch
+from transformers import DynamicCache
+
+logger = logging.getLogger(__name__)
+
+
+def _layer_tensors(cache, layer: int):
+    """
+    (keys, values) for one layer, across the transformers Cache layouts
+    """
+    if hasattr(cache, "layers"):
+        return cache.layers[layer].keys, cache.layers[layer].values
+    return cache.key_cache[layer], cache.value_cache[layer]
+
+
+def _num_layers(cache) -> int:
+    if hasattr(cache, "layers"):
+        return len(cache.layers)
+    return len(cache.key_cache)
+
+
+def cache_nbytes(cache) -> int:
+    total = 0
+    for layer in range(_num_layers(cache)):
+        keys, values = _layer_tensors(cache, layer)
+        total += keys.numel() * keys.element_size() + values.numel() * values.element_size()
+    return total
+
+
+def slice_cache(cache, row: int, start: int, end: int) -> DynamicCache:
+    """
+    Copy positions ``start:end`` of one batch row into a standalone cache
+    """
+    sliced = DynamicCache()
+    for layer in range(_num_layers(cache)):
+        keys, values = _layer_tensors(cache, layer)
+        sliced.update(keys[row:row + 1, :, start:end].clone(), values[row:row + 1, :, start:end].clone(), layer)
+    return sliced
+
+
+def select_cache(cache, row: int, positions: torch.Tensor) -> DynamicCache:
+    """
+    Copy the given (not necessarily contiguous) positions of one batch row
+    into a standalone cache
+    """
+    selected = DynamicCache()
+    for layer in range(_num_layers(cache)):
+        keys, values = _layer_tensors(cache, layer)
+        selected.update(keys[row:row + 1, :, positions], values[row:row + 1, :, positions], layer)
+    return selected
+
+
+def stack_caches(caches: List[Any], length: int) -> DynamicCache:
+    """
+    Batch single-row caches, left-padding each with zeros to ``length``
+    positions; the padding must be masked out by the attention mask
+    """
+    stacked = DynamicCache()
+    for layer in range(_num_layers(caches[0])):
+        keys, values = [], []
+        for cache in caches:
+            row_keys, row_values = _layer_tensors(cache, layer)
+            pad = length - row_keys.shape[2]
+            keys.append(torch.nn.functional.pad(row_keys, (0, 0, pad, 0)))
+            values.append(torch.nn.functional.pad(row_values, (0, 0, pad, 0)))
+        stacked.update(torch.cat(keys), torch.cat(values), layer)
+    return stacked
+
+
+def _common_prefix(cached: List[int], tokens: List[int]) -> int:
+    length = min(len(cached), len(tokens))
+    for index in range(length):
+        if cached[index] != tokens[index]:
+            return index
+    return length
+
+
+class _Entry:
+    __slots__ = ("tokens", "cache", "nbytes")
+
+    def __init__(self, tokens: List[int], cache, nbytes: int):
+        self.tokens = tokens
+        self.cache = cache
+        self.nbytes = nbytes
+
+
+class SessionKVCache:
+    """
+    Per-session GPT-2 past key/values, so a new turn only runs the tokens that
+    differ from what the model already processed for that conversation.
+
+    Entries are evicted least-recently-used once their total size exceeds
+    ``max_bytes``, and dropped when the conversation ends.
+    """
+
+    def __init__(self, max_bytes: int, min_reuse_tokens: int = 8):
+        self.max_bytes = max_bytes
+        self.min_reuse_tokens = min_reuse_tokens
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._reused_tokens = 0
+        self._evictions = 0
+
+    def take(self, session_id: str, tokens: List[int]) -> Optional[Tuple[Any, int]]:
+        """
+        Remove and return ``(cache, prefix_length)`` for the longest cached
+        prefix of ``tokens``, cropped to that prefix, or None on a miss.
+        The caller owns the cache and should ``put`` it back after generating.
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+        # Always leave at least one token for the model to process
+        prefix = min(_common_prefix(entry.tokens, tokens), len(tokens) - 1) if entry is not None else 0
+        with self._lock:
+            if prefix < self.min_reuse_tokens:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._reused_tokens += prefix
+        cached_length = entry.cache.get_seq_length()
+        if prefix < cached_length:
+            entry.cache.crop(prefix - cached_length)
+        return entry.cache, prefix
+
+    def put(self, session_id: str, tokens: List[int], cache):
+        """
+        Store the cache covering ``tokens`` for a session, evicting LRU entries
+        """
+        nbytes = cache_nbytes(cache)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[session_id] = _Entry(tokens, cache, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._evictions += 1
+
+    def discard(self, session_id: str):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "reused_tokens": self._reused_tokens,
+            "evictions": self._evictions,
+        }
@@ -1,17 +1,113 @@
 from typing import Dict, List, Optional
+import asyncio
 import json
+import logging
 import os
 from app.core.config import settings
+from app.core.executor import inference_executor
+from app.core.metrics import metrics
+from app.core.registry import registry
+from app.services.generation_service import GenerationService
+from app.services.intent_matcher import intent_matcher
 from app.services.knowledge_service import KnowledgeService
-from transformers import pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def _load_text_generator():
+    # Initialize a text-generation model like GPT-2, shared and micro-batched across conversations
+    return GenerationService("gpt2")
+
+
+registry.register("text_generator", _load_text_generator, eager=True)
+
+# Keyword rules for canned replies, in priority order: (intent, phrases, reply).
+# Menu category intents have no fixed reply; they list items from the knowledge base.
+REPLY_RULES = [
+    # Menu category inquiries
+    ("appetizers", ["appetizer", "starter", "snack"], None),
+    ("main_courses", ["main", "entree", "dish", "meal"], None),
+    ("desserts", ["dessert", "sweet", "cake"], None),
+    ("beverages", ["drink", "beverage", "wine", "beer"], None),
+    # Order-related patterns
+    ("start_order", ["place an order", "want to order", "would like to order"],
+     "I'd be happy to take your order. What would you like to start with?"),
+    ("add_item", ["add to my order", "add this", "also want"],
+     "I'll add that to your order. Would you like anything else?"),
+    ("remove_item", ["remove from my order", "take this off", "don't want"],
+     "I'll remove that from your order. Is there anything else you'd like to change?"),
+    # Menu questions
+    ("ingredients", ["what's in", "ingredients in", "made with"],
+     "Let me check the ingredients for you. Which item would you like to know about?"),
+    ("allergens", ["contains", "allergens", "allergic"],
+     "I can check for allergens. Which item are you concerned about?"),
+    ("spiciness", ["how spicy", "spice level", "heat level"],
+     "I can tell you about the spice level. Which dish would you like to know about?"),
+    # Special requests
+    ("dietary_restrictions", ["vegetarian", "vegan", "gluten-free"],
+     "We have several options available. Would you like to see our {dietary_restriction} menu?"),
+    ("allergies", ["allergy", "allergic to", "can't eat"],
+     "Please let me know about your allergies, and I'll help you find safe options."),
+    # Order status
+    ("check_status", ["status of my order", "where is my order", "how long"],
+     "Let me check the status of your order. Could you please provide your order number?"),
+]
+MENU_CATEGORY_INTENTS = {intent for intent, _, reply in REPLY_RULES if reply is None}
+REPLY_TEMPLATES = {intent: reply for intent, _, reply in REPLY_RULES if reply is not None}
+
+# Enhanced sentiment lexicon with restaurant-specific terms
+SENTIMENT_WORDS = {
+    "positive": [
+        "good", "great", "excellent", "amazing", "love", "like", "happy", "pleased",
+        "delicious", "tasty", "wonderful", "perfect", "favorite", "recommend", "enjoy"
+    ],
+    "negative": [
+        "bad", "terrible", "awful", "hate", "dislike", "unhappy", "angry", "disappointed",
+        "overcooked", "undercooked", "cold", "spicy", "bland", "expensive", "slow"
+    ],
+}
+
+for _priority, (_intent, _phrases, _) in enumerate(REPLY_RULES):
+    intent_matcher.add("reply", _intent, _phrases, _priority)
+for _intent, _words in SENTIMENT_WORDS.items():
+    intent_matcher.add("sentiment", _intent, _words)
+
 
 class LanguageService:
     def __init__(self):
         self.business_type = settings.BUSINESS_TYPE
         self.responses = self._load_responses()
-        self.knowledge_service = KnowledgeService()
-        # Initialize a text-generation pipeline using a model like GPT-2
-        self.generator = pipeline("text-generation", model="gpt2")
+        self.knowledge_service: KnowledgeService = registry.acquire("knowledge_service")
+        self._generator = None
+        self._generator_lock = asyncio.Lock()
+
+    @property
+    def generator(self) -> GenerationService:
+        """
+        Shared text-generation service, acquired from the registry on first use
+        """
+        if self._generator is None:
+            self._generator = registry.acquire("text_generator")
+        return self._generator
+
+    def close(self):
+        """
+        Release the shared instances held by this service
+        """
+        if self._generator is not None:
+            self._generator = None
+            registry.release("text_generator")
+        if self.knowledge_service is not None:
+            self.knowledge_service = None
+            registry.release("knowledge_service")
+
+    def forget_session(self, session_id: str):
+        """
+        Drop cached prompt state and model key/values for an ended conversation
+        """
+        generator = registry.peek("text_generator")
+        if generator is not None:
+            generator.forget(session_id)
 
     def _load_responses(self) -> Dict:
         """
@@ -70,86 +166,77 @@ class LanguageService:
         
         return default_responses.get(self.business_type, default_responses["restaurant"])
 
-    async def generate_response(self, user_input: str, conversation_history: list) -> str:
+    async def generate_response(self, user_input: str, conversation_history: list,
+                                session_id: Optional[str] = None) -> str:
         """
         Generate a response using a transformer-based model with enhanced restaurant patterns.
+
+        Passing ``session_id`` lets the generator reuse the tokenized history of
+        earlier turns instead of re-encoding the whole conversation.
         """
-        # Check for specific restaurant patterns
-        user_input_lower = user_input.lower()
-        
-        # Menu category inquiries
-        if any(word in user_input_lower for word in ["appetizer", "starter", "snack"]):
-            return self._handle_menu_category("appetizers")
-        elif any(word in user_input_lower for word in ["main", "entree", "dish", "meal"]):
-            return self._handle_menu_category("main_courses")
-        elif any(word in user_input_lower for word in ["dessert", "sweet", "cake"]):
-            return self._handle_menu_category("desserts")
-        elif any(word in user_input_lower for word in ["drink", "beverage", "wine", "beer"]):
-            return self._handle_menu_category("beverages")
-            
-        # Order-related patterns
-        if any(phrase in user_input_lower for phrase in ["place an order", "want to order", "would like to order"]):
-            return "I'd be happy to take your order. What would you like to start with?"
-        elif any(phrase in user_input_lower for phrase in ["add to my order", "add this", "also want"]):
-            return "I'll add that to your order. Would you like anything else?"
-        elif any(phrase in user_input_lower for phrase in ["remove from my order", "take this off", "don't want"]):
-            return "I'll remove that from your order. Is there anything else you'd like to change?"
-            
-        # Menu questions
-        if any(phrase in user_input_lower for phrase in ["what's in", "ingredients in", "made with"]):
-            return "Let me check the ingredients for you. Which item would you like to know about?"
-        elif any(phrase in user_input_lower for phrase in ["contains", "allergens", "allergic"]):
-            return "I can check for allergens. Which item are you concerned about?"
-        elif any(phrase in user_input_lower for phrase in ["how spicy", "spice level", "heat level"]):
-            return "I can tell you about the spice level. Which dish would you like to know about?"
-            
-        # Special requests
-        if any(phrase in user_input_lower for phrase in ["vegetarian", "vegan", "gluten-free"]):
-            return "We have several options available. Would you like to see our {dietary_restriction} menu?"
-        elif any(phrase in user_input_lower for phrase in ["allergy", "allergic to", "can't eat"]):
-            return "Please let me know about your allergies, and I'll help you find safe options."
-            
-        # Order status
-        if any(phrase in user_input_lower for phrase in ["status of my order", "where is my order", "how long"]):
-            return "Let me check the status of your order. Could you please provide your order number?"
+        # Check for specific restaurant patterns in a single pass over the message
+        with metrics.span("intent"):
+            intent = intent_matcher.best(user_input, "reply")
+        if intent in MENU_CATEGORY_INTENTS:
+            metrics.annotate("reply", "knowledge")
+            with metrics.span("knowledge"):
+                return self._handle_menu_category(intent)
+        if intent is not None:
+            metrics.annotate("reply", "rule")
+            return REPLY_TEMPLATES[intent]
             
         # If no specific pattern matches, use the transformer model
-        prompt = "Conversation:\n"
-        for message in conversation_history:
-            prompt += f"{message['role']}: {message['content']}\n"
-        prompt += f"user: {user_input}\nassistant:"
-        
-        result = self.generator(prompt, max_length=500, num_return_sequences=1)
-        generated_text = result[0]['generated_text']
-        response = generated_text[len(prompt):].split("\n")[0].strip()
-        print('Generated from Gpt 2')
+        metrics.annotate("reply", "model")
+        if self._generator is None:
+            async with self._generator_lock:
+                if self._generator is None:
+                    # Not preloaded at startup: load on the inference pool rather than the event loop
+                    await inference_executor.run(lambda: self.generator, timeout=None)
+        try:
+            # Batched with other conversations and run off the event loop;
+            # ExecutorSaturatedError propagates so callers can shed load
+            with metrics.span("generate"):
+                input_ids = self.generator.build_prompt(session_id, conversation_history, user_input)
+                generated_text = await self.generator.generate(input_ids, session_id)
+        except asyncio.TimeoutError:
+            metrics.annotate("reply", "fallback")
+            return self.responses["fallback"]
+        response = generated_text.split("\n")[0].strip()
+        logger.debug("Generated a reply with %s", self.generator.model_name)
         
+        if not response:
+            metrics.annotate("reply", "fallback")
         return response if response else self.responses["fallback"]
 
+    def fixed_responses(self) -> List[str]:
+        """
+        Every reply that doesn't come from the model: the business type's
+        stock phrases, the keyword replies and the menu category lines built
+        from the current knowledge base
+        """
+        responses = [value for value in self.responses.values() if isinstance(value, str)]
+        # Templates still holding a placeholder vary per caller
+        responses += [reply for reply in REPLY_TEMPLATES.values() if "{" not in reply]
+        responses += [self._handle_menu_category(intent) for intent in sorted(MENU_CATEGORY_INTENTS)]
+        return list(dict.fromkeys(responses))
+
     def _handle_menu_category(self, category: str) -> str:
         """Handle menu category inquiries"""
-        menu_data = self.knowledge_service.get_menu_data()
-        if menu_data and category in menu_data:
-            items = [item['name'] for item in menu_data[category]]
-            return self.responses["menu_categories"][category].format(items=", ".join(items))
-        return self.responses["fallback"]
+        def build() -> str:
+            menu_data = self.knowledge_service.get_menu_data()
+            if menu_data and category in menu_data:
+                items = [item['name'] for item in menu_data[category]]
+                return self.responses["menu_categories"][category].format(items=", ".join(items))
+            return self.responses["fallback"]
+        return self.knowledge_service.cached(("menu_category", self.business_type, category), build)
 
     async def analyze_sentiment(self, text: str) -> Dict:
         """
         Enhanced sentiment analysis with restaurant-specific terms
         """
-        positive_words = [
-            "good", "great", "excellent", "amazing", "love", "like", "happy", "pleased",
-            "delicious", "tasty", "wonderful", "perfect", "favorite", "recommend", "enjoy"
-        ]
-        negative_words = [
-            "bad", "terrible", "awful", "hate", "dislike", "unhappy", "angry", "disappointed",
-            "overcooked", "undercooked", "cold", "spicy", "bland", "expensive", "slow"
-        ]
-        
-        text_lower = text.lower()
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
+        matches = intent_matcher.match(text, "sentiment")
+        positive_count = sum(1 for match in matches if match.intent == "positive")
+        negative_count = sum(1 for match in matches if match.intent == "negative")
         
         if positive_count > negative_count:
             sentiment = "positive"
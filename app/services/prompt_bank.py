@@ -0,0 +1,163 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+import asyncio
+import logging
+import os
+import re
+import time
+from app.core.config import settings
+from app.services.tts_service import TTSService, TTSUnavailableError, write_audio_file
+
+logger = logging.getLogger(__name__)
+
+# Where the app mounts the bank's directory as static files
+PROMPT_ROUTE = "/prompts"
+
+
+class PromptBank:
+    """
+    Pre-rendered audio for the fixed replies a caller hears, so voice
+    responses can ``<Play>`` a static file instead of having Twilio
+    ``<Say>`` them or synthesizing them per call.
+
+    The bank covers the voice route's own prompts and every fixed reply of
+    the language service, including the menu lines built from the knowledge
+    base. Files are named after the TTS cache key of (voice, text), so a
+    rebuild after a knowledge base change only synthesizes the replies whose
+    text changed.
+
+    Workers share the directory and may lag behind a knowledge base change
+    or speak with another voice, so each voice gets a subdirectory of its
+    own and a file this worker stops using is only removed once it has gone
+    unused for ``grace_seconds``; another worker may still be handing its
+    URL to Twilio until then.
+    """
+
+    def __init__(self, tts_service: TTSService, language_service, directory: Optional[str] = None,
+                 extra_texts: Iterable[str] = (), base_url: Optional[str] = None,
+                 grace_seconds: Optional[float] = None, clock=time.monotonic):
+        self.tts = tts_service
+        self.language_service = language_service
+        self.directory = directory or settings.PROMPT_BANK_DIR
+        self.extra_texts = list(extra_texts)
+        self.grace_seconds = settings.PROMPT_BANK_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        self._clock = clock
+        self._unused_since: Dict[str, float] = {}  # Path of a file not in the bank -> when it was first seen so
+        base_url = settings.PUBLIC_BASE_URL if base_url is None else base_url
+        self.url_prefix = base_url.rstrip("/") + PROMPT_ROUTE
+        os.makedirs(self.directory, exist_ok=True)
+        self._urls: Dict[str, str] = {}  # Text -> URL of its rendered audio
+        self._dirty = asyncio.Event()
+        self._builder: Optional[asyncio.Task] = None
+        self.builds = 0
+        self.rendered = 0
+        self.removed = 0
+        self.unavailable: Optional[str] = None
+        knowledge_service = getattr(language_service, "knowledge_service", None)
+        if knowledge_service is not None:
+            knowledge_service.add_change_listener(self._dirty.set)
+
+    def texts(self) -> List[str]:
+        return list(dict.fromkeys(self.extra_texts + self.language_service.fixed_responses()))
+
+    def url(self, text: str) -> Optional[str]:
+        """
+        URL of the pre-rendered audio for ``text``, or None if it isn't in the bank
+        """
+        return self._urls.get(text)
+
+    @staticmethod
+    def _voice_directory(voice: str) -> str:
+        return re.sub(r"[^\w.-]", "_", voice)
+
+    def _filename(self, voice: str, text: str) -> str:
+        return f"{self._voice_directory(voice)}/{self.tts.cache.key(voice, text)}.wav"
+
+    def _remove_unused(self, voice: str, current: Set[str]) -> int:
+        """
+        Remove the voice's files that have been out of the bank for the grace period
+        """
+        directory = os.path.join(self.directory, self._voice_directory(voice))
+        now = self._clock()
+        unused = {path for path in (os.path.join(directory, name) for name in os.listdir(directory))
+                  if path.endswith(".wav") and path not in current}
+        self._unused_since = {path: self._unused_since.get(path, now) for path in unused}
+        removed = 0
+        for path, since in list(self._unused_since.items()):
+            if now - since >= self.grace_seconds:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # Another worker removed it first
+                del self._unused_since[path]
+        return removed
+
+    async def build(self) -> Dict[str, int]:
+        """
+        Render every fixed reply missing from the bank and remove the files of
+        replies that have gone unused for the grace period
+        """
+        voice = self.tts.voice
+        urls: Dict[str, str] = {}
+        current: Set[str] = set()
+        rendered = 0
+        for text in self.texts():
+            filename = self._filename(voice, text)
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                _, audio = await self.tts.synthesize(text, voice)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                await asyncio.to_thread(write_audio_file, path, audio)
+                rendered += 1
+            current.add(path)
+            urls[text] = f"{self.url_prefix}/{filename}"
+            # Usable as soon as it is rendered, even while the rest of the bank builds
+            self._urls.setdefault(text, urls[text])
+        self._urls = urls
+        removed = self._remove_unused(voice, current) if current else 0
+        self.builds += 1
+        self.rendered += rendered
+        self.removed += removed
+        return {"prompts": len(urls), "rendered": rendered, "removed": removed}
+
+    async def _build_forever(self):
+        while True:
+            self._dirty.clear()
+            try:
+                result = await self.build()
+                self.unavailable = None
+                logger.info(f"Prompt bank ready: {result['prompts']} prompts "
+                            f"({result['rendered']} rendered, {result['removed']} removed)")
+            except TTSUnavailableError as e:
+                # No voice installed: calls keep using <Say>
+                self.unavailable = str(e)
+                logger.warning(f"Prompt bank not built: {str(e)}")
+            except Exception as e:
+                logger.error(f"Prompt bank build failed: {str(e)}")
+            await self._dirty.wait()
+
+    def start(self):
+        """
+        Build the bank in the background and rebuild it whenever the
+        knowledge base changes
+        """
+        if settings.PROMPT_BANK_ENABLED and (self._builder is None or self._builder.done()):
+            self._builder = asyncio.get_running_loop().create_task(self._build_forever())
+
+    def stop(self):
+        if self._builder is not None:
+            self._builder.cancel()
+            self._builder = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.PROMPT_BANK_ENABLED,
+            "directory": self.directory,
+            "voice": self.tts.voice,
+            "prompts": len(self._urls),
+            "builds": self.builds,
+            "rendered": self.rendered,
+            "removed": self.removed,
+            "pending_removal": len(self._unused_since),
+            "unavailable": self.unavailable,
+        }
@@ -0,0 +1,161 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _SessionPrompt:
+    """
+    Tokenized conversation window for one session
+    """
+    __slots__ = ("turns", "token_count", "consumed", "last_key", "_flat")
+
+    def __init__(self):
+        self.turns: Deque[List[int]] = deque()
+        self.token_count = 0
+        self.consumed = 0  # End offset of the history already tokenized
+        self.last_key: Optional[Tuple] = None  # Identifies the last history entry tokenized
+        self._flat: Optional[List[int]] = []
+
+    def append(self, token_ids: List[int]):
+        self.turns.append(token_ids)
+        self.token_count += len(token_ids)
+        if self._flat is not None:
+            self._flat.extend(token_ids)
+
+    def trim(self, budget: int, keep_last: bool = False):
+        """
+        Drop the oldest turns once the window exceeds ``budget`` tokens.
+
+        The window is cut back to three quarters of the budget so the prompt
+        prefix stays unchanged for the next few turns (keeping the session's
+        KV cache reusable) instead of shifting on every turn. With
+        ``keep_last`` the newest turn (the message being answered) is never
+        dropped; if it doesn't fit on its own, only its last ``budget``
+        tokens are kept.
+        """
+        if self.token_count <= budget:
+            return
+        target = budget * 3 // 4
+        keep = 1 if keep_last else 0
+        while len(self.turns) > keep and self.token_count > target:
+            self.token_count -= len(self.turns.popleft())
+        if self.turns and self.token_count > budget:
+            self.turns[-1] = self.turns[-1][-budget:]
+            self.token_count = len(self.turns[-1])
+        self._flat = None
+
+    def flat(self) -> List[int]:
+        if self._flat is None:
+            self._flat = [token for turn in self.turns for token in turn]
+        return self._flat
+
+
+class PromptBuilder:
+    """
+    Builds GPT-2 prompts as token ids from conversation history.
+
+    Each session's history is tokenized incrementally (only turns added since
+    the previous call are encoded) and kept in a sliding window so the prompt
+    plus ``max_new_tokens`` always fits in the model's context.
+    """
+
+    HEADER = "Conversation:\n"
+    SUFFIX = "assistant:"
+
+    def __init__(self, tokenizer, context_tokens: int, max_new_tokens: int, max_sessions: int):
+        self.tokenizer = tokenizer
+        self.max_new_tokens = max_new_tokens
+        self.max_sessions = max_sessions
+        self._header = self._encode(self.HEADER)
+        self._suffix = self._encode(self.SUFFIX)
+        self.budget = context_tokens - max_new_tokens - len(self._header) - len(self._suffix)
+        if self.budget <= 0:
+            raise ValueError(f"Context of {context_tokens} tokens leaves no room for a prompt")
+        self._sessions: "OrderedDict[str, _SessionPrompt]" = OrderedDict()
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _encode_turn(self, role: str, content: str) -> List[int]:
+        return self._encode(f"{role}: {content}\n")
+
+    @staticmethod
+    def _window(conversation_history: list) -> Tuple[int, int]:
+        """
+        Start and end offsets of the history passed in. Conversation log
+        entries carry their offset in the whole conversation, so a window of
+        recent turns lines up with what was tokenized on earlier turns;
+        plain lists are taken to start at offset 0.
+        """
+        if not conversation_history:
+            return 0, 0
+        end = getattr(conversation_history[-1], "offset", len(conversation_history) - 1) + 1
+        return end - len(conversation_history), end
+
+    @staticmethod
+    def _entry_key(message, offset: int) -> Tuple:
+        """
+        Identifies a history entry. Log entries are keyed by offset and
+        timestamp, so an entry replaced at the same offset is noticed even
+        when it repeats the same text; plain dicts by offset and content.
+        """
+        timestamp = getattr(message, "timestamp", None)
+        if timestamp is None:
+            return offset, message["content"]
+        # Milliseconds, as shared session backends store them
+        return offset, round(timestamp, 3)
+
+    def _get_session(self, session_id: Optional[str], conversation_history: list) -> _SessionPrompt:
+        if session_id is None:
+            return _SessionPrompt()
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+            consumed = state.consumed
+            start, end = self._window(conversation_history)
+            # History was replaced, or moved past the window, since the last turn: start over
+            if consumed > end or consumed < start or (consumed > start and self._entry_key(
+                    conversation_history[consumed - start - 1], consumed - 1) != state.last_key):
+                state = None
+        if state is None:
+            state = _SessionPrompt()
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return state
+
+    def build(self, session_id: Optional[str], conversation_history: list, user_input: str) -> List[int]:
+        """
+        Token ids for the prompt answering ``user_input`` in this session
+        """
+        state = self._get_session(session_id, conversation_history)
+        start, end = self._window(conversation_history)
+        for message in conversation_history[max(0, state.consumed - start):]:
+            state.append(self._encode_turn(message["role"], message["content"]))
+        if conversation_history:
+            state.consumed = end
+            state.last_key = self._entry_key(conversation_history[-1], end - 1)
+
+        # Routes record the user's message before generating; only add it if they didn't
+        pending: List[int] = []
+        last = conversation_history[-1] if conversation_history else None
+        if last is None or last["role"] != "user" or last["content"] != user_input:
+            pending = self._encode_turn("user", user_input)[-self.budget:]
+        # ...and when they did, that turn is the one the prompt can't do without
+        state.trim(self.budget - len(pending), keep_last=not pending)
+        return self._header + state.flat() + pending + self._suffix
+
+    def forget(self, session_id: str):
+        """
+        Drop the cached window for a session that has ended
+        """
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "prompt_budget_tokens": self.budget,
+            "max_new_tokens": self.max_new_tokens,
+        }
@@ -0,0 +1,314 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from app.core.session_store import SessionStore
+from app.models.conversation import Conversation, ConversationLog
+
+logger = logging.getLogger(__name__)
+
+# Rough per-object overheads used to estimate a conversation's memory footprint
+_CONVERSATION_OVERHEAD_BYTES = 2048
+_MESSAGE_OVERHEAD_BYTES = 400
+
+# Single-letter role codes keep stored conversations small
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+# Payloads larger than this are zlib-compressed before storing
+_COMPRESS_THRESHOLD_BYTES = 512
+
+
+def estimate_conversation_bytes(conversation: Conversation) -> int:
+    log = conversation.log
+    return _CONVERSATION_OVERHEAD_BYTES + _MESSAGE_OVERHEAD_BYTES * len(log) + log.content_bytes
+
+
+def encode_conversation(conversation: Conversation) -> bytes:
+    """
+    Compact serialization: role codes, epoch timestamps and no JSON whitespace,
+    zlib-compressed once the conversation is large enough to benefit
+    """
+    payload = {
+        "b": conversation.business_type,
+        "m": [[_ROLE_CODES.get(entry.role, entry.role), entry.content, round(entry.timestamp, 3)]
+              for entry in conversation.log.entries()],
+        "k": conversation.log.base,
+        "c": conversation.context,
+        "t": [round(conversation.created_at, 3), round(conversation.updated_at, 3)],
+    }
+    data = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    if len(data) > _COMPRESS_THRESHOLD_BYTES:
+        return b"z" + zlib.compress(data, 1)
+    return b"j" + data
+
+
+def decode_conversation(session_id: str, data: bytes, version: int = 0) -> Conversation:
+    raw = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    payload = json.loads(raw)
+    created_at, updated_at = payload["t"]
+    log = ConversationLog(base=payload["k"])
+    for role, content, timestamp in payload["m"]:
+        log.append(_ROLE_NAMES.get(role, role), content, timestamp)
+    log.flushed = log.end
+    return Conversation(
+        session_id=session_id,
+        business_type=payload["b"],
+        log=log,
+        context=payload["c"],
+        created_at=created_at,
+        updated_at=updated_at,
+        version=version,
+    )
+
+
+def merge_conversation(stored: Conversation, conversation: Conversation) -> Conversation:
+    """
+    ``stored`` with the messages ``conversation`` added since it was loaded
+    appended after the ones another worker stored meanwhile, and its context
+    keys laid over the stored ones
+    """
+    for entry in conversation.log.since(conversation.log.flushed):
+        stored.log.append(entry.role, entry.content, entry.timestamp)
+    stored.context.update(conversation.context)
+    stored.updated_at = max(stored.updated_at, conversation.updated_at)
+    return stored
+
+
+class SessionBackend(ABC):
+    """
+    Storage for conversations behind ConversationManager.
+
+    ``get`` returns a conversation the caller may modify; changes are only
+    guaranteed to persist once passed back to ``put``. Backends call
+    ``on_evict(session_id, reason)`` for sessions they expire or evict.
+    """
+
+    on_evict: Optional[Callable[[str, str], None]] = None
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Conversation]:
+        ...
+
+    @abstractmethod
+    def put(self, conversation: Conversation):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """
+        Expire idle sessions and enforce capacity limits; returns how many were removed
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def close(self):
+        pass
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Conversations held as live objects in this process (the default)
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, idle_ttl_seconds: float):
+        self.store = SessionStore(max_sessions, max_bytes, idle_ttl_seconds, on_evict=self._evicted)
+
+    def _evicted(self, session_id: Hashable, reason: str):
+        if self.on_evict is not None:
+            self.on_evict(session_id, reason)
+
+    def get(self, session_id: str) -> Optional[Conversation]:
+        return self.store.get(session_id)
+
+    def put(self, conversation: Conversation):
+        size = estimate_conversation_bytes(conversation)
+        if self.store.get(conversation.session_id) is conversation:
+            self.store.resize(conversation.session_id, size)
+        else:
+            self.store.set(conversation.session_id, conversation, size)
+
+    def delete(self, session_id: str) -> bool:
+        return self.store.pop(session_id) is not None
+
+    def sweep(self) -> int:
+        return self.store.sweep()
+
+    def conversations(self) -> List[Conversation]:
+        return self.store.values()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.store.stats()
+        stats["backend"] = "memory"
+        return stats
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Conversations stored in a SQLite file shared by every worker process.
+
+    Stands in for a networked store (Redis and the like): every read and
+    write goes through serialization, so any worker can pick up any
+    conversation. WAL mode lets readers proceed while another worker writes.
+
+    Each row carries a version. ``put`` is a compare-and-set against the
+    version the conversation was loaded at; when another worker stored a
+    turn in between, the new messages are merged into the stored copy and
+    the write retried, so overlapping turns never overwrite each other.
+    """
+
+    max_put_attempts = 10
+
+    def __init__(self, path: str, max_sessions: int, max_bytes: int, idle_ttl_seconds: float,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(sessions)")]
+        if "version" not in columns:
+            # A file written before rows were versioned
+            try:
+                self._connection.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):
+                    raise
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self.reads = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.evictions: Dict[str, int] = {"idle": 0, "sessions": 0, "bytes": 0}
+
+    def get(self, session_id: str) -> Optional[Conversation]:
+        with self._lock:
+            self.reads += 1
+            row = self._connection.execute(
+                "SELECT data, updated_at, version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        if self._clock() - row[1] > self.idle_ttl_seconds:
+            if self.delete(session_id):
+                self._evicted([session_id], "idle")
+            return None
+        return decode_conversation(session_id, row[0], row[2])
+
+    def _store(self, conversation: Conversation) -> bool:
+        # Write only if the stored row is still the version the conversation was loaded at
+        data = encode_conversation(conversation)
+        with self._lock:
+            if conversation.version == 0:
+                cursor = self._connection.execute(
+                    "INSERT INTO sessions (session_id, data, updated_at, version) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(session_id) DO NOTHING", (conversation.session_id, data, self._clock()))
+            else:
+                cursor = self._connection.execute(
+                    "UPDATE sessions SET data = ?, updated_at = ?, version = version + 1 "
+                    "WHERE session_id = ? AND version = ?",
+                    (data, self._clock(), conversation.session_id, conversation.version))
+            if cursor.rowcount == 0:
+                return False
+            self.writes += 1
+        conversation.version += 1
+        conversation.log.flushed = conversation.log.end
+        return True
+
+    def put(self, conversation: Conversation):
+        for _ in range(self.max_put_attempts):
+            if self._store(conversation):
+                return
+            self.conflicts += 1
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT data, version FROM sessions WHERE session_id = ?", (conversation.session_id,)).fetchone()
+            if row is None:
+                # Evicted or ended meanwhile: store this turn's copy as a new conversation
+                conversation.version = 0
+                continue
+            merged = merge_conversation(decode_conversation(conversation.session_id, row[0], row[1]), conversation)
+            # The caller's copy becomes the merged one, so it stays usable after the turn
+            conversation.log, conversation.context = merged.log, merged.context
+            conversation.updated_at, conversation.version = merged.updated_at, merged.version
+        raise RuntimeError(f"Gave up storing conversation after {self.max_put_attempts} conflicting writes")
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def _delete_returning(self, query: str, parameters: tuple) -> List[str]:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [row[0] for row in self._connection.execute(query, parameters)]
+                self._connection.executemany("DELETE FROM sessions WHERE session_id = ?", [(i,) for i in ids])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return ids
+
+    def _evicted(self, session_ids: List[str], reason: str):
+        self.evictions[reason] += len(session_ids)
+        if self.on_evict is not None:
+            for session_id in session_ids:
+                self.on_evict(session_id, reason)
+
+    def sweep(self) -> int:
+        idle = self._delete_returning("SELECT session_id FROM sessions WHERE updated_at < ?",
+                                      (self._clock() - self.idle_ttl_seconds,))
+        self._evicted(idle, "idle")
+        excess = self._delete_returning(
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?", (self.max_sessions,))
+        self._evicted(excess, "sessions")
+        # Drop the least recently updated sessions until the stored bytes fit
+        oversized = self._delete_returning(
+            "SELECT session_id FROM (SELECT session_id, SUM(LENGTH(data)) OVER "
+            "(ORDER BY updated_at DESC ROWS UNBOUNDED PRECEDING) AS running FROM sessions) WHERE running > ?",
+            (self.max_bytes,))
+        self._evicted(oversized, "bytes")
+        return len(idle) + len(excess) + len(oversized)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "reads": self.reads,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "evictions": dict(self.evictions),
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,22 +1,58 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
 import whisper
-import tempfile
+import asyncio
+import functools
 import os
 import logging
+import threading
+import time
+import numpy as np
 import ssl
 import urllib.request
 import urllib.error
 from app.core.config import settings
+from app.core.executor import ExecutorSaturatedError, inference_executor
+from app.core.metrics import metrics
+from app.core.registry import registry
+from app.services.audio import (
+    WAVE_FORMAT_MULAW, WAVE_FORMAT_PCM, WHISPER_SAMPLE_RATE, AudioDecodeError, AudioStreamBuffer,
+    AudioTooLongError, decode_audio, is_compressed, is_wav, parse_wav_header,
+)
+from app.services.streaming_transcriber import StreamingTranscriber
+from app.services.whisper_tiers import WhisperTierRouter, load_whisper_model
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Handlers and formatting are set up once by app.core.log
 logger = logging.getLogger("SpeechService")
 
+# Bytes read before deciding how a stream is encoded (covers WAV headers with extra chunks)
+_PROBE_BYTES = 4096
+# Upper bound for buffered (non-incremental) streams: 48 kHz 16-bit stereo PCM
+_MAX_BYTES_PER_SECOND = 48000 * 2 * 2
+
+def whisper_registry_name(model_name: str, quantize: bool = False) -> str:
+    return f"whisper:{model_name}:int8" if quantize else f"whisper:{model_name}"
+
+
 class SpeechService:
     def __init__(self):
-        self.model = None
+        self.models: Dict[str, Any] = {}
         self.model_name = settings.WHISPER_MODEL
-        logger.info(f"Initialized SpeechService with model: {self.model_name}")
+        self.quantize = settings.WHISPER_QUANTIZE_INT8
+        self._load_lock = threading.Lock()
+        tiers = [name.strip() for name in settings.WHISPER_TIERS.split(",") if name.strip()]
+        self.router = WhisperTierRouter(
+            self.model_name, tiers,
+            queue_depth=lambda: inference_executor.stats()["queue_depth"],
+            queue_threshold=settings.WHISPER_DOWNGRADE_QUEUE_DEPTH,
+            p95_threshold_ms=settings.WHISPER_DOWNGRADE_P95_MS,
+            window_seconds=settings.WHISPER_LATENCY_WINDOW_SECONDS,
+        )
+        self._unavailable_tiers = set()
+        # Every tier is loaded and warmed up at startup when PRELOAD_MODELS is on
+        for tier in self.router.tiers:
+            registry.register(whisper_registry_name(tier, self.quantize),
+                              functools.partial(load_whisper_model, tier, self.quantize), eager=True)
+        logger.info(f"Initialized SpeechService with model: {self.model_name} (tiers: {', '.join(self.router.tiers)})")
         
         # Check if we should disable SSL verification
         self.disable_ssl_verify = os.environ.get("DISABLE_SSL_VERIFY", "false").lower() == "true"
@@ -24,25 +60,34 @@ class SpeechService:
             logger.warning("SSL verification is disabled. This is not recommended for production.")
             ssl._create_default_https_context = ssl._create_unverified_context
 
-    def _load_model(self):
+    @property
+    def model(self):
+        """The primary Whisper model, or None until it has loaded"""
+        return self.models.get(self.model_name)
+
+    def _load_model(self, tier: Optional[str] = None):
         """
-        Load the Whisper model lazily with enhanced error handling
+        Load a Whisper tier (the primary by default) with enhanced error handling
         """
-        if self.model is None:
+        with self._load_lock:
+            self._load_model_locked(tier or self.model_name)
+
+    def _load_model_locked(self, tier: str):
+        if tier not in self.models:
             try:
-                logger.info(f"Attempting to load Whisper model: {self.model_name}")
+                logger.info(f"Attempting to load Whisper model: {tier}")
                 
                 # Check if model is already downloaded
-                model_path = os.path.expanduser(f"~/.cache/whisper/{self.model_name}.pt")
+                model_path = os.path.expanduser(f"~/.cache/whisper/{tier}.pt")
                 if os.path.exists(model_path):
                     logger.info(f"Model file found at: {model_path}")
                     logger.info(f"File size: {os.path.getsize(model_path) / (1024*1024):.2f} MB")
                 else:
                     logger.info(f"Model file not found at: {model_path}, will download")
                 
-                # Try to load the model
-                self.model = whisper.load_model(self.model_name)
-                logger.info(f"Successfully loaded Whisper model: {self.model_name}")
+                # Try to load the model (shared with every other SpeechService in the process)
+                self.models[tier] = registry.acquire(whisper_registry_name(tier, self.quantize))
+                logger.info(f"Successfully loaded Whisper model: {tier}")
                 
             except ssl.SSLCertificateError as e:
                 logger.error(f"SSL Certificate Error: {str(e)}")
@@ -62,64 +107,180 @@ class SpeechService:
                 print(f"Warning: Could not load Whisper model: {str(e)}")
                 print("Using placeholder transcription service")
 
-    async def transcribe_audio(self, audio_data: bytes) -> str:
+    async def transcribe_audio(self, audio_data: bytes, max_seconds: Optional[float] = None) -> str:
         """
-        Transcribe audio data to text using Whisper
+        Transcribe audio data to text using Whisper.
+
+        The payload is decoded in memory (WAV/raw PCM directly, compressed
+        formats through an ffmpeg pipe) and handed to Whisper as an array.
         """
         try:
-            logger.info(f"Transcribing audio data of length: {len(audio_data)} bytes")
-            
-            # Create a temporary file to store the audio data
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                temp_audio.write(audio_data)
-                temp_audio_path = temp_audio.name
-                logger.info(f"Created temporary audio file: {temp_audio_path}")
-
-            # Load model if not loaded
-            self._load_model()
-
-            if self.model is not None:
-                # Transcribe the audio file
-                logger.info(f"Transcribing audio file: {temp_audio_path}")
-                result = self.model.transcribe(temp_audio_path)
-                text = result["text"]
-                logger.info(f"Transcription result: {text}")
-            else:
-                # Placeholder response if model is not available
-                logger.warning("Model not available, using placeholder response")
-                text = "I'm sorry, speech recognition is currently unavailable."
-
-            # Clean up the temporary file
-            os.unlink(temp_audio_path)
-            logger.info(f"Deleted temporary audio file: {temp_audio_path}")
+            logger.info("Transcribing %d bytes of audio", len(audio_data))
 
+            # ffmpeg decoding blocks, so keep it off the event loop
+            with metrics.span("decode"):
+                samples = await asyncio.to_thread(decode_audio, audio_data)
+            logger.debug("Decoded %.2fs of audio", len(samples) / WHISPER_SAMPLE_RATE)
+            if len(samples) == 0:
+                return ""
+            if max_seconds is not None and len(samples) > max_seconds * WHISPER_SAMPLE_RATE:
+                raise AudioTooLongError(f"Audio exceeds the maximum duration of {max_seconds:g} seconds")
+
+            try:
+                text = await self.transcribe_samples(samples)
+                logger.info("Transcribed audio", extra={"transcript": text})
+            except asyncio.TimeoutError:
+                text = "I'm sorry, speech recognition is taking too long. Please try again."
             return text
+        except ExecutorSaturatedError:
+            raise
+        except AudioDecodeError as e:
+            logger.warning("Could not decode audio: %s", e)
+            return f"Error transcribing audio: {str(e)}"
         except Exception as e:
-            logger.error(f"Error transcribing audio: {str(e)}", exc_info=True)
+            logger.error("Error transcribing audio: %s", e, exc_info=True)
             return f"Error transcribing audio: {str(e)}"
 
-    async def process_audio_stream(self, audio_data):
+    async def _model_for(self, tier: str):
+        if tier not in self.models and tier not in self._unavailable_tiers:
+            await inference_executor.run(self._load_model, tier, timeout=None)
+            if tier not in self.models and tier != self.model_name:
+                # Don't retry a downgrade tier that failed to load on every request
+                self._unavailable_tiers.add(tier)
+        return self.models.get(tier)
+
+    async def transcribe_samples(self, samples: np.ndarray, **options) -> str:
+        """
+        Transcribe 16 kHz mono float32 samples, passing the array straight to Whisper.
+        Under load the router may pick a smaller tier than the configured model.
+        """
+        tier = self.router.choose()
+        model = await self._model_for(tier)
+        if model is None and tier != self.model_name:
+            tier = self.model_name
+            model = await self._model_for(tier)
+        if model is None:
+            return "I'm sorry, speech recognition is currently unavailable."
+        started = time.perf_counter()
+        try:
+            with metrics.span("stt"):
+                result = await inference_executor.run(model.transcribe, samples, **options)
+        except ExecutorSaturatedError:
+            raise
+        except Exception:
+            self.router.record_error(tier)
+            raise
+        self.router.record(tier, time.perf_counter() - started, len(samples) / WHISPER_SAMPLE_RATE, result)
+        return result["text"]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per-tier request, latency and confidence counters
+        """
+        stats = self.router.stats()
+        stats["loaded"] = sorted(self.models)
+        stats["quantized"] = self.quantize
+        return stats
+
+    def close(self):
+        """
+        Release the shared Whisper models held by this service
+        """
+        models, self.models = self.models, {}
+        for tier in models:
+            registry.release(whisper_registry_name(tier, self.quantize))
+
+    async def process_audio_stream(self, audio_data, sample_rate: Optional[int] = None,
+                                   encoding: str = "pcm16") -> str:
         """
-        Process audio data from either a stream or a list of chunks
+        Transcribe audio arriving as a list, iterable or async iterator of chunks.
+
+        PCM/mu-law mono WAV, and headerless PCM/mu-law when the caller gives
+        its ``sample_rate``, are transcribed incrementally: speech segments
+        are decoded as soon as they end, while later chunks are still
+        arriving. Other formats are assembled in a growable buffer and
+        decoded once the stream ends.
+        Streams longer than ``AUDIO_MAX_SECONDS`` are rejected.
         """
+        max_seconds = settings.AUDIO_MAX_SECONDS
+        chunks = _iterate_chunks(audio_data)
         try:
-            logger.info("Processing audio stream")
-            
-            # If audio_data is a list, concatenate the chunks
-            if isinstance(audio_data, list):
-                logger.info(f"Processing list of {len(audio_data)} audio chunks")
-                audio_bytes = b"".join(audio_data)
-            else:
-                # If it's an async iterator, collect all chunks
-                logger.info("Processing async iterator of audio chunks")
-                audio_bytes = b""
-                async for chunk in audio_data:
-                    audio_bytes += chunk
-
-            logger.info(f"Collected {len(audio_bytes)} bytes of audio data")
-            
-            # Transcribe the collected audio
-            return await self.transcribe_audio(audio_bytes)
+            logger.debug("Processing audio stream")
+
+            # Read enough of the stream to tell what kind of audio it is
+            head: List[bytes] = []
+            probed = 0
+            async for chunk in chunks:
+                head.append(chunk)
+                probed += len(chunk)
+                if probed >= _PROBE_BYTES:
+                    break
+            prefix = b"".join(head)
+
+            if is_wav(prefix):
+                wav = parse_wav_header(prefix)
+                if wav is not None and wav.channels == 1 and (
+                        (wav.format_tag == WAVE_FORMAT_PCM and wav.sample_width == 2)
+                        or (wav.format_tag == WAVE_FORMAT_MULAW and wav.sample_width == 1)):
+                    encoding = "pcm16" if wav.format_tag == WAVE_FORMAT_PCM else "mulaw"
+                    return await self._transcribe_incrementally(
+                        prefix[wav.data_offset:], chunks, wav.sample_rate, encoding, max_seconds)
+            elif sample_rate is not None and not is_compressed(prefix):
+                return await self._transcribe_incrementally(prefix, chunks, sample_rate, encoding, max_seconds)
+
+            # Any other container or an unusual WAV: the decoder needs the whole payload
+            buffer = AudioStreamBuffer(max_bytes=int(max_seconds * _MAX_BYTES_PER_SECOND))
+            buffer.append(prefix)
+            async for chunk in chunks:
+                buffer.append(chunk)
+            logger.debug("Collected %d bytes of audio data", len(buffer))
+            return await self.transcribe_audio(bytes(buffer.view()), max_seconds=max_seconds)
+        except ExecutorSaturatedError:
+            raise
+        except AudioDecodeError as e:
+            logger.warning("Rejected audio stream: %s", e)
+            return f"Error processing audio stream: {str(e)}"
         except Exception as e:
-            logger.error(f"Error processing audio stream: {str(e)}", exc_info=True)
-            return f"Error processing audio stream: {str(e)}" 
\ No newline at end of file
+            logger.error("Error processing audio stream: %s", e, exc_info=True)
+            return f"Error processing audio stream: {str(e)}"
+
+    async def _transcribe_incrementally(self, first: bytes, chunks: AsyncIterator[bytes],
+                                        sample_rate: int, encoding: str, max_seconds: float) -> str:
+        finals: List[str] = []
+
+        async def collect(event: Dict[str, Any]):
+            if event["type"] == "final":
+                finals.append(event["text"])
+            elif event["type"] == "error":
+                logger.warning("Segment %s failed: %s", event["segment"], event["error"])
+
+        transcriber = StreamingTranscriber(self.transcribe_samples, collect, sample_rate=sample_rate,
+                                           encoding=encoding, partials=False)
+        max_bytes = int(max_seconds * sample_rate * (2 if encoding == "pcm16" else 1))
+        received = len(first)
+        try:
+            if received > max_bytes:
+                raise AudioTooLongError(f"Audio exceeds the maximum duration of {max_seconds:g} seconds")
+            transcriber.feed(first)
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > max_bytes:
+                    raise AudioTooLongError(f"Audio exceeds the maximum duration of {max_seconds:g} seconds")
+                transcriber.feed(chunk)
+                # Let finished segments start decoding while the stream continues
+                await asyncio.sleep(0)
+        except BaseException:
+            transcriber.cancel()
+            raise
+        await transcriber.close()
+        logger.info("Transcribed %d bytes of streamed audio in %d segments", received, len(finals))
+        return " ".join(text for text in finals if text)
+
+
+async def _iterate_chunks(audio_data) -> AsyncIterator[bytes]:
+    if hasattr(audio_data, "__aiter__"):
+        async for chunk in audio_data:
+            yield chunk
+    else:
+        for chunk in audio_data:
+            yield chunk
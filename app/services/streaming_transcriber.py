@@ -0,0 +1,202 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import numpy as np
+from app.core.config import settings
+from app.services.audio import WHISPER_SAMPLE_RATE, mulaw_to_float32, pcm16_to_float32, resample
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 sample buffer addressed by absolute sample index.
+    Old samples are overwritten once more than ``capacity`` have been written.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=np.float32)
+        self.total = 0  # Samples written since the stream started
+
+    def write(self, samples: np.ndarray):
+        if len(samples) >= self.capacity:
+            self._buffer[:] = samples[-self.capacity:]
+            self.total += len(samples)
+            # Keep the buffer layout consistent with total % capacity
+            self._buffer = np.roll(self._buffer, self.total % self.capacity)
+            return
+        offset = self.total % self.capacity
+        first = min(len(samples), self.capacity - offset)
+        self._buffer[offset:offset + first] = samples[:first]
+        self._buffer[:len(samples) - first] = samples[first:]
+        self.total += len(samples)
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Copy of samples ``start:end`` (absolute indices), clipped to what is still buffered
+        """
+        start = max(start, self.total - self.capacity, 0)
+        end = min(end, self.total)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        indices = np.arange(start, end) % self.capacity
+        return self._buffer[indices]
+
+
+class StreamingTranscriber:
+    """
+    Live transcription for one WebSocket connection.
+
+    Incoming PCM is appended to a ring buffer and segmented with an energy
+    voice-activity detector. While someone is speaking, the trailing window of
+    the current segment is re-decoded every ``partial_interval`` to produce a
+    partial hypothesis; when they pause (or the segment hits its maximum
+    length) the whole segment is decoded once more and sent as final. Long
+    segments are split with a small overlap so words at the cut aren't lost.
+    With ``partials=False`` only finals are decoded, for offline ingestion.
+    """
+
+    FRAME_SAMPLES = WHISPER_SAMPLE_RATE * 30 // 1000  # 30 ms VAD frames
+    LEAD_IN_SAMPLES = WHISPER_SAMPLE_RATE * 200 // 1000  # Audio kept before the first voiced frame
+
+    def __init__(self, transcribe: Callable[[np.ndarray], Awaitable[str]],
+                 send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 sample_rate: int = WHISPER_SAMPLE_RATE, encoding: str = "pcm16", partials: bool = True):
+        if encoding not in ("pcm16", "mulaw"):
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self.transcribe = transcribe
+        self.send = send
+        self.sample_rate = sample_rate
+        self.encoding = encoding
+        self.partials = partials
+        rate = WHISPER_SAMPLE_RATE
+        self.vad_threshold = settings.STREAM_VAD_THRESHOLD
+        self.silence_samples = rate * settings.STREAM_SILENCE_MS // 1000
+        self.partial_samples = rate * settings.STREAM_PARTIAL_INTERVAL_MS // 1000
+        self.window_samples = int(rate * settings.STREAM_WINDOW_SECONDS)
+        self.max_segment_samples = int(rate * settings.STREAM_MAX_SEGMENT_SECONDS)
+        self.overlap_samples = rate * settings.STREAM_OVERLAP_MS // 1000
+        self.ring = AudioRingBuffer(self.max_segment_samples + self.window_samples + rate)
+
+        self._vad_position = 0  # Next sample index the VAD has not looked at
+        self._noise_floor = 0.0
+        self._segment_start: Optional[int] = None
+        self._last_voice = 0
+        self._last_partial = 0
+        self._segment_id = 0
+        self._partial_task: Optional[asyncio.Task] = None
+        self._finals: Optional[asyncio.Task] = None
+        self._carry = b""  # Odd trailing byte of a pcm16 frame split mid-sample
+
+    def feed(self, data: bytes):
+        """
+        Buffer one frame of audio and schedule any decoding it makes due
+        """
+        if self.encoding == "mulaw":
+            samples = mulaw_to_float32(data)
+        else:
+            if self._carry:
+                data = self._carry + data
+            self._carry = data[len(data) - len(data) % 2:]
+            samples = pcm16_to_float32(data)
+        self.ring.write(resample(samples, self.sample_rate))
+        self._run_vad()
+
+    def _is_voice(self, frame: np.ndarray) -> bool:
+        energy = float(np.sqrt(np.mean(frame * frame)))
+        voiced = energy > max(self.vad_threshold, self._noise_floor * 3.0)
+        if not voiced:
+            # Track background noise so a noisy line doesn't count as speech
+            self._noise_floor = 0.95 * self._noise_floor + 0.05 * energy
+        return voiced
+
+    def _run_vad(self):
+        while self.ring.total - self._vad_position >= self.FRAME_SAMPLES:
+            frame_end = self._vad_position + self.FRAME_SAMPLES
+            voiced = self._is_voice(self.ring.read(self._vad_position, frame_end))
+            self._vad_position = frame_end
+            if voiced:
+                self._last_voice = frame_end
+                if self._segment_start is None:
+                    # Include a little lead-in so the first syllable isn't clipped
+                    self._segment_start = max(0, frame_end - self.FRAME_SAMPLES - self.LEAD_IN_SAMPLES)
+                    self._last_partial = self._segment_start
+            if self._segment_start is None:
+                continue
+            if frame_end - self._last_voice >= self.silence_samples:
+                self._finalize(self._last_voice)
+            elif frame_end - self._segment_start >= self.max_segment_samples:
+                self._finalize(frame_end, carry_over=True)
+            elif self.partials and frame_end - self._last_partial >= self.partial_samples:
+                self._schedule_partial(frame_end)
+
+    def _schedule_partial(self, end: int):
+        self._last_partial = end
+        # Partials are best-effort: skip rather than queue behind a decode in progress
+        if self._partial_task is not None and not self._partial_task.done():
+            return
+        start = max(self._segment_start, end - self.window_samples)
+        samples = self.ring.read(start, end)
+        segment_id = self._segment_id
+        self._partial_task = asyncio.ensure_future(self._decode_partial(segment_id, samples))
+
+    async def _decode_partial(self, segment_id: int, samples: np.ndarray):
+        try:
+            text = await self.transcribe(samples)
+        except Exception as e:
+            logger.debug("Skipping partial transcription: %s", e)
+            return
+        # A final for this segment may already have been sent
+        if segment_id == self._segment_id:
+            await self.send({"type": "partial", "segment": segment_id, "text": text.strip()})
+
+    def _finalize(self, end: int, carry_over: bool = False):
+        start = self._segment_start
+        samples = self.ring.read(start, end + self.overlap_samples if not carry_over else end)
+        segment_id = self._segment_id
+        self._segment_id += 1
+        if carry_over:
+            # Continue straight into the next segment, overlapping the cut
+            self._segment_start = end - self.overlap_samples
+            self._last_partial = end
+        else:
+            self._segment_start = None
+        previous = self._finals
+        self._finals = asyncio.ensure_future(self._decode_final(previous, segment_id, start, end, samples))
+
+    async def _decode_final(self, previous: Optional[asyncio.Task], segment_id: int,
+                            start: int, end: int, samples: np.ndarray):
+        # Finals are decoded and sent strictly in order
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            text = await self.transcribe(samples)
+        except Exception as e:
+            await self.send({"type": "error", "segment": segment_id, "error": str(e)})
+            return
+        await self.send({
+            "type": "final",
+            "segment": segment_id,
+            "text": text.strip(),
+            "start": start / WHISPER_SAMPLE_RATE,
+            "end": end / WHISPER_SAMPLE_RATE,
+        })
+
+    async def close(self):
+        """
+        Finalize any speech still in progress and wait for pending decodes
+        """
+        if self._segment_start is not None:
+            self._finalize(self.ring.total)
+        pending: List[asyncio.Task] = [task for task in (self._partial_task, self._finals) if task is not None]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def cancel(self):
+        """
+        Abandon pending decodes when the client has gone away
+        """
+        for task in (self._partial_task, self._finals):
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,42 +1,333 @@
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import functools
+import hashlib
+import logging
 import os
-import tempfile
-import subprocess
-from typing import Optional
+import re
+import threading
 from app.core.config import settings
+from app.core.executor import inference_executor
+from app.core.metrics import metrics
+from app.core.registry import registry
+from app.services.audio import parse_wav_header, pcm16_to_wav
+
+logger = logging.getLogger(__name__)
+
+# Split after sentence punctuation so streaming can start on the first sentence
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+# Cached audio is streamed back in chunks of this many bytes
+_STREAM_CHUNK_BYTES = 32 * 1024
+
+
+class TTSUnavailableError(Exception):
+    """Raised when a voice cannot be loaded (Piper not installed or voice model missing)"""
+
+
+def write_audio_file(path: str, audio: bytes):
+    """
+    Write ``path`` atomically. Workers share the audio directories, so the
+    temp file is named per process and thread and a reader never sees a
+    half-written file.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(audio)
+    os.replace(temp_path, path)
+
+
+def piper_registry_name(voice: str) -> str:
+    return f"piper:{voice}"
+
+
+def load_piper_voice(voices_dir: str, voice: str, use_cuda: bool = False):
+    """
+    Load a Piper ONNX voice (``<voice>.onnx`` plus ``<voice>.onnx.json``) and
+    run one short synthesis so the first caller doesn't pay for ONNX Runtime
+    initialisation
+    """
+    model_path = os.path.join(voices_dir, f"{voice}.onnx")
+    if not os.path.exists(model_path):
+        raise TTSUnavailableError(f"Piper voice not found: {model_path}")
+    try:
+        from piper.voice import PiperVoice
+    except ImportError:
+        raise TTSUnavailableError("piper-tts is required for text-to-speech")
+    piper_voice = PiperVoice.load(model_path, config_path=f"{model_path}.json", use_cuda=use_cuda)
+    for _ in piper_voice.synthesize_stream_raw("Hello."):
+        pass
+    logger.info(f"Loaded Piper voice {voice} ({piper_voice.config.sample_rate} Hz)")
+    return piper_voice
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_RE.split(text.strip()) if sentence]
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized WAV audio.
+
+    Entries are keyed by a hash of (voice, text), so a greeting or menu
+    readout is synthesized once and then served from memory or disk. Both
+    tiers are bounded by size and evict the least recently used entries;
+    disk entries are files under ``<directory>/<key[:2]>/<key>.wav`` and
+    survive restarts.
+    """
+
+    def __init__(self, directory: str, max_disk_bytes: int, max_memory_bytes: int):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = {"memory": 0, "disk": 0}
+        self._scan()
+
+    @staticmethod
+    def key(voice: str, text: str) -> str:
+        return hashlib.sha256(f"{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.wav")
+
+    def _scan(self):
+        # Rebuild the disk LRU from file access order left by a previous run
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".wav"):
+                    stat = os.stat(os.path.join(root, name))
+                    files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions["memory"] += 1
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions["disk"] += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return audio
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with open(self.path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            # Removed behind our back (e.g. by hand); forget it
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits["disk"] += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> str:
+        """
+        Store audio under ``key``; returns the path of its file
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_audio_file(path, audio)
+        with self._lock:
+            self._disk_bytes += len(audio) - self._disk.pop(key, 0)
+            self._disk[key] = len(audio)
+            self._remember(key, audio)
+            self._evict_disk()
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "evictions": dict(self.evictions),
+            }
+
 
 class TTSService:
-    def __init__(self):
-        self.voice = "en_US-amy-medium"  # Default voice
-        self.output_dir = tempfile.gettempdir()
-        
+    """
+    Text-to-speech with local Piper voices.
+
+    Voices are loaded once per process through the model registry (the
+    default voice at startup) and synthesis runs on the inference executor.
+    Results go through an AudioCache, and concurrent requests for the same
+    audio share one synthesis.
+    """
+
+    def __init__(self, cache: Optional[AudioCache] = None):
+        self.voice = settings.TTS_VOICE
+        self.voices_dir = settings.TTS_VOICES_DIR
+        self.use_cuda = settings.TTS_USE_CUDA
+        self.cache = cache or AudioCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_MB * 1024 * 1024,
+                                         settings.TTS_MEMORY_CACHE_MB * 1024 * 1024)
+        self.models: Dict[str, Any] = {}
+        self._load_lock = threading.Lock()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.synthesized = 0
+        self._register(self.voice, eager=os.path.exists(os.path.join(self.voices_dir, f"{self.voice}.onnx")))
+
+    def _register(self, voice: str, eager: bool = False):
+        registry.register(piper_registry_name(voice),
+                          functools.partial(load_piper_voice, self.voices_dir, voice, self.use_cuda), eager=eager)
+
+    def _model(self, voice: str):
+        model = self.models.get(voice)
+        if model is None:
+            with self._load_lock:
+                model = self.models.get(voice)
+                if model is None:
+                    self._register(voice)
+                    model = registry.acquire(piper_registry_name(voice))
+                    self.models[voice] = model
+        return model
+
+    def _synthesize_pcm(self, voice: str, text: str) -> bytes:
+        return b"".join(self._model(voice).synthesize_stream_raw(text))
+
+    def _synthesize_wav(self, voice: str, text: str) -> bytes:
+        return pcm16_to_wav(self._synthesize_pcm(voice, text), self._model(voice).config.sample_rate)
+
+    async def sample_rate(self, voice: Optional[str] = None) -> int:
+        voice = voice or self.voice
+        # Loading a voice can take a while; don't hold it to the per-request timeout
+        model = await inference_executor.run(self._model, voice, timeout=None)
+        return model.config.sample_rate
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> Tuple[str, bytes]:
+        """
+        WAV audio for ``text`` and its cache key, synthesized only on a cache miss
+        """
+        voice = voice or self.voice
+        key = self.cache.key(voice, text)
+        audio = self.cache.get(key)
+        if audio is not None:
+            return key, audio
+        pending = self._pending.get(key)
+        if pending is not None:
+            return key, await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            with metrics.span("tts"):
+                audio = await inference_executor.run(self._synthesize_wav, voice, text)
+            await asyncio.to_thread(self.cache.put, key, audio)
+            self.synthesized += 1
+            future.set_result(audio)
+            return key, audio
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't let asyncio warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
     async def text_to_speech(self, text: str, output_path: Optional[str] = None) -> str:
         """
-        Convert text to speech
-        
-        Note: This is a placeholder implementation. In a real implementation,
-        you would use Piper or another TTS engine to generate the audio.
+        Convert text to speech; returns the path of a WAV file. Without
+        ``output_path`` this is the cached file, which may be evicted later.
         """
+        key, audio = await self.synthesize(text)
         if output_path is None:
-            output_path = os.path.join(self.output_dir, f"tts_{os.urandom(8).hex()}.wav")
-            
-        # In a real implementation, you would use Piper here
-        # For now, we'll just create an empty file
-        with open(output_path, 'wb') as f:
-            f.write(b'')
-            
+            path = self.cache.path(key)
+            if os.path.exists(path):
+                return path
+            output_path = await asyncio.to_thread(self.cache.put, key, audio)
+            return output_path
+        with open(output_path, "wb") as f:
+            f.write(audio)
         return output_path
-        
+
+    async def stream(self, text: str, voice: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        16-bit mono PCM at ``sample_rate(voice)``, one chunk per sentence as
+        each is synthesized, so playback can start before the rest is ready.
+        The whole utterance is cached once the last sentence is done.
+        """
+        voice = voice or self.voice
+        key = self.cache.key(voice, text)
+        audio = self.cache.get(key)
+        if audio is not None:
+            fmt = parse_wav_header(audio)
+            for start in range(fmt.data_offset, len(audio), _STREAM_CHUNK_BYTES):
+                yield audio[start:start + _STREAM_CHUNK_BYTES]
+            return
+        sample_rate = await self.sample_rate(voice)
+        chunks = []
+        for sentence in split_sentences(text):
+            with metrics.span("tts"):
+                pcm = await inference_executor.run(self._synthesize_pcm, voice, sentence)
+            chunks.append(pcm)
+            yield pcm
+        await asyncio.to_thread(self.cache.put, key, pcm16_to_wav(b"".join(chunks), sample_rate))
+        self.synthesized += 1
+
     async def get_available_voices(self) -> list:
         """
-        Get a list of available voices
-        
-        Note: This is a placeholder implementation.
+        Get a list of available voices (the Piper models in TTS_VOICES_DIR)
         """
-        # In a real implementation, you would query Piper for available voices
-        return ["en_US-amy-medium", "en_US-amy-low", "en_US-amy-high"]
-        
+        if not os.path.isdir(self.voices_dir):
+            return []
+        return sorted(name[:-len(".onnx")] for name in os.listdir(self.voices_dir)
+                      if name.endswith(".onnx") and os.path.exists(os.path.join(self.voices_dir, f"{name}.json")))
+
     def set_voice(self, voice: str):
         """
         Set the voice to use for text-to-speech
         """
-        self.voice = voice 
\ No newline at end of file
+        self.voice = voice
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "voice": self.voice,
+            "loaded_voices": sorted(self.models),
+            "synthesized": self.synthesized,
+            "in_flight": len(self._pending),
+            "cache": self.cache.stats(),
+        }
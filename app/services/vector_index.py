@@ -0,0 +1,280 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+import threading
+import numpy as np
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (id, values, metadata), the record shape Pinecone's upsert takes
+VectorRecord = Tuple[str, Sequence[float], Optional[Dict[str, Any]]]
+
+
+class VectorIndex(ABC):
+    """
+    The subset of Pinecone's index API the knowledge base uses, so the local
+    NumPy index and a hosted Pinecone index are interchangeable.
+
+    ``query`` returns ``{"matches": [{"id", "score", "metadata"}, ...]}``
+    ordered by descending cosine similarity.
+    """
+
+    # Whether calls go over the network (and so belong off the event loop)
+    remote = False
+
+    @abstractmethod
+    def upsert(self, vectors: Iterable[VectorRecord]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def query(self, vector: Sequence[float], top_k: int = 10, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        ...
+
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 10, include_metadata: bool = True,
+                    filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return [self.query(vector, top_k, include_metadata, filter) for vector in vectors]
+
+    @abstractmethod
+    def describe_index_stats(self) -> Dict[str, Any]:
+        ...
+
+
+def _matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    # Pinecone's metadata filter language, limited to equality and $in/$nin
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    In-process vector index over a NumPy matrix of unit vectors.
+
+    Queries are one matrix product against every stored vector (batched when
+    several queries come at once) followed by ``argpartition`` for the top
+    k, which is exact and fast up to tens of thousands of vectors. Beyond
+    ``ann_min_vectors`` an inverted-file index is trained (k-means centroids
+    over the stored vectors) and each query only scores the vectors in its
+    ``ann_probes`` nearest clusters.
+    """
+
+    def __init__(self, dimension: int, ann_min_vectors: int = 20000, ann_probes: int = 8):
+        self.dimension = dimension
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_probes = ann_probes
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((64, dimension), dtype=np.float32)
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._clusters = np.zeros(64, dtype=np.int32)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _grow(self, size: int):
+        if size <= len(self._matrix):
+            return
+        capacity = max(size, len(self._matrix) * 2)
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+        clusters = np.zeros(capacity, dtype=np.int32)
+        clusters[:len(self._ids)] = self._clusters[:len(self._ids)]
+        self._clusters = clusters
+
+    def upsert(self, vectors: Iterable[VectorRecord]):
+        records = list(vectors)
+        if not records:
+            return
+        values = self._normalize(np.asarray([values for _, values, _ in records], dtype=np.float32))
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {values.shape[1]}")
+        with self._lock:
+            self._grow(len(self._ids) + len(records))
+            for (vector_id, _, metadata), vector in zip(records, values):
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(metadata or {})
+                else:
+                    self._metadata[row] = metadata or {}
+                self._matrix[row] = vector
+                if self._centroids is not None:
+                    self._clusters[row] = int(np.argmax(self._centroids @ vector))
+            self._maybe_train()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            for vector_id in ids:
+                row = self._rows.pop(vector_id, None)
+                if row is None:
+                    continue
+                # Move the last vector into the hole so rows stay contiguous
+                last = len(self._ids) - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    self._matrix[row] = self._matrix[last]
+                    self._clusters[row] = self._clusters[last]
+                    self._ids[row] = moved_id
+                    self._metadata[row] = self._metadata[last]
+                    self._rows[moved_id] = row
+                self._ids.pop()
+                self._metadata.pop()
+            if self._centroids is not None and len(self._ids) < self.ann_min_vectors // 2:
+                self._centroids = None
+
+    def _maybe_train(self):
+        size = len(self._ids)
+        if size < self.ann_min_vectors or (self._centroids is not None and size < 2 * self._trained_size):
+            return
+        # sqrt(n) clusters, a few rounds of spherical k-means on a sample
+        vectors = self._matrix[:size]
+        count = max(1, int(np.sqrt(size)))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(size, min(size, count * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), count, replace=False)]
+        for _ in range(10):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = self._normalize(sums)
+        self._centroids = centroids
+        self._clusters[:size] = np.argmax(vectors @ centroids.T, axis=1)
+        self._trained_size = size
+        logger.info(f"Trained {count} clusters over {size} vectors")
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        """
+        Rows in the clusters nearest to ``query``
+        """
+        probes = min(self.ann_probes, len(self._centroids))
+        nearest = np.argpartition(-(self._centroids @ query), probes - 1)[:probes]
+        return np.flatnonzero(np.isin(self._clusters[:len(self._ids)], nearest))
+
+    def _top_k(self, scores: np.ndarray, rows: Optional[np.ndarray], top_k: int,
+               include_metadata: bool) -> Dict[str, Any]:
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return {"matches": []}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for position in top:
+            row = int(position if rows is None else rows[position])
+            match = {"id": self._ids[row], "score": float(scores[position])}
+            if include_metadata:
+                match["metadata"] = self._metadata[row]
+            matches.append(match)
+        return {"matches": matches}
+
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 10, include_metadata: bool = True,
+                    filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        queries = self._normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        with self._lock:
+            size = len(self._ids)
+            allowed = None
+            if filter:
+                allowed = np.asarray([row for row in range(size) if _matches_filter(self._metadata[row], filter)],
+                                     dtype=np.int64)
+            if self._centroids is None:
+                # Exact: one matrix product scores every query against every (allowed) vector
+                matrix = self._matrix[:size] if allowed is None else self._matrix[allowed]
+                return [self._top_k(scores, allowed, top_k, include_metadata) for scores in queries @ matrix.T]
+            results = []
+            for query in queries:
+                rows = self._candidates(query)
+                if allowed is not None:
+                    rows = np.intersect1d(rows, allowed)
+                results.append(self._top_k(self._matrix[rows] @ query, rows, top_k, include_metadata))
+            return results
+
+    def query(self, vector: Sequence[float], top_k: int = 10, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.query_batch([vector], top_k, include_metadata, filter)[0]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "local",
+            "dimension": self.dimension,
+            "total_vector_count": len(self._ids),
+            "ann_clusters": len(self._centroids) if self._centroids is not None else 0,
+        }
+
+
+class PineconeVectorIndex(VectorIndex):
+    """
+    A hosted Pinecone index (pinecone-client 2.x) behind the same interface
+    """
+
+    remote = True
+
+    def __init__(self, index_name: str, api_key: str, environment: str, namespace: str = ""):
+        import pinecone
+        pinecone.init(api_key=api_key, environment=environment)
+        self._index = pinecone.Index(index_name)
+        self.index_name = index_name
+        self.namespace = namespace
+
+    def upsert(self, vectors: Iterable[VectorRecord], batch_size: int = 100):
+        records = [(vector_id, [float(v) for v in values], metadata or {}) for vector_id, values, metadata in vectors]
+        for start in range(0, len(records), batch_size):
+            self._index.upsert(vectors=records[start:start + batch_size], namespace=self.namespace)
+
+    def delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        if ids:
+            self._index.delete(ids=ids, namespace=self.namespace)
+
+    def query(self, vector: Sequence[float], top_k: int = 10, include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = self._index.query(vector=[float(v) for v in vector], top_k=top_k,
+                                     include_metadata=include_metadata, filter=filter, namespace=self.namespace)
+        return {"matches": [{"id": match.id, "score": match.score, "metadata": match.metadata or {}}
+                            for match in response.matches]}
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        stats = self._index.describe_index_stats().to_dict()
+        stats["backend"] = "pinecone"
+        stats["index_name"] = self.index_name
+        return stats
+
+
+def create_vector_index(dimension: int) -> VectorIndex:
+    """
+    Vector index selected by VECTOR_BACKEND ("local" or "pinecone")
+    """
+    if settings.VECTOR_BACKEND == "pinecone":
+        return PineconeVectorIndex(settings.PINECONE_INDEX_NAME, settings.PINECONE_API_KEY,
+                                   settings.PINECONE_ENVIRONMENT)
+    if settings.VECTOR_BACKEND != "local":
+        raise ValueError(f"Unknown vector backend: {settings.VECTOR_BACKEND}")
+    return LocalVectorIndex(dimension, settings.VECTOR_ANN_MIN_VECTORS, settings.VECTOR_ANN_PROBES)
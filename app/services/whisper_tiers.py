@@ -0,0 +1,163 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import numpy as np
+import whisper
+from app.services.audio import WHISPER_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Whisper model families from smallest/fastest to largest/most accurate
+TIER_ORDER = ["tiny", "base", "small", "medium", "large", "turbo"]
+
+# Segments whose average log-probability falls below this are treated as
+# low confidence (the same threshold Whisper uses to retry at a higher temperature)
+LOW_CONFIDENCE_LOGPROB = -1.0
+
+
+def tier_rank(model_name: str) -> int:
+    """
+    Position of a model name such as "base.en" or "large-v3" in TIER_ORDER
+    """
+    family = model_name.split(".")[0].split("-")[0]
+    return TIER_ORDER.index(family) if family in TIER_ORDER else len(TIER_ORDER)
+
+
+def quantize_int8(model: "whisper.Whisper") -> "whisper.Whisper":
+    """
+    Apply dynamic int8 quantization to the Linear layers of a CPU model
+    """
+    import torch
+    # Whisper's Linear subclass only adds dtype casting; quantize_dynamic
+    # needs the exact nn.Linear type to swap in the int8 kernels
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_whisper_model(model_name: str, quantize: bool = False, device: Optional[str] = None) -> "whisper.Whisper":
+    """
+    Load (and optionally quantize) a Whisper model, then run one short
+    transcription so the first real request doesn't pay for lazy setup
+    """
+    model = whisper.load_model(model_name, device="cpu" if quantize else device)
+    if quantize:
+        model = quantize_int8(model)
+    started = time.perf_counter()
+    model.transcribe(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32), fp16=False, language="en")
+    logger.info(f"Warmed up Whisper {model_name}{' (int8)' if quantize else ''} "
+                f"in {time.perf_counter() - started:.2f}s")
+    return model
+
+
+class TierStats:
+    """
+    Latency and confidence counters for one Whisper tier
+    """
+
+    def __init__(self, window_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=1000)  # (recorded at, seconds)
+        self.requests = 0
+        self.errors = 0
+        self.routed_by_downgrade = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+        self.segments = 0
+        self.low_confidence_segments = 0
+        self._logprob_sum = 0.0
+
+    def record(self, latency: float, audio_seconds: float, result: Optional[Dict[str, Any]] = None):
+        self.requests += 1
+        self.audio_seconds += audio_seconds
+        self.processing_seconds += latency
+        self._latencies.append((self._clock(), latency))
+        for segment in (result or {}).get("segments", []):
+            logprob = segment.get("avg_logprob")
+            if logprob is None:
+                continue
+            self.segments += 1
+            self._logprob_sum += logprob
+            if logprob < LOW_CONFIDENCE_LOGPROB:
+                self.low_confidence_segments += 1
+
+    def p95(self) -> Optional[float]:
+        """
+        95th percentile latency over the recent window; None without recent traffic
+        """
+        cutoff = self._clock() - self.window_seconds
+        recent = [latency for recorded_at, latency in self._latencies if recorded_at >= cutoff]
+        if not recent:
+            return None
+        return float(np.percentile(recent, 95))
+
+    def to_dict(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "routed_by_downgrade": self.routed_by_downgrade,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "real_time_factor": (self.processing_seconds / self.audio_seconds) if self.audio_seconds else None,
+            "avg_logprob": (self._logprob_sum / self.segments) if self.segments else None,
+            "low_confidence_rate": (self.low_confidence_segments / self.segments) if self.segments else None,
+        }
+
+
+class WhisperTierRouter:
+    """
+    Chooses which Whisper tier serves each request.
+
+    Requests normally go to the primary model. When the inference queue is
+    at least ``queue_threshold`` deep, or the primary's recent p95 latency
+    exceeds ``p95_threshold_ms``, they step down one smaller tier per
+    signal; once the pressure clears (the latency window ages out) traffic
+    returns to the primary.
+    """
+
+    def __init__(self, primary: str, tiers: List[str], queue_depth: Callable[[], int],
+                 queue_threshold: int, p95_threshold_ms: float, window_seconds: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        # Only tiers no larger than the primary are downgrade targets
+        names = {name for name in tiers if tier_rank(name) <= tier_rank(primary)} | {primary}
+        self.tiers = sorted(names, key=tier_rank)
+        self.primary = primary
+        self._queue_depth = queue_depth
+        self.queue_threshold = queue_threshold
+        self.p95_threshold_ms = p95_threshold_ms
+        self._lock = threading.Lock()
+        self._stats = {name: TierStats(window_seconds, clock) for name in self.tiers}
+
+    def choose(self) -> str:
+        steps = 0
+        if self.queue_threshold > 0 and self._queue_depth() >= self.queue_threshold:
+            steps += 1
+        with self._lock:
+            p95 = self._stats[self.primary].p95()
+            if self.p95_threshold_ms > 0 and p95 is not None and p95 * 1000 >= self.p95_threshold_ms:
+                steps += 1
+            tier = self.tiers[max(0, self.tiers.index(self.primary) - steps)]
+            if tier != self.primary:
+                self._stats[tier].routed_by_downgrade += 1
+        return tier
+
+    def record(self, tier: str, latency: float, audio_seconds: float, result: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._stats[tier].record(latency, audio_seconds, result)
+
+    def record_error(self, tier: str):
+        with self._lock:
+            self._stats[tier].errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "primary": self.primary,
+                "queue_threshold": self.queue_threshold,
+                "p95_threshold_ms": self.p95_threshold_ms,
+                "tiers": {name: stats.to_dict() for name, stats in self._stats.items()},
+            }
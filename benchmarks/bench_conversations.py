@@ -0,0 +1,95 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.conversation import Conversation
+
+
+# The Pydantic models conversations were stored as before the slotted log
+class LegacyMessage(BaseModel):
+    role: str
+    content: str
+    timestamp: datetime = datetime.now()
+
+
+class LegacyConversation(BaseModel):
+    session_id: str
+    messages: List[LegacyMessage] = []
+    context: Dict = {}
+    business_type: str
+    created_at: datetime = datetime.now()
+    updated_at: datetime = datetime.now()
+
+    def add_message(self, role: str, content: str):
+        self.messages.append(LegacyMessage(role=role, content=content))
+        self.updated_at = datetime.now()
+
+
+TURNS = [
+    ("user", "Hi, do you have any vegan options tonight?"),
+    ("assistant", "Yes, we have a vegan risotto and a roasted vegetable plate."),
+    ("user", "Great, I'd like to book a table for four at 7pm"),
+    ("assistant", "Your table for four at 7pm is booked. Anything else?"),
+]
+
+
+def build_sessions(factory, sessions: int, turns: int) -> list:
+    conversations = []
+    for i in range(sessions):
+        conversation = factory(session_id=f"+1555{i:07d}", business_type="restaurant")
+        for turn in range(turns):
+            role, content = TURNS[turn % len(TURNS)]
+            # Fresh strings, as they would arrive from separate requests
+            conversation.add_message("".join(role), f"{content} ({turn})")
+        conversations.append(conversation)
+    return conversations
+
+
+def memory_per_sessions(label: str, factory, sessions: int, turns: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    conversations = build_sessions(factory, sessions, turns)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del conversations
+    megabytes = current / (1024 * 1024)
+    print(f"{label:<20} {megabytes:>10.1f} MB for {sessions:,} sessions x {turns} turns")
+    return megabytes
+
+
+def append_cost(label: str, factory, appends: int) -> float:
+    conversation = factory(session_id="+15550000000", business_type="restaurant")
+    start = time.perf_counter()
+    for turn in range(appends):
+        role, content = TURNS[turn % len(TURNS)]
+        conversation.add_message(role, content)
+    microseconds = (time.perf_counter() - start) / appends * 1e6
+    print(f"{label:<20} {microseconds:>10.2f} us per append")
+    return microseconds
+
+
+def main(sessions: int = 10000, turns: int = 10, appends: int = 200000):
+    print("Conversation memory")
+    print("-" * 50)
+    legacy = memory_per_sessions("legacy pydantic", LegacyConversation, sessions, turns)
+    slotted = memory_per_sessions("slotted log", Conversation, sessions, turns)
+    print(f"legacy / slotted: {legacy / slotted:.2f}x")
+
+    print("\nAppend cost")
+    print("-" * 50)
+    legacy = append_cost("legacy pydantic", LegacyConversation, appends)
+    slotted = append_cost("slotted log", Conversation, appends)
+    print(f"legacy / slotted: {legacy / slotted:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
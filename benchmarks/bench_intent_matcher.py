@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_matcher import IntentMatcher
+
+# The keyword chain LanguageService.generate_response used before the compiled matcher
+LEGACY_CHAIN = [
+    ("appetizers", ["appetizer", "starter", "snack"]),
+    ("main_courses", ["main", "entree", "dish", "meal"]),
+    ("desserts", ["dessert", "sweet", "cake"]),
+    ("beverages", ["drink", "beverage", "wine", "beer"]),
+    ("start_order", ["place an order", "want to order", "would like to order"]),
+    ("add_item", ["add to my order", "add this", "also want"]),
+    ("remove_item", ["remove from my order", "take this off", "don't want"]),
+    ("ingredients", ["what's in", "ingredients in", "made with"]),
+    ("allergens", ["contains", "allergens", "allergic"]),
+    ("spiciness", ["how spicy", "spice level", "heat level"]),
+    ("dietary_restrictions", ["vegetarian", "vegan", "gluten-free"]),
+    ("allergies", ["allergy", "allergic to", "can't eat"]),
+    ("check_status", ["status of my order", "where is my order", "how long"]),
+]
+
+MESSAGES = [
+    "What are your appetizers?",
+    "I would like to order the salmon please",
+    "Can I remain on the line while you check?",
+    "Does the tiramisu contain nuts? My son is allergic",
+    "How long until my delivery arrives, it has been an hour",
+    "Hi there, I was just wondering whether you could tell me something about tonight",
+    "Do you have vegan or gluten-free options for a party of twelve on Saturday evening?",
+]
+
+
+def legacy_match(text):
+    text_lower = text.lower()
+    for intent, phrases in LEGACY_CHAIN:
+        if any(phrase in text_lower for phrase in phrases):
+            return intent
+    return None
+
+
+def bench(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in MESSAGES:
+            func(message)
+    elapsed = time.perf_counter() - start
+    rate = iterations * len(MESSAGES) / elapsed
+    print(f"{label:<20} {rate:>12,.0f} messages/s")
+    return rate
+
+
+def main(iterations=20000):
+    matcher = IntentMatcher()
+    for priority, (intent, phrases) in enumerate(LEGACY_CHAIN):
+        matcher.add("reply", intent, phrases, priority)
+
+    print("Intent matching throughput")
+    print("-" * 50)
+    for message in MESSAGES:
+        print(f"{message[:45]:<45} legacy={legacy_match(message)} compiled={matcher.best(message, 'reply')}")
+    print("-" * 50)
+    legacy = bench("legacy if/elif chain", legacy_match, iterations)
+    compiled = bench("compiled matcher", lambda text: matcher.best(text, "reply"), iterations)
+    print(f"compiled / legacy: {compiled / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
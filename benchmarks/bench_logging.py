@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueListener
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.log import BoundedQueueHandler, JSONFormatter, RecordSampler, RequestLogContext, SampledLogger
+
+FORM = {"From": "+15551234567", "Body": "Do you have vegan or gluten-free options for a party of twelve?",
+        "To": "+15550001111", "MessageSid": "SM" + "0" * 32, "AccountSid": "AC" + "0" * 32, "NumMedia": "0"}
+HISTORY = [{"role": "user" if turn % 2 == 0 else "assistant", "content": f"Message number {turn} " * 4}
+           for turn in range(40)]
+
+
+def legacy_turn(logger, form, history):
+    # What handle_sms logged per message before: the raw form, numbers and texts, all formatted eagerly
+    logger.info(f"Received request with data: {form}")
+    logger.info(f"Normalized phone number: {form['From']}")
+    logger.info(f"Processing SMS from {form['From']}: {form['Body']}")
+    logger.info(f"Retrieved existing conversation for {form['From']}")
+    logger.info(f"Conversation history: {history}")
+    logger.info(f"Sending response to {form['From']}: {history[-1]['content']}")
+
+
+def structured_turn(logger, form, history):
+    logger.info("Processing SMS", extra={"from_number": form["From"], "body": form["Body"]})
+    logger.debug("Conversation has %d messages", len(history), extra={"session_id": form["From"]})
+    logger.info("Sending SMS reply", extra={"from_number": form["From"], "reply": history[-1]["content"]})
+
+
+def _logger(name, handler, logger_class=logging.Logger):
+    logger = logger_class(name)
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def main(iterations=20000):
+    devnull = open(os.devnull, "w")
+    print("Logging cost of one SMS turn (40-message history)")
+    print("-" * 70)
+
+    stream = logging.StreamHandler(devnull)
+    stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    legacy = _logger("bench.legacy", stream)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        legacy_turn(legacy, FORM, HISTORY)
+    before = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{'legacy: f-strings, written by the caller':<46} {before:>8.2f} µs per message")
+
+    # The record settings setup_logging applies
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    results = {}
+    for sample_rate in (1.0, 0.1):
+        # Room for every record, so the caller's cost is measured without drops or a competing listener
+        handler = BoundedQueueHandler(queue.Queue(maxsize=iterations * 3))
+        handler.addFilter(RecordSampler())
+        structured = _logger(f"bench.structured.{sample_rate:g}", handler, SampledLogger)
+
+        async def turn(scope, receive, send):
+            structured_turn(structured, FORM, HISTORY)
+
+        async def requests():
+            context = RequestLogContext(turn, sample_rate)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await context({"type": "http"}, None, None)
+            return (time.perf_counter() - start) / iterations * 1e6
+
+        caller = results[sample_rate] = asyncio.run(requests())
+        output = logging.StreamHandler(devnull)
+        output.setFormatter(JSONFormatter())
+        listener = QueueListener(handler.queue, output)
+        start = time.perf_counter()
+        listener.start()
+        listener.stop()
+        writer = (time.perf_counter() - start) / iterations * 1e6
+        print(f"{f'structured, sampled at {sample_rate:g}: request path':<46} {caller:>8.2f} µs per message")
+        print(f"{f'structured, sampled at {sample_rate:g}: listener thread':<46} {writer:>8.2f} µs per message")
+    print("-" * 70)
+    print(f"request path speed-up: {before / results[1.0]:.1f}x at full sampling, "
+          f"{before / results[0.1]:.1f}x sampled at 0.1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.metrics import Metrics
+
+
+def bench(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / iterations * 1e6
+    print(f"{label:<32} {per_call:>8.3f} µs")
+    return per_call
+
+
+def main(iterations=200000):
+    metrics = Metrics(slow_request_ms=0)
+
+    def bare():
+        pass
+
+    def span():
+        with metrics.span("intent"):
+            pass
+
+    def annotate():
+        metrics.annotate("reply", "rule")
+
+    print("Instrumentation overhead per call")
+    print("-" * 50)
+    baseline = bench("empty function", bare, iterations)
+    bench("span outside a request", span, iterations)
+
+    async def traced():
+        with metrics.trace("sms"):
+            per_span = bench("span inside a request", span, iterations)
+            bench("annotate", annotate, iterations)
+            return per_span
+
+    per_span = asyncio.run(traced())
+
+    def request():
+        with metrics.trace("sms"):
+            for stage in ("session_load", "history", "intent", "generate", "sentiment", "session_save", "twiml"):
+                with metrics.span(stage):
+                    pass
+
+    per_request = bench("request with 7 spans", request, iterations // 10)
+    print("-" * 50)
+    print(f"span cost above an empty call: {per_span - baseline:.3f} µs")
+    print(f"full trace of a 7-stage turn:  {per_request:.3f} µs")
+
+
+if __name__ == "__main__":
+    main()
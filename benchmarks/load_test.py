@@ -0,0 +1,646 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import numpy as np
+
+# Add the project root to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+BASELINE_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "baselines")
+API = "/api/v1"
+
+# Traffic kinds and the request each one replays:
+#   sms              {"from", "body"}            POST /sms/ webhook
+#   voice_call       {}                          POST /voice/voice (new call, greeting TwiML)
+#   voice_input      {"session", "speech"}       POST /voice/voice/handle-input callback
+#   ws_audio         {"seconds", "frames"}       WebSocket /voice/ws, one WAV per frame
+#   knowledge_query  {"query", "endpoint"}       GET /knowledge/query (or /semantic, /complete)
+#   http             {"method", "path", "body"}  Anything else, e.g. from an access log
+# Any entry may carry "at" (seconds from the start of the recording) for --timed replay.
+KINDS = ("sms", "voice_call", "voice_input", "ws_audio", "knowledge_query", "http")
+
+DEFAULT_MIX = "sms=50,voice_input=20,voice_call=5,ws_audio=10,knowledge_query=15"
+
+# Messages by the reply path they take: a keyword rule, a knowledge base lookup or the model
+MESSAGES = {
+    "rule": [
+        "I would like to order the salmon please",
+        "Can you add this to my order?",
+        "Where is my order? It has been a while",
+        "Do you have gluten-free options?",
+    ],
+    "knowledge": [
+        "What desserts do you have?",
+        "Which appetizers would you recommend?",
+        "What main courses are on the menu tonight?",
+    ],
+    "model": [
+        "Hi there, quick question about tonight",
+        "Is the patio open if the weather holds up?",
+        "My friend said your pasta was the best in town, is that true?",
+        "Could we bring a birthday cake for my mother?",
+    ],
+}
+KNOWLEDGE_QUERIES = [
+    ("query", "What are your hours?"),
+    ("query", "Where are you located?"),
+    ("query", "What's on the menu?"),
+    ("semantic", "something sweet with coffee"),
+    ("semantic", "seafood main course"),
+    ("complete", "Ti"),
+]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse "sms=50,ws_audio=10" into normalized weights
+    """
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS or kind == "http":
+            raise ValueError(f"Unknown traffic kind in mix: {kind}")
+        weights[kind] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Traffic mix has no weight: {spec}")
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+def synthesize_traffic(requests: int, mix: Dict[str, float], seed: int = 0, sessions: int = 50,
+                       history_lengths: Tuple[int, ...] = (1, 4, 12)) -> List[Dict[str, Any]]:
+    """
+    A reproducible traffic mix. SMS senders and calls are drawn from a pool
+    of ``sessions`` open conversations, each lasting a length picked from
+    ``history_lengths`` before it is replaced by a new one, so replies are
+    generated over a spread of history sizes.
+    """
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    messages = [text for texts in MESSAGES.values() for text in texts]
+    opened = {"sms": 0, "voice_input": 0}
+    pools: Dict[str, List[List[Any]]] = {"sms": [], "voice_input": []}
+
+    def session(kind: str) -> str:
+        pool = pools[kind]
+        if len(pool) < sessions:
+            opened[kind] += 1
+            pool.append([f"{kind}-{opened[kind]}", rng.choice(history_lengths)])
+        entry = rng.choice(pool)
+        entry[1] -= 1
+        if entry[1] <= 0:
+            pool.remove(entry)
+        return entry[0]
+
+    traffic = []
+    for _ in range(requests):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "sms":
+            number = int(session("sms").rsplit("-", 1)[1])
+            traffic.append({"kind": "sms", "from": f"+1555{number:07d}", "body": rng.choice(messages)})
+        elif kind == "voice_input":
+            traffic.append({"kind": "voice_input", "session": session("voice_input"), "speech": rng.choice(messages)})
+        elif kind == "ws_audio":
+            traffic.append({"kind": "ws_audio", "seconds": rng.choice((1.0, 2.5, 4.0)), "frames": rng.choice((1, 1, 2))})
+        elif kind == "knowledge_query":
+            endpoint, query = rng.choice(KNOWLEDGE_QUERIES)
+            traffic.append({"kind": "knowledge_query", "endpoint": endpoint, "query": query})
+        else:
+            traffic.append({"kind": kind})
+    return traffic
+
+
+def load_traffic(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a JSON lines traffic file, one request per line
+    """
+    traffic = []
+    with open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if entry.get("kind") not in KINDS:
+                raise ValueError(f"{path}:{number}: unknown traffic kind {entry.get('kind')!r}")
+            traffic.append(entry)
+    return traffic
+
+
+def save_traffic(path: str, traffic: Iterable[Dict[str, Any]]):
+    with open(path, "w") as f:
+        for entry in traffic:
+            f.write(json.dumps(entry) + "\n")
+
+
+def summarize(latencies: List[float], errors: int, shed: int, duration: float) -> Dict[str, Any]:
+    """
+    Count, throughput and latency percentiles (ms) of one kind of request
+    """
+    count = len(latencies)
+    summary: Dict[str, Any] = {
+        "count": count,
+        "errors": errors,
+        "shed": shed,
+        "throughput_rps": round(count / duration, 2) if duration > 0 else 0.0,
+    }
+    if count:
+        values = np.asarray(latencies) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary.update({
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(values.max()), 2),
+        })
+    return summary
+
+
+# Compared against a baseline: (key, higher is better)
+COMPARED = (("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False))
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15,
+            min_delta_ms: float = 2.0) -> List[Dict[str, Any]]:
+    """
+    Changes from ``baseline`` to ``result`` per kind and metric; entries
+    worse by more than ``tolerance`` (a fraction) are flagged as regressions.
+    Latencies must also have grown by ``min_delta_ms``, so jitter on
+    sub-millisecond requests isn't reported.
+    """
+    changes = []
+    groups = [("overall", result["overall"], baseline.get("overall", {}))]
+    groups += [(kind, stats, baseline.get("kinds", {}).get(kind, {})) for kind, stats in result["kinds"].items()]
+    for group, current, previous in groups:
+        for key, higher_is_better in COMPARED:
+            if key not in current or not previous.get(key):
+                continue
+            change = (current[key] - previous[key]) / previous[key]
+            worse = -change if higher_is_better else change
+            if not higher_is_better and current[key] - previous[key] < min_delta_ms:
+                worse = 0.0
+            changes.append({
+                "kind": group,
+                "metric": key,
+                "baseline": previous[key],
+                "current": current[key],
+                "change": round(change, 4),
+                "regression": worse > tolerance,
+            })
+    growth, previous_growth = result["memory"]["growth_mb"], baseline.get("memory", {}).get("growth_mb")
+    if previous_growth is not None:
+        # Memory growth is noisy at the MB scale: only flag it beyond the tolerance plus 8 MB
+        changes.append({
+            "kind": "memory",
+            "metric": "growth_mb",
+            "baseline": previous_growth,
+            "current": growth,
+            "change": round(growth - previous_growth, 2),
+            "regression": growth > previous_growth * (1 + tolerance) + 8,
+        })
+    return changes
+
+
+def baseline_path(name: str) -> str:
+    if os.sep in name or name.endswith(".json"):
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _tone_wav(seconds: float) -> bytes:
+    from app.services.audio import WHISPER_SAMPLE_RATE, pcm16_to_wav
+    t = np.arange(int(seconds * WHISPER_SAMPLE_RATE)) / WHISPER_SAMPLE_RATE
+    samples = (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+    return pcm16_to_wav(samples.tobytes(), WHISPER_SAMPLE_RATE)
+
+
+class WebSocketError(Exception):
+    pass
+
+
+async def websocket_exchange(app, path: str, frames: List[bytes], query: str = "") -> List[Dict[str, Any]]:
+    """
+    Open a WebSocket on the ASGI app directly, send each frame and wait for
+    its reply before sending the next one, then disconnect
+    """
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "scheme": "ws",
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "query_string": query.encode("ascii"),
+        "headers": [(b"host", b"testserver")],
+        "subprotocols": [],
+    }
+    await inbox.put({"type": "websocket.connect"})
+    task = asyncio.ensure_future(app(scope, inbox.get, outbox.put))
+    try:
+        message = await outbox.get()
+        if message["type"] != "websocket.accept":
+            raise WebSocketError(f"WebSocket not accepted: {message}")
+        replies = []
+        for frame in frames:
+            await inbox.put({"type": "websocket.receive", "bytes": frame})
+            message = await outbox.get()
+            if message["type"] != "websocket.send":
+                raise WebSocketError(f"WebSocket closed early: {message}")
+            replies.append(json.loads(message.get("text") or "{}"))
+        await inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await task
+        return replies
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+class LoadTest:
+    """
+    Replays a traffic mix against the app in-process (through an ASGI
+    client, no server or sockets) and records per-kind latency, errors,
+    shed requests (503s) and process memory
+    """
+
+    def __init__(self, app, traffic: List[Dict[str, Any]], concurrency: int = 16, rate: Optional[float] = None,
+                 timed: bool = False, speed: float = 1.0):
+        import httpx
+        self.app = app
+        self.traffic = traffic
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.timed = timed
+        self.speed = speed
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver",
+                                        timeout=None)
+        self._audio: Dict[float, bytes] = {}
+        self._reset()
+
+    def _reset(self):
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in KINDS}
+        self.errors: Dict[str, int] = {kind: 0 for kind in KINDS}
+        self.shed: Dict[str, int] = {kind: 0 for kind in KINDS}
+        self.failures: List[str] = []
+
+    def _wav(self, seconds: float) -> bytes:
+        if seconds not in self._audio:
+            self._audio[seconds] = _tone_wav(seconds)
+        return self._audio[seconds]
+
+    async def _send(self, entry: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Issue one request; returns its HTTP status (None for WebSockets) and
+        an error description if it failed
+        """
+        kind = entry["kind"]
+        if kind == "sms":
+            response = await self.client.post(f"{API}/sms/", data={"From": entry["from"], "Body": entry["body"]})
+        elif kind == "voice_call":
+            response = await self.client.post(f"{API}/voice/voice", data={"CallSid": entry.get("call", "CA0")})
+        elif kind == "voice_input":
+            response = await self.client.post(f"{API}/voice/voice/handle-input",
+                                              params={"session_id": entry["session"]},
+                                              data={"SpeechResult": entry["speech"]})
+        elif kind == "knowledge_query":
+            endpoint = entry.get("endpoint", "query")
+            params = {"prefix": entry["query"]} if endpoint == "complete" else {"query": entry["query"]}
+            response = await self.client.get(f"{API}/knowledge/{endpoint}", params=params)
+        elif kind == "ws_audio":
+            frames = [self._wav(float(entry.get("seconds", 2.0)))] * int(entry.get("frames", 1))
+            replies = await websocket_exchange(self.app, f"{API}/voice/ws", frames, urlencode({"mode": "file"}))
+            failed = [reply for reply in replies if "error" in reply]
+            if failed:
+                # A "busy" reply is the WebSocket form of a 503
+                return 503 if failed[0]["error"] == "busy" else None, json.dumps(failed[0])
+            return None, None
+        else:
+            response = await self.client.request(entry.get("method", "GET"), entry["path"],
+                                                 json=entry.get("body"), params=entry.get("params"))
+        return response.status_code, None if response.status_code < 400 else response.text[:200]
+
+    async def _issue(self, entry: Dict[str, Any]):
+        kind = entry["kind"]
+        started = time.perf_counter()
+        try:
+            status, error = await self._send(entry)
+        except Exception as e:
+            status, error = None, f"{type(e).__name__}: {str(e)}"
+        elapsed = time.perf_counter() - started
+        if status == 503:
+            self.shed[kind] += 1
+        elif error is not None:
+            self.errors[kind] += 1
+            if len(self.failures) < 5:
+                self.failures.append(f"{kind}: {error}")
+        else:
+            self.latencies[kind].append(elapsed)
+
+    def _offsets(self) -> Optional[List[float]]:
+        # Open-loop start times, or None to keep ``concurrency`` requests in flight
+        if self.timed:
+            return [float(entry.get("at", 0)) / self.speed for entry in self.traffic]
+        if self.rate:
+            return [index / self.rate for index in range(len(self.traffic))]
+        return None
+
+    async def _replay(self, traffic: List[Dict[str, Any]], offsets: Optional[List[float]]):
+        if offsets is None:
+            iterator = iter(traffic)
+
+            async def worker():
+                for entry in iterator:
+                    await self._issue(entry)
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            return
+        # Open loop: start every request on schedule, at most ``concurrency`` x 8 in flight
+        limit = asyncio.Semaphore(self.concurrency * 8)
+        start = time.perf_counter()
+
+        async def scheduled(entry, offset):
+            await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+            async with limit:
+                await self._issue(entry)
+
+        await asyncio.gather(*(scheduled(entry, offset) for entry, offset in zip(traffic, offsets)))
+
+    async def run(self, warmup: int = 0) -> Dict[str, Any]:
+        from app.core.metrics import metrics
+        from app.core.registry import registry
+        from app.services.conversation_manager import conversation_manager
+
+        if warmup:
+            # Load lazily created models, fill caches and size the session store
+            await self._replay(self.traffic[:warmup], None)
+            self._reset()
+        stages_before = metrics.stage_seconds.snapshot()
+        gc.collect()
+        rss_start = registry.memory_report()["process_rss_bytes"]
+        rss_samples = [rss_start]
+        done = asyncio.Event()
+
+        async def sample_memory():
+            while not done.is_set():
+                rss_samples.append(registry.memory_report()["process_rss_bytes"])
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(done.wait(), 0.25)
+
+        sampler = asyncio.ensure_future(sample_memory())
+        started = time.perf_counter()
+        await self._replay(self.traffic, self._offsets())
+        duration = time.perf_counter() - started
+        done.set()
+        await sampler
+        gc.collect()
+        rss_end = registry.memory_report()["process_rss_bytes"]
+        rss_samples.append(rss_end)
+
+        kinds = {kind: summarize(self.latencies[kind], self.errors[kind], self.shed[kind], duration)
+                 for kind in KINDS if self.latencies[kind] or self.errors[kind] or self.shed[kind]}
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        megabytes = 1024 * 1024
+        growth = (rss_end - rss_start) / megabytes
+        return {
+            "requests": len(self.traffic),
+            "duration_s": round(duration, 3),
+            "overall": summarize(everything, sum(self.errors.values()), sum(self.shed.values()), duration),
+            "kinds": kinds,
+            "stages": _stage_means(stages_before, metrics.stage_seconds.snapshot()),
+            "memory": {
+                "rss_start_mb": round(rss_start / megabytes, 1),
+                "rss_end_mb": round(rss_end / megabytes, 1),
+                "rss_peak_mb": round(max(rss_samples) / megabytes, 1),
+                "growth_mb": round(growth, 2),
+                "growth_per_1k_requests_mb": round(growth / len(self.traffic) * 1000, 3) if self.traffic else 0.0,
+            },
+            "sessions": {key: value for key, value in conversation_manager.stats().items()
+                         if isinstance(value, (int, float))},
+            "failures": self.failures,
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _stage_means(before: Dict[Tuple[str, ...], List[float]],
+                 after: Dict[Tuple[str, ...], List[float]]) -> Dict[str, Dict[str, float]]:
+    # Per-stage counts and mean time during the measured run, from the app's own span histograms
+    stages = {}
+    for labels, series in sorted(after.items()):
+        previous = before.get(labels)
+        count = series[-2] - (previous[-2] if previous else 0)
+        if count:
+            total = series[-1] - (previous[-1] if previous else 0.0)
+            stages["/".join(labels)] = {"count": count, "mean_ms": round(total / count * 1000, 3)}
+    return stages
+
+
+def _prepare_environment(workdir: str):
+    """
+    Run the app in a scratch directory: the knowledge base, its lock and log
+    files, the TTS cache and the prompt bank are written there instead of
+    into the checkout
+    """
+    os.makedirs(os.path.join(workdir, "app", "static"), exist_ok=True)
+    business_type = os.getenv("BUSINESS_TYPE", "restaurant")
+    knowledge_file = os.path.join(PROJECT_ROOT, f"knowledge_{business_type}.json")
+    if os.path.exists(knowledge_file):
+        shutil.copy(knowledge_file, workdir)
+    os.environ.setdefault("TTS_CACHE_DIR", os.path.join(workdir, "tts_cache"))
+    os.environ.setdefault("PROMPT_BANK_DIR", os.path.join(workdir, "prompt_bank"))
+    os.environ.setdefault("PRELOAD_MODELS", "true")
+    os.chdir(workdir)
+
+
+async def _wait_for_prompt_bank(timeout: float = 30.0):
+    from app.api import voice
+    from app.core.config import settings
+    deadline = time.monotonic() + timeout
+    while settings.PROMPT_BANK_ENABLED and time.monotonic() < deadline:
+        stats = voice.prompt_bank.stats()
+        if stats["builds"] or stats["unavailable"]:
+            return
+        await asyncio.sleep(0.05)
+
+
+async def run_load_test(args, traffic: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from app.main import app
+    import logging
+    logging.getLogger().setLevel(args.log_level)
+
+    await app.router.startup()
+    try:
+        await _wait_for_prompt_bank()
+        test = LoadTest(app, traffic, args.concurrency, args.rate, args.timed, args.speed)
+        try:
+            result = await test.run(min(args.warmup, len(traffic)))
+        finally:
+            await test.close()
+    finally:
+        await app.router.shutdown()
+    return result
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"Load test: {result['requests']} requests in {result['duration_s']:.2f}s "
+          f"({result['models']} models, {result['mode']})")
+    print("-" * 86)
+    print(f"{'kind':<16} {'count':>7} {'errors':>7} {'shed':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}")
+    rows = list(result["kinds"].items()) + [("overall", result["overall"])]
+    for kind, stats in rows:
+        print(f"{kind:<16} {stats['count']:>7} {stats['errors']:>7} {stats['shed']:>6} "
+              f"{stats['throughput_rps']:>9.1f} {stats.get('p50_ms', math.nan):>9.1f} "
+              f"{stats.get('p95_ms', math.nan):>9.1f} {stats.get('p99_ms', math.nan):>9.1f} "
+              f"{stats.get('max_ms', math.nan):>9.1f}")
+    memory = result["memory"]
+    print("-" * 86)
+    print(f"RSS {memory['rss_start_mb']:.1f} MB -> {memory['rss_end_mb']:.1f} MB "
+          f"(peak {memory['rss_peak_mb']:.1f} MB, {memory['growth_per_1k_requests_mb']:+.3f} MB per 1k requests)")
+    slowest = sorted(result["stages"].items(), key=lambda item: -item[1]["mean_ms"])[:6]
+    if slowest:
+        print("Slowest stages: " + ", ".join(f"{stage} {stats['mean_ms']:.2f} ms" for stage, stats in slowest))
+    for failure in result["failures"]:
+        print(f"  failed: {failure}")
+
+
+def print_comparison(changes: List[Dict[str, Any]], baseline: str):
+    print(f"\nCompared with {baseline}")
+    print("-" * 86)
+    for change in changes:
+        if change["metric"] == "growth_mb":
+            delta = f"{change['change']:+.2f} MB"
+        else:
+            delta = f"{change['change'] * 100:+.1f}%"
+        flag = "  REGRESSION" if change["regression"] else ""
+        print(f"{change['kind']:<16} {change['metric']:<16} {change['baseline']:>10} -> {change['current']:<10} "
+              f"{delta}{flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay SMS, voice, WebSocket and knowledge traffic against the "
+                                                 "app in-process and report throughput, latency and memory")
+    parser.add_argument("--traffic", help="JSON lines traffic file to replay (default: a synthetic mix)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Synthetic mix weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=1000, help="Synthetic requests to generate")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrently open synthetic conversations")
+    parser.add_argument("--history", default="1,4,12", help="Synthetic conversation lengths in turns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-traffic", help="Write the traffic replayed to this JSON lines file")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight (closed loop)")
+    parser.add_argument("--rate", type=float, help="Open loop: start this many requests per second")
+    parser.add_argument("--timed", action="store_true", help="Open loop: start requests at their recorded 'at'")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed-up applied to --timed replay")
+    parser.add_argument("--warmup", type=int, default=50, help="Requests replayed before measuring")
+    parser.add_argument("--real-models", action="store_true", help="Load GPT-2, Whisper and Piper instead of stubs")
+    parser.add_argument("--generate-ms", type=float, default=40.0, help="Stub GPT-2 time per batch")
+    parser.add_argument("--whisper-rtf", type=float, default=0.05, help="Stub Whisper real-time factor")
+    parser.add_argument("--workdir", help="Directory the app runs in (default: a temporary one)")
+    parser.add_argument("--log-level", default="ERROR", help="App log level during the run (shedding logs warnings)")
+    parser.add_argument("--output", help="Write the result JSON here")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Store the result as benchmarks/baselines/NAME.json")
+    parser.add_argument("--baseline", metavar="NAME", help="Compare with a stored baseline (name or path)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Latency increase below which no regression is reported")
+    args = parser.parse_args(argv)
+
+    if args.traffic:
+        traffic = load_traffic(args.traffic)
+        description = os.path.basename(args.traffic)
+    else:
+        history = tuple(int(turns) for turns in args.history.split(","))
+        traffic = synthesize_traffic(args.requests, parse_mix(args.mix), args.seed, args.sessions, history)
+        description = f"synthetic {args.mix} seed={args.seed}"
+    if args.save_traffic:
+        save_traffic(args.save_traffic, traffic)
+
+    previous_cwd = os.getcwd()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="load_test_")
+    _prepare_environment(workdir)
+    try:
+        if not args.real_models:
+            from benchmarks.stub_models import install_stub_models
+            install_stub_models(args.generate_ms, args.whisper_rtf)
+        result = asyncio.run(run_load_test(args, traffic))
+    finally:
+        os.chdir(previous_cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.timed:
+        mode = f"timed x{args.speed:g}"
+    elif args.rate:
+        mode = f"{args.rate:g} req/s"
+    else:
+        mode = f"concurrency {args.concurrency}"
+    result = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "traffic": description,
+        "models": "real" if args.real_models else "stub",
+        "stub": None if args.real_models else {"generate_ms": args.generate_ms, "whisper_rtf": args.whisper_rtf},
+        "mode": mode,
+        **result,
+    }
+    print_report(result)
+
+    exit_code = 0
+    if args.baseline:
+        path = baseline_path(args.baseline)
+        with open(path, "r") as f:
+            baseline = json.load(f)
+        if (baseline.get("models"), baseline.get("traffic")) != (result["models"], result["traffic"]):
+            print(f"\nWarning: {path} was recorded with {baseline.get('models')} models on "
+                  f"{baseline.get('traffic')!r}; the numbers may not be comparable")
+        changes = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        print_comparison(changes, path)
+        result["comparison"] = {"baseline": path, "changes": changes}
+        if any(change["regression"] for change in changes):
+            exit_code = 1
+    for path in filter(None, [args.output, args.save_baseline and baseline_path(args.save_baseline)]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.batching import MicroBatcher
+from app.core.config import settings
+from app.core.executor import inference_executor
+from app.services.audio import WHISPER_SAMPLE_RATE
+from app.services.tts_service import split_sentences
+
+# Replies of the stub generator, picked by prompt so a run is reproducible
+STUB_REPLIES = [
+    "Our chef would be glad to help with that.",
+    "Let me find out for you. Is there anything else I can do?",
+    "That sounds lovely. Would you like to hear tonight's specials?",
+    "We can certainly arrange that for your table.",
+]
+
+
+class StubGenerator:
+    """
+    Stands in for GenerationService: same interface and micro-batching,
+    but each batch costs ``batch_ms`` of sleep on an inference thread
+    instead of a GPT-2 forward pass
+    """
+
+    def __init__(self, batch_ms: float = 40.0):
+        self.model_name = "stub"
+        self.batch_seconds = batch_ms / 1000
+        self._histories: Dict[str, int] = {}
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            inference_executor,
+            max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+            max_wait_ms=settings.GENERATION_MAX_WAIT_MS,
+        )
+
+    def build_prompt(self, session_id: Optional[str], conversation_history: list, user_input: str) -> List[int]:
+        words = [word for message in conversation_history for word in message["content"].split()]
+        words += user_input.split()
+        if session_id is not None:
+            self._histories[session_id] = len(words)
+        return [zlib.crc32(word.encode("utf-8")) % 50257 for word in words]
+
+    async def generate(self, input_ids: List[int], session_id: Optional[str] = None) -> str:
+        return await self.batcher.submit((session_id, input_ids))
+
+    def forget(self, session_id: str):
+        self._histories.pop(session_id, None)
+
+    def _generate_batch(self, requests: List[Tuple[Optional[str], List[int]]]) -> List[str]:
+        time.sleep(self.batch_seconds)
+        return [STUB_REPLIES[sum(ids) % len(STUB_REPLIES)] for _, ids in requests]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "batching": self.batcher.stats(), "sessions": len(self._histories)}
+
+
+class StubWhisper:
+    """
+    Stands in for a Whisper model: transcribing takes ``real_time_factor``
+    times the audio's duration
+    """
+
+    def __init__(self, real_time_factor: float = 0.05, text: str = "I'd like to order the grilled salmon please"):
+        self.real_time_factor = real_time_factor
+        self.text = text
+
+    def transcribe(self, samples, **options) -> Dict[str, Any]:
+        time.sleep(len(samples) / WHISPER_SAMPLE_RATE * self.real_time_factor)
+        return {"text": self.text, "segments": [{"avg_logprob": -0.25}]}
+
+
+class _StubVoiceConfig:
+    sample_rate = 22050
+
+
+class StubVoice:
+    """
+    Stands in for a PiperVoice: silence, 60ms of audio per word
+    """
+
+    config = _StubVoiceConfig()
+
+    def synthesize_stream_raw(self, text: str):
+        for sentence in split_sentences(text):
+            yield bytes(len(sentence.split()) * int(self.config.sample_rate * 0.06) * 2)
+
+
+def install_stub_models(generate_batch_ms: float = 40.0, whisper_real_time_factor: float = 0.05):
+    """
+    Register the stubs under the registry names of the real models. Must run
+    before the app is imported: the registry keeps the first factory
+    registered for a name.
+    """
+    from app.core.registry import registry
+    from app.services.speech_service import whisper_registry_name
+    from app.services.tts_service import piper_registry_name
+
+    registry.register("text_generator", lambda: StubGenerator(generate_batch_ms), eager=True)
+    tiers = [settings.WHISPER_MODEL] + [name.strip() for name in settings.WHISPER_TIERS.split(",") if name.strip()]
+    for tier in tiers:
+        registry.register(whisper_registry_name(tier, settings.WHISPER_QUANTIZE_INT8),
+                          lambda: StubWhisper(whisper_real_time_factor), eager=True)
+    registry.register(piper_registry_name(settings.TTS_VOICE), StubVoice, eager=True)
@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import wave
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.audio import (
+    AudioDecodeError, AudioStreamBuffer, AudioTooLongError, decode_audio, is_compressed, parse_wav_header,
+)
+
+def make_wav(samples, sample_rate, width, channels=1):
+    if width == 1:
+        frames = (samples * 127 + 128).astype(np.uint8)
+    else:
+        ints = (samples * (2 ** (8 * width - 1) - 1)).astype(np.int32)
+        frames = ints.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :width]
+    frames = np.repeat(frames.reshape(len(samples), -1), channels, axis=0)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(frames.tobytes())
+    return buffer.getvalue()
+
+def test_audio_decoding():
+    print("Testing In-Memory Audio Decoding")
+    print("-" * 50)
+
+    t = np.arange(8000) / 8000
+    signal = 0.5 * np.sin(2 * np.pi * 200 * t)
+    for width, channels in [(1, 1), (2, 1), (2, 2), (3, 1), (4, 2)]:
+        samples = decode_audio(make_wav(signal, 8000, width, channels))
+        print(f"{width * 8}-bit x{channels} WAV at 8 kHz -> {len(samples)} samples, peak {samples.max():.3f}")
+        assert samples.dtype == np.float32
+        assert len(samples) == 16000
+        assert abs(samples.max() - 0.5) < 0.02
+
+    raw = (signal * 32767).astype("<i2").tobytes()
+    samples = decode_audio(raw, raw_sample_rate=8000)
+    print(f"Raw PCM at 8 kHz -> {len(samples)} samples")
+    assert len(samples) == 16000
+
+    # Without a raw sample rate, headerless data is never read as PCM: an unknown
+    # container (here a truncated AIFF) goes to ffmpeg instead of turning into noise
+    try:
+        decode_audio(b"FORM\0\0\0\x2eAIFFCOMM" + raw[:64])
+        assert False, "truncated AIFF decoded as raw PCM"
+    except AudioDecodeError as e:
+        print(f"Truncated AIFF -> {e}")
+
+    assert is_compressed(b"OggS" + b"\0" * 20)
+    assert is_compressed(b"\0\0\0\x20ftypM4A ")
+    assert not is_compressed(raw)
+    print("-" * 50)
+
+def test_stream_buffer():
+    buffer = AudioStreamBuffer(max_bytes=1000, initial_capacity=16)
+    for i in range(100):
+        buffer.append(bytes([i]) * 7)
+    assert len(buffer) == 700
+    assert bytes(buffer.view()[:14]) == b"\x00" * 7 + b"\x01" * 7
+    try:
+        buffer.append(b"\x00" * 301)
+        assert False, "expected AudioTooLongError"
+    except AudioTooLongError:
+        pass
+
+def test_wav_header():
+    wav = make_wav(np.zeros(100), 8000, 2)
+    fmt = parse_wav_header(wav)
+    print(f"Parsed WAV header: {fmt}")
+    assert (fmt.channels, fmt.sample_rate, fmt.sample_width, fmt.data_offset) == (1, 8000, 2, 44)
+    assert parse_wav_header(wav[:30]) is None
+
+if __name__ == "__main__":
+    test_audio_decoding()
+    test_stream_buffer()
+    test_wav_header()
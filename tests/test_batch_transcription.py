@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.batch_transcription import BatchTranscriptionService, _transcribe_recordings
+
+RATE = 16000
+WINDOW = 30 * RATE
+
+class ScriptedDecoder:
+    """
+    Stands in for Whisper: a recording's samples hold the id of the word
+    spoken at that instant (0 is silence). Each window decodes to
+    ``<|start|> word <|end|>`` segments; a word still going at the end of a
+    full window gets only its start timestamp and a cut-off token, the way
+    Whisper leaves an unfinished segment.
+    """
+    timestamp_begin = 50000
+    CUT = 1000
+
+    def __init__(self):
+        self.batches = []
+
+    def decode(self, windows):
+        self.batches.append(len(windows))
+        results = []
+        for window in windows:
+            tokens = []
+            edges = np.flatnonzero(np.diff(np.concatenate([[0], window, [0]])))
+            for start, end in zip(edges[:-1], edges[1:]):
+                word = int(window[start])
+                if word == 0:
+                    continue
+                tokens.append(self.timestamp_begin + start // 320)
+                if end == len(window) and len(window) == WINDOW:
+                    tokens.append(word + self.CUT)
+                else:
+                    tokens += [word, self.timestamp_begin + end // 320]
+            results.append((tokens, "en"))
+        return results
+
+    def text(self, tokens):
+        return " ".join(f"w{t}" if t < self.CUT else f"w{t - self.CUT}-cut" for t in tokens)
+
+def speech(words, seconds):
+    """Samples for ``(word, start, end)`` spans in seconds"""
+    samples = np.zeros(int(seconds * RATE), dtype=np.float32)
+    for word, start, end in words:
+        samples[int(start * RATE):int(end * RATE)] = word
+    return samples
+
+def fake_transcribe_batch(items, batch_size, language):
+    time.sleep(0.01)
+    return [{"name": name, "text": f"{len(source)} bytes"} for name, source in items]
+
+async def run_batch_checks():
+    service = BatchTranscriptionService(workers=2, batch_size=3, executor=ThreadPoolExecutor(max_workers=2),
+                                        transcribe_batch=fake_transcribe_batch)
+    items = [(f"call-{i}.wav", b"x" * i) for i in range(10)]
+    job = service.submit(items)
+    print(f"Submitted: {job.to_dict()}")
+
+    streamed = [result async for result in job.stream()]
+    print(f"Finished: {job.to_dict()}")
+    assert job.status == "completed"
+    assert sorted(result["index"] for result in streamed) == list(range(10))
+    assert all(result["text"] == f"{result['index']} bytes" for result in streamed)
+    assert service.get(job.job_id).to_dict()["completed"] == 10
+
+    try:
+        service.resolve_manifest(["../etc/passwd"])
+        assert False, "expected ValueError"
+    except ValueError as e:
+        print(f"Rejected manifest entry: {e}")
+    service.shutdown()
+
+def test_window_boundaries():
+    print("\nTesting Speech Across a Window Boundary")
+    print("-" * 50)
+
+    decoder = ScriptedDecoder()
+    # Word 3 runs from 29 s to 31 s, across the first 30-second window's end
+    crossing = speech([(1, 1, 5), (2, 10, 20), (3, 29, 31), (4, 40, 50), (5, 62, 64)], 70)
+    short = speech([(7, 2, 4)], 10)
+    transcripts = _transcribe_recordings([crossing, short], batch_size=4, decoder=decoder)
+    print(f"Transcripts: {transcripts}, batch sizes: {decoder.batches}")
+    # The cut-off word is dropped and decoded whole from the next window
+    assert transcripts[0] == ("w1 w2 w3 w4 w5", "en")
+    assert transcripts[1] == ("w7", "en")
+    # The recordings' windows were batched together until the short one was done
+    assert decoder.batches[0] == 2 and all(size == 1 for size in decoder.batches[1:])
+
+def test_batch_transcription():
+    print("Testing Batch Transcription Jobs")
+    print("-" * 50)
+    asyncio.run(run_batch_checks())
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_batch_transcription()
+    test_window_boundaries()
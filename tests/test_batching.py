@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.batching import MicroBatcher
+from app.core.executor import InferenceExecutor
+
+async def run_batching_checks():
+    batch_sizes = []
+
+    def process_batch(items):
+        batch_sizes.append(len(items))
+        return [item.upper() for item in items]
+
+    executor = InferenceExecutor(max_workers=1, max_queue=4, timeout=5, retry_after=1)
+    batcher = MicroBatcher(process_batch, executor, max_batch_size=4, max_wait_ms=20)
+
+    results = await asyncio.gather(*[batcher.submit(f"prompt {i}") for i in range(6)])
+    print(f"Results: {results}")
+    print(f"Batch sizes: {batch_sizes}")
+    assert results == [f"PROMPT {i}" for i in range(6)]
+    assert batch_sizes == [4, 2]
+
+    stats = batcher.stats()
+    print(f"Batcher stats: {stats}")
+    assert stats["batches"] == 2
+    executor.shutdown()
+
+def test_batching():
+    print("Testing Micro-batching")
+    print("-" * 50)
+    asyncio.run(run_batching_checks())
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_batching()
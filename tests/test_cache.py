@@ -0,0 +1,37 @@
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.cache import TTLCache
+
+def test_cache():
+    print("Testing Response Cache")
+    print("-" * 50)
+
+    now = [0.0]
+    cache = TTLCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    calls = []
+    value = cache.get_or_set("menu", lambda: calls.append(1) or "Our menu")
+    value = cache.get_or_set("menu", lambda: calls.append(1) or "Our menu")
+    print(f"Value: {value}, factory calls: {len(calls)}")
+    assert len(calls) == 1
+
+    cache.set("hours", "9-5")
+    cache.set("location", "Main St")
+    print(f"Evicted least recently used: {cache.get('menu') is None}")
+    assert cache.get("menu") is None
+
+    now[0] = 11.0
+    print(f"Expired after TTL: {cache.get('hours') is None}")
+    assert cache.get("hours") is None
+
+    stats = cache.stats()
+    print(f"Cache stats: {stats}")
+    assert stats["hits"] == 1
+    assert stats["evictions"] == 1
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_cache()
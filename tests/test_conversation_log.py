@@ -0,0 +1,148 @@
+import os
+import sys
+import tempfile
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.conversation import Conversation, ConversationLog, Message
+from app.services.conversation_manager import ConversationManager
+from app.services.conversation_wal import ConversationWAL
+from app.services.prompt_builder import PromptBuilder
+from app.services.session_backends import MemorySessionBackend
+
+class CountingTokenizer:
+    """One token per character, counting how many characters were encoded"""
+    def __init__(self):
+        self.encoded_chars = 0
+
+    def encode(self, text, add_special_tokens=False):
+        self.encoded_chars += len(text)
+        return [ord(c) for c in text]
+
+def test_conversation_log():
+    print("Testing Conversation Log")
+    print("-" * 50)
+
+    log = ConversationLog()
+    for i in range(10):
+        log.append("user", f"message {i}")
+    assert [entry.offset for entry in log.last(3)] == [7, 8, 9]
+    assert [entry.content for entry in log.since(8)] == ["message 8", "message 9"]
+
+    # Compaction drops from the front; offsets stay the same
+    assert log.compact(4) == 6
+    print(f"After compaction: base={log.base}, end={log.end}, {len(log)} entries")
+    assert log.base == 6 and log.end == 10
+    assert log.last(2)[0].offset == 8 and log.last(2)[0]["content"] == "message 8"
+    assert [entry.offset for entry in log.since(0)] == [6, 7, 8, 9]
+    assert log.content_bytes == sum(len(entry.content) for entry in log.entries())
+
+    # An abandoned turn's message is taken back; the next one reuses its offset
+    assert log.pop().content == "message 9" and log.end == 9
+    assert log.append("user", "retry").offset == 9
+    assert log.content_bytes == sum(len(entry.content) for entry in log.entries())
+
+def test_timestamps():
+    print("\nTesting Per-Message Timestamps")
+    print("-" * 50)
+
+    first = Conversation(session_id="a", business_type="restaurant")
+    first.add_message("user", "hello")
+    time.sleep(0.01)
+    second = Conversation(session_id="b", business_type="restaurant")
+    second.add_message("user", "hello")
+    # Defaults are taken when each object is created, not once at import
+    assert second.created_at > first.created_at
+    assert second.log.last(1)[0].timestamp > first.log.last(1)[0].timestamp
+    assert first.log.last(1)[0].role is second.log.last(1)[0].role
+    api_messages = first.messages + second.messages
+    print(f"API messages: {api_messages}")
+    assert isinstance(api_messages[0], Message) and api_messages[1].timestamp > api_messages[0].timestamp
+    assert Message(role="user", content="x").timestamp > api_messages[1].timestamp
+
+def test_windowed_prompt():
+    print("\nTesting Windowed History in the Prompt Builder")
+    print("-" * 50)
+
+    manager = ConversationManager(MemorySessionBackend(100, 1 << 20, 600), max_messages=12, history_window=6)
+    tokenizer = CountingTokenizer()
+    builder = PromptBuilder(tokenizer, context_tokens=400, max_new_tokens=50, max_sessions=10)
+    for turn in range(30):
+        with manager.turn("caller", "restaurant") as conversation:
+            conversation.add_message("user", f"question {turn}")
+            history = manager.recent_history(conversation)
+            assert len(history) <= 6
+            before = tokenizer.encoded_chars
+            prompt = builder.build("caller", history, f"question {turn}")
+            encoded = tokenizer.encoded_chars - before
+            conversation.add_message("assistant", f"answer {turn}")
+        # The window slides and the log compacts, but only the new turns are tokenized
+        if turn > 0:
+            assert encoded <= len("assistant: answer 99\n") + len("user: question 99\n")
+
+    text = "".join(chr(t) for t in prompt)
+    print(f"Final prompt: {text!r}")
+    assert text.endswith("assistant: answer 28\nuser: question 29\nassistant:")
+    print(f"Manager stats: {manager.stats()}")
+    assert manager.compactions > 0
+
+def test_wal_recovery():
+    print("\nTesting Write-Ahead Log Recovery")
+    print("-" * 50)
+
+    path = os.path.join(tempfile.mkdtemp(), "sessions.wal")
+    manager = ConversationManager(MemorySessionBackend(100, 1 << 20, 600), max_messages=8,
+                                  wal=ConversationWAL(path))
+    for turn in range(10):
+        with manager.turn("caller-1", "restaurant") as conversation:
+            conversation.add_message("user", f"question {turn}")
+            conversation.add_message("assistant", f"answer {turn}")
+            if turn % 3 == 0:
+                conversation.update_context("sentiment", {"label": "positive", "turn": turn})
+    with manager.turn("caller-2", "restaurant") as conversation:
+        conversation.add_message("user", "hello")
+        conversation.update_context("order", ["Tiramisu"])
+    records = manager.wal.records
+    with manager.turn("caller-2", "restaurant") as conversation:
+        pass
+    # An unchanged context isn't written again
+    assert manager.wal.records == records
+    with manager.turn("caller-3", "restaurant") as conversation:
+        conversation.add_message("user", "bye")
+    manager.end_conversation("caller-3")
+    print(f"WAL after 12 turns: {manager.stats()['wal']}")
+    # Simulate a crash: no checkpoint, just drop the file handle
+    manager.wal.close()
+
+    restarted = ConversationManager(MemorySessionBackend(100, 1 << 20, 600), max_messages=8,
+                                    wal=ConversationWAL(path))
+    caller_1 = restarted.get_conversation("caller-1")
+    print(f"Recovered caller-1: base={caller_1.log.base}, {len(caller_1.log)} messages")
+    # Compacted turns stay compacted and offsets carry on where they left off
+    assert caller_1.log.end == 20 and len(caller_1.log) <= 8
+    assert caller_1.log.last(1)[0].content == "answer 9"
+    assert restarted.get_conversation("caller-2").log.last(1)[0].content == "hello"
+    # The context comes back as of its last change
+    assert caller_1.context == {"sentiment": {"label": "positive", "turn": 9}}
+    assert restarted.get_conversation("caller-2").context == {"order": ["Tiramisu"]}
+    assert restarted.get_conversation("caller-3") is None
+
+    # A torn final record is skipped rather than failing recovery
+    with restarted.turn("caller-2", "restaurant") as conversation:
+        conversation.add_message("assistant", "hi there")
+    restarted.wal.close()
+    with open(path, "a") as f:
+        f.write('["m","caller-2",2,"user","trunc')
+    again = ConversationManager(MemorySessionBackend(100, 1 << 20, 600), wal=ConversationWAL(path))
+    assert [entry.content for entry in again.get_conversation("caller-2").log.entries()] == ["hello", "hi there"]
+    # ...and survives the checkpoint the restart wrote
+    assert again.get_conversation("caller-2").context == {"order": ["Tiramisu"]}
+    again.close()
+
+if __name__ == "__main__":
+    test_conversation_log()
+    test_timestamps()
+    test_windowed_prompt()
+    test_wal_recovery()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.executor import ExecutorSaturatedError, InferenceExecutor
+
+async def run_executor_checks():
+    executor = InferenceExecutor(max_workers=1, max_queue=1, timeout=0.2, retry_after=3)
+
+    result = await executor.run(lambda x: x * 2, 21)
+    print(f"Result: {result}")
+    assert result == 42
+
+    try:
+        await executor.run(time.sleep, 0.5)
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    print(f"Timed out: {timed_out}")
+    assert timed_out
+
+    # The timed-out call still holds the only worker; one more may queue, the next is shed
+    queued = asyncio.ensure_future(executor.run(time.sleep, 0.1, timeout=None))
+    await asyncio.sleep(0)
+    try:
+        await executor.run(time.sleep, 0.1)
+        rejected = None
+    except ExecutorSaturatedError as e:
+        rejected = e.retry_after
+    print(f"Rejected with retry_after: {rejected}")
+    assert rejected == 3
+    await queued
+
+    stats = executor.stats()
+    print(f"Executor stats: {stats}")
+    assert stats["timed_out"] == 1
+    assert stats["rejected"] == 1
+    executor.shutdown()
+
+def test_executor():
+    print("Testing Inference Executor")
+    print("-" * 50)
+    asyncio.run(run_executor_checks())
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_executor()
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.intent_matcher import IntentMatcher
+
+def test_intent_matcher():
+    print("Testing Intent Matcher")
+    print("-" * 50)
+
+    matcher = IntentMatcher()
+    matcher.add("reply", "main_courses", ["main", "dish"], priority=1)
+    matcher.add("reply", "allergens", ["allergic"], priority=2)
+    matcher.add("reply", "allergies", ["allergic to", "can't eat"], priority=3)
+    matcher.add("sentiment", "negative", ["cold"])
+
+    cases = {
+        "What main dishes do you have?": "main_courses",
+        "Can I remain on hold?": None,
+        "I'm allergic to nuts": "allergens",
+        "I can’t eat shellfish": "allergies",
+    }
+    for text, expected in cases.items():
+        intent = matcher.best(text, "reply")
+        print(f"{text!r} -> {intent}")
+        assert intent == expected
+
+    overlapping = [match.intent for match in matcher.match("I'm allergic to nuts", "reply")]
+    print(f"All intents for overlapping phrases: {overlapping}")
+    assert overlapping == ["allergens", "allergies"]
+
+    assert matcher.match("Please don't scold me", "sentiment") == []
+    assert [m.intent for m in matcher.match("The soup was cold", "sentiment")] == ["negative"]
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_intent_matcher()
@@ -12,6 +12,7 @@ async def test_knowledge_service():
     print(f"Testing Knowledge Service for business type: {settings.BUSINESS_TYPE}")
     
     knowledge_service = KnowledgeService()
+    await knowledge_service.sync_retriever()
     
     # Test queries
     queries = [
@@ -0,0 +1,91 @@
+import os
+import random
+import sys
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.knowledge_index import KnowledgeIndex
+
+RESTAURANT = {
+    "menu": {
+        "appetizers": [
+            {"name": "Bruschetta", "price": 8.99},
+            {"name": "Calamari", "price": 12.99},
+        ],
+        "main_courses": [
+            {"name": "Pasta Carbonara", "price": 16.99},
+            {"name": "Grilled Salmon", "price": 22.99},
+        ],
+        "desserts": [
+            {"name": "Tiramisu", "price": 7.99},
+            {"name": "Chocolate Cake", "price": 6.99},
+        ],
+    },
+    "hours": "Monday-Sunday: 11am-10pm",
+    "contact": "555-123-4567",
+}
+
+def names(index, question):
+    return [record["name"] for record in index.search(index.parse(question))]
+
+def test_restaurant_queries():
+    print("Testing Knowledge Index (restaurant)")
+    print("-" * 50)
+
+    index = KnowledgeIndex(RESTAURANT)
+    for question in ["dishes under $10", "any desserts under 7?", "main courses between 15 and 20",
+                     "how much is the tiramisu", "tell me about the choclate cake"]:
+        print(f"{question!r}: {index.parse(question).to_dict()} -> {names(index, question)}")
+
+    assert names(index, "dishes under $10") == ["Chocolate Cake", "Tiramisu", "Bruschetta"]
+    assert names(index, "any desserts under 7?") == ["Chocolate Cake"]
+    assert names(index, "main courses between 15 and 20") == ["Pasta Carbonara"]
+    assert names(index, "how much is the tiramisu") == ["Tiramisu"]
+    # Misspelled names still match
+    assert names(index, "tell me about the choclate cake") == ["Chocolate Cake"]
+    # Prefixes only complete names; in free text they'd misfire ("call" -> "Calamari")
+    assert index.complete("cal") == ["Calamari"]
+    assert not index.parse("can I call you")
+    # Whole sections and topics without records aren't record queries
+    assert index.is_section("menu") and not index.is_section("desserts")
+    assert not index.parse("what are your hours")
+
+def test_real_estate_ranges():
+    print("\nTesting Knowledge Index (real estate, 5,000 listings)")
+    print("-" * 50)
+
+    rng = random.Random(7)
+    listings = [{"id": str(i), "type": rng.choice(["House", "Apartment", "Condo"]),
+                 "address": f"{i} Oak St", "price": rng.randrange(100, 900) * 1000,
+                 "bedrooms": rng.randint(1, 5), "square_feet": rng.randrange(600, 4000, 50)}
+                for i in range(5000)]
+    started = time.perf_counter()
+    index = KnowledgeIndex({"properties": listings, "agents": [{"name": "Jane Doe"}]})
+    print(f"Indexed {len(index.records)} records in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    for _ in range(100):
+        matches = index.search(index.parse("2-bedroom houses under 300k"))
+    print(f"'2-bedroom houses under 300k': {len(matches)} matches, "
+          f"{(time.perf_counter() - started) * 10:.2f} ms per query")
+    expected = [l for l in listings if l["bedrooms"] == 2 and l["type"] == "House" and l["price"] <= 300000]
+    assert sorted(m["id"] for m in matches) == sorted(l["id"] for l in expected)
+    assert [m["price"] for m in matches] == sorted(m["price"] for m in matches)
+
+    matches = index.search(index.parse("condos with at least 3000 square feet"))
+    assert matches and all(m["type"] == "Condo" and m["square_feet"] >= 3000 for m in matches)
+    assert [m["name"] for m in index.search(index.parse("who is jane"))] == ["Jane Doe"]
+
+    # An update that only touches the agents reuses the parsed listings
+    started = time.perf_counter()
+    updated = KnowledgeIndex({"properties": listings, "agents": [{"name": "Jane Doe"}, {"name": "Sam Lee"}]}, index)
+    print(f"Reindexed after an agent update in {(time.perf_counter() - started) * 1000:.1f} ms")
+    assert updated.reparsed == 1 and len(updated.records) == len(index.records) + 1
+    assert sorted(m["id"] for m in updated.search(updated.parse("2-bedroom houses under 300k"))) == \
+        sorted(l["id"] for l in expected)
+
+if __name__ == "__main__":
+    test_restaurant_queries()
+    test_real_estate_ranges()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.knowledge_store import KnowledgeStore
+
+BASE = {"menu": {"desserts": [{"name": "Tiramisu", "price": 7.99}]}, "hours": "11am-10pm"}
+
+def test_log_and_snapshot():
+    print("Testing Knowledge Store")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "knowledge_restaurant.json")
+    # A plain knowledge base file from before the change log is loaded as the snapshot
+    with open(path, "w") as f:
+        json.dump(BASE, f)
+
+    store = KnowledgeStore(path, snapshot_every=3)
+    knowledge_base = store.load()
+    assert knowledge_base == BASE and store.seq == 0
+    for hours in ["10am-10pm", "9am-10pm"]:
+        store.append({"hours": hours})
+    store.append({"menu": {"drinks": [{"name": "Lemonade", "price": 3}]}})
+    print(f"After 3 updates: {store.stats()}")
+    assert store.needs_snapshot
+
+    # Restart: the snapshot is untouched and the log is replayed on top of it
+    with open(path) as f:
+        assert json.load(f) == BASE
+    restarted = KnowledgeStore(path, snapshot_every=3)
+    replayed = restarted.load()
+    assert replayed["hours"] == "9am-10pm" and "drinks" in replayed["menu"] and restarted.seq == 3
+
+    # Snapshot, then one more update; a torn final line from a crash is ignored
+    restarted.snapshot(json.dumps(replayed), restarted.seq)
+    restarted.append({"contact": "555-0100"})
+    with open(restarted.log_path, "a") as f:
+        f.write('{"seq":5,"update":{"hours":"tor')
+    print(f"Log after snapshot: {open(restarted.log_path).read()!r}")
+    final_store = KnowledgeStore(path)
+    final = final_store.load()
+    assert final["contact"] == "555-0100" and final["hours"] == "9am-10pm"
+    # ...and cut off, so the next append starts on a line of its own
+    final_store.append({"hours": "8am-10pm"})
+    assert KnowledgeStore(path).load()["hours"] == "8am-10pm"
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+def test_concurrent_updates():
+    print("\nTesting Concurrent Knowledge Base Updates")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.services.knowledge_service import KnowledgeService
+
+        async def run():
+            service = KnowledgeService()
+            updates = [{"menu": {f"special_{i}": [{"name": f"Special {i}", "price": i}]}} for i in range(20)]
+            results = await asyncio.gather(*(service.update_knowledge_base(update) for update in updates))
+            assert all(results)
+            print(f"Store after 20 concurrent updates: {service.store.stats()}")
+            service.close()
+            return service.knowledge_base
+
+        in_memory = asyncio.run(run())
+        # Every update survives a restart exactly once
+        reloaded = KnowledgeService()
+        assert reloaded.knowledge_base == in_memory
+        assert sum(1 for key in reloaded.knowledge_base["menu"] if key.startswith("special_")) == 20
+        reloaded.close()
+    finally:
+        os.chdir(previous)
+
+def test_workers_share_updates():
+    print("\nTesting Knowledge Base Updates Across Workers")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.services.knowledge_service import KnowledgeService
+
+        async def run():
+            # Two services on one store stand in for two worker processes
+            first, second = KnowledgeService(), KnowledgeService()
+            first.store.snapshot_every = second.store.snapshot_every = 3
+            before = second.snapshot
+            assert await first.update_knowledge_base({"hours": "9am-11pm"})
+            assert await second.refresh()
+            assert second.knowledge_base["hours"] == "9am-11pm" and not await second.refresh()
+            # Copy-on-write: the old snapshot is intact and untouched sections are shared
+            assert before.knowledge_base["hours"] != "9am-11pm"
+            assert second.knowledge_base["menu"] is before.knowledge_base["menu"]
+
+            # An update from a worker that is behind applies the missed updates first
+            assert await second.update_knowledge_base({"contact": "555-0100"})
+            assert await first.update_knowledge_base({"location": "1 Elm St"})
+            assert first.knowledge_base["contact"] == "555-0100" and first.store.seq == 3
+            # ...and a snapshot written meanwhile is picked up by the other worker
+            assert os.path.getsize(first.store.log_path) == 0
+            assert await second.refresh()
+            print(f"Second worker after reload: {second.stats()}")
+            assert second.knowledge_base == first.knowledge_base and second.store.seq == 3
+            first.close()
+            second.close()
+
+        asyncio.run(run())
+    finally:
+        os.chdir(previous)
+
+def test_stale_snapshot_is_skipped():
+    print("\nTesting Snapshots From a Worker That Fell Behind")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "knowledge_restaurant.json")
+    with open(path, "w") as f:
+        json.dump(BASE, f)
+    first, second = KnowledgeStore(path), KnowledgeStore(path)
+    first.load()
+    second.load()
+    first.append({"hours": "9am-11pm"})
+    (_, entries), seq = second.append({"location": "1 Elm St"})
+    assert seq == 2 and entries == [(1, {"hours": "9am-11pm"})]
+    second.snapshot(json.dumps({**BASE, "hours": "9am-11pm", "location": "1 Elm St"}), 2)
+    # The first worker never saw update 2: its snapshot must not replace the newer one
+    first.snapshot(json.dumps({**BASE, "hours": "9am-11pm"}), 1)
+    reloaded = KnowledgeStore(path).load()
+    print(f"Reloaded: {reloaded}")
+    assert reloaded["location"] == "1 Elm St" and reloaded["hours"] == "9am-11pm"
+    assert first.snapshots == 0 and second.snapshots == 1
+
+def test_stored_update_is_retried():
+    print("\nTesting an Update Stored but Not Yet Applied")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.services.knowledge_service import KnowledgeService
+
+        async def run():
+            service = KnowledgeService()
+            sync = service.retriever.sync
+
+            def unavailable(documents):
+                raise ConnectionError("index unreachable")
+
+            # The update is logged, so it is reported as stored even though applying it failed
+            service.retriever.sync = unavailable
+            assert await service.update_knowledge_base({"hours": "9am-11pm"})
+            assert service.knowledge_base["hours"] != "9am-11pm"
+            restarted = KnowledgeService()
+            assert restarted.knowledge_base["hours"] == "9am-11pm"
+            restarted.close()
+            # A later update builds on the one still waiting to be applied
+            assert await service.update_knowledge_base({"contact": "555-0100"})
+
+            service.retriever.sync = sync
+            assert await service.retry_publish() and not await service.retry_publish()
+            print(f"After the retry: {service.knowledge_base['hours']}, {service.knowledge_base['contact']}")
+            assert service.knowledge_base["hours"] == "9am-11pm" and service.knowledge_base["contact"] == "555-0100"
+            service.close()
+
+        asyncio.run(run())
+    finally:
+        os.chdir(previous)
+
+if __name__ == "__main__":
+    test_log_and_snapshot()
+    test_concurrent_updates()
+    test_workers_share_updates()
+    test_stale_snapshot_is_skipped()
+    test_stored_update_is_retried()
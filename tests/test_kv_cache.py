@@ -0,0 +1,162 @@
+import os
+import sys
+
+import torch
+from transformers import DynamicCache, GPT2Config, GPT2LMHeadModel
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.generation_service import GenerationService
+from app.services.kv_cache import SessionKVCache, cache_nbytes, slice_cache
+
+class CharTokenizer:
+    """One token per ASCII character; token 0 is padding"""
+    pad_token_id = 0
+    pad_token = eos_token = "\0"
+    padding_side = "right"
+
+    def encode(self, text, add_special_tokens=False):
+        return [ord(c) % 128 or 1 for c in text]
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(int(i)) for i in ids if int(i) != self.pad_token_id)
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return [self.decode(row) for row in rows]
+
+def make_cache(length, layers=2, fill=0.0):
+    cache = DynamicCache()
+    for layer in range(layers):
+        cache.update(torch.full((1, 2, length, 4), fill), torch.full((1, 2, length, 4), fill), layer)
+    return cache
+
+def make_service():
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=128, n_positions=512, n_embd=32, n_layer=2, n_head=2,
+                        initializer_range=0.5, bos_token_id=None, eos_token_id=None)
+    return GenerationService("tiny-gpt2", model=GPT2LMHeadModel(config), tokenizer=CharTokenizer(), do_sample=False)
+
+def test_take_put_discard():
+    print("Testing Session KV Cache")
+    print("-" * 50)
+
+    kv_cache = SessionKVCache(max_bytes=10 ** 6, min_reuse_tokens=4)
+    tokens = list(range(1, 21))
+    assert kv_cache.take("a", tokens) is None  # Nothing cached yet
+    kv_cache.put("a", tokens, make_cache(20))
+
+    # The whole cached sequence is a prefix: one token is always left to run
+    cache, prefix = kv_cache.take("a", tokens)
+    assert prefix == 19 and cache.get_seq_length() == 19
+    # Taking removes the entry until it is put back
+    assert kv_cache.take("a", tokens) is None
+
+    # A prompt that diverges after 10 tokens crops the cache to the common prefix
+    kv_cache.put("a", tokens, make_cache(20))
+    cache, prefix = kv_cache.take("a", tokens[:10] + [99] * 10)
+    assert prefix == 10 and cache.get_seq_length() == 10
+
+    # Diverging before min_reuse_tokens is a miss
+    kv_cache.put("a", tokens, make_cache(20))
+    assert kv_cache.take("a", tokens[:3] + [99] * 17) is None
+
+    kv_cache.put("b", tokens, make_cache(20))
+    kv_cache.discard("b")
+    assert kv_cache.take("b", tokens) is None
+    stats = kv_cache.stats()
+    print(f"Stats: {stats}")
+    assert stats["sessions"] == 0 and stats["bytes"] == 0
+    assert stats["hits"] == 2 and stats["reused_tokens"] == 29
+
+def test_lru_byte_budget():
+    print("\nTesting KV Cache Byte Budget")
+    print("-" * 50)
+
+    entry_bytes = cache_nbytes(make_cache(10))
+    kv_cache = SessionKVCache(max_bytes=entry_bytes * 3, min_reuse_tokens=1)
+    tokens = list(range(1, 11))
+    for session in "abc":
+        kv_cache.put(session, tokens, make_cache(10))
+    # Touch "a" so "b" is the least recently used
+    kv_cache.put("a", tokens, kv_cache.take("a", tokens)[0])
+    kv_cache.put("d", tokens, make_cache(10))
+    stats = kv_cache.stats()
+    print(f"Stats: {stats}")
+    assert stats["bytes"] <= stats["max_bytes"] and stats["evictions"] == 1
+    assert kv_cache.take("b", tokens) is None
+    assert kv_cache.take("a", tokens) is not None
+
+    # A cache larger than the whole budget is never stored
+    kv_cache.put("e", list(range(1, 101)), make_cache(100))
+    assert kv_cache.stats()["sessions"] == 2 and kv_cache.take("e", tokens) is None
+
+def test_slice_cache():
+    print("\nTesting Cache Row Slicing")
+    print("-" * 50)
+
+    cache = DynamicCache()
+    keys = torch.arange(2 * 1 * 6 * 1, dtype=torch.float).view(2, 1, 6, 1)
+    cache.update(keys, keys + 100, 0)
+    sliced = slice_cache(cache, 1, 2, 5)
+    assert sliced.get_seq_length() == 3
+    assert sliced.layers[0].keys.flatten().tolist() == [8.0, 9.0, 10.0]
+    assert sliced.layers[0].values.flatten().tolist() == [108.0, 109.0, 110.0]
+
+def test_cached_generation():
+    print("\nTesting Generation With Reused KV Cache")
+    print("-" * 50)
+
+    service = make_service()
+    fresh = make_service()
+    encode = service.tokenizer.encode
+    # Different lengths, so the shorter prompt is left-padded in the first batch
+    prompts = {"short": encode("user: do you have a table for two?\nassistant:"),
+               "long": encode("user: what are your opening hours on a sunday evening?\nassistant:")}
+    replies = service._generate_batch(list(prompts.items()))
+    assert service.kv_cache.stats()["sessions"] == 2
+
+    # Follow-ups extend each prompt with the reply, so the sliced rows are reused
+    follow_ups = {session: prompts[session] + encode(reply + "\nuser: thanks!\nassistant:")
+                  for session, reply in zip(prompts, replies)}
+    calls = []
+    generate = service.model.generate
+    service.model.generate = lambda **kwargs: calls.append(kwargs["input_ids"].shape) or generate(**kwargs)
+    cached = service._generate_batch(list(follow_ups.items()))
+    service.model.generate = generate
+    expected = fresh._generate_batch([(None, ids) for ids in follow_ups.values()])
+    stats = service.kv_cache.stats()
+    print(f"Replies: {cached}")
+    print(f"Stats: {stats}")
+    assert stats["hits"] == 2 and stats["reused_tokens"] >= sum(len(ids) for ids in prompts.values())
+    assert cached == expected
+    # Both hits, with different cached prefixes, were continued in a single call
+    assert len(calls) == 1 and calls[0][0] == 2
+
+    # Each session's reused prefix matches the fresh single-prompt run too
+    for session, ids in follow_ups.items():
+        assert fresh._generate_batch([(None, ids)]) == [cached[list(follow_ups).index(session)]]
+
+    # The caches gathered out of the padded hit batch are reused on the turn after
+    third = {session: follow_ups[session] + encode(reply + "\nuser: bye\nassistant:")
+             for session, reply in zip(follow_ups, cached)}
+    assert service._generate_batch(list(third.items())) == fresh._generate_batch([(None, ids) for ids in third.values()])
+    assert service.kv_cache.stats()["hits"] == 4
+
+    # An edited turn crops the cache back to the common prefix
+    edited = follow_ups["short"][:20] + encode(" six?\nassistant:")
+    before = service.kv_cache.stats()["reused_tokens"]
+    assert service._generate_batch([("short", edited)]) == fresh._generate_batch([(None, edited)])
+    assert service.kv_cache.stats()["reused_tokens"] - before == 20
+
+    # Diverging from the first token falls back to a full run
+    rewritten = encode("system: new conversation\nassistant:")
+    misses = service.kv_cache.stats()["misses"]
+    assert service._generate_batch([("long", rewritten)]) == fresh._generate_batch([(None, rewritten)])
+    assert service.kv_cache.stats()["misses"] == misses + 1
+
+if __name__ == "__main__":
+    test_take_put_discard()
+    test_lru_byte_budget()
+    test_slice_cache()
+    test_cached_generation()
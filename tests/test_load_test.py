@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from benchmarks.load_test import (
+    compare, load_traffic, parse_mix, save_traffic, summarize, synthesize_traffic, websocket_exchange,
+)
+
+def test_synthetic_traffic():
+    print("Testing Synthetic Traffic Mixes")
+    print("-" * 50)
+
+    mix = parse_mix("sms=3,voice_input=1")
+    assert mix == {"sms": 0.75, "voice_input": 0.25}
+    traffic = synthesize_traffic(2000, mix, seed=1, sessions=20, history_lengths=(1, 4, 12))
+    # The same seed replays the same traffic
+    assert traffic == synthesize_traffic(2000, mix, seed=1, sessions=20, history_lengths=(1, 4, 12))
+    sms = [entry for entry in traffic if entry["kind"] == "sms"]
+    assert 0.7 < len(sms) / len(traffic) < 0.8
+    turns = {}
+    for entry in sms:
+        turns[entry["from"]] = turns.get(entry["from"], 0) + 1
+    lengths = sorted(set(turns.values()))
+    print(f"{len(turns)} SMS conversations, lengths {lengths}")
+    assert lengths[0] == 1 and lengths[-1] == 12
+
+    path = os.path.join(tempfile.mkdtemp(), "traffic.jsonl")
+    save_traffic(path, traffic[:10])
+    assert load_traffic(path) == traffic[:10]
+
+def test_summary_and_comparison():
+    print("\nTesting Summaries and Baseline Comparison")
+    print("-" * 50)
+
+    summary = summarize([i / 1000 for i in range(1, 101)], errors=1, shed=2, duration=2.0)
+    print(summary)
+    assert summary["count"] == 100 and summary["throughput_rps"] == 50.0
+    assert summary["p50_ms"] == 50.5 and summary["p99_ms"] == 99.01
+
+    baseline = {"overall": {"throughput_rps": 100.0, "p95_ms": 200.0, "p99_ms": 0.5},
+                "kinds": {}, "memory": {"growth_mb": 4.0}}
+    result = {"overall": {"throughput_rps": 80.0, "p95_ms": 210.0, "p99_ms": 0.9},
+              "kinds": {}, "memory": {"growth_mb": 40.0}}
+    flagged = {change["metric"] for change in compare(result, baseline, tolerance=0.15) if change["regression"]}
+    # Throughput fell 20% and memory grew; p95 is within tolerance and p99 only grew by jitter
+    assert flagged == {"throughput_rps", "growth_mb"}
+
+def test_websocket_exchange():
+    print("\nTesting In-Process WebSocket Client")
+    print("-" * 50)
+
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket, mode: str = "file"):
+        await websocket.accept()
+        try:
+            while True:
+                data = await websocket.receive_bytes()
+                await websocket.send_json({"mode": mode, "bytes": len(data)})
+        except WebSocketDisconnect:
+            pass
+
+    replies = asyncio.run(websocket_exchange(app, "/ws", [b"abc", b"de"], "mode=stream"))
+    print(replies)
+    assert replies == [{"mode": "stream", "bytes": 3}, {"mode": "stream", "bytes": 2}]
+
+if __name__ == "__main__":
+    test_synthetic_traffic()
+    test_summary_and_comparison()
+    test_websocket_exchange()
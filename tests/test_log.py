@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueListener
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.log import (
+    BoundedQueueHandler, JSONFormatter, RecordSampler, RequestLogContext, TextFormatter, log_stats, setup_logging,
+    shutdown_logging,
+)
+
+class _Lines(logging.Handler):
+    def __init__(self, formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+def _logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+def test_redaction_and_caps():
+    print("Testing Redacted, Size-Capped Records")
+    print("-" * 50)
+
+    lines = _Lines(JSONFormatter(max_field_chars=40))
+    logger = _logger("test.log.redaction", lines)
+    logger.info("Shedding SMS from %s", "+15551234567",
+                extra={"from_number": "+15551234567", "body": "My card is 4111 1111", "note": "x" * 100})
+    entry = json.loads(lines.lines[0])
+    print(entry)
+    assert entry["message"] == "Shedding SMS from ***4567"
+    assert entry["from_number"] == "***4567" and entry["body"] == "<20 chars>"
+    assert entry["note"] == "x" * 40 + "...(+60 chars)"
+    assert "4111" not in lines.lines[0] and "1234567" not in lines.lines[0]
+
+    text = _Lines(TextFormatter())
+    _logger("test.log.text", text).warning("Missing fields", extra={"session_id": "+15557654321"})
+    print(text.lines[0])
+    assert text.lines[0].endswith("test.log.text - WARNING - Missing fields session_id=***4321")
+
+def test_queue_never_blocks():
+    print("\nTesting Bounded Log Queue")
+    print("-" * 50)
+
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2))
+    logger = _logger("test.log.queue", handler)
+    items = ["a"]
+    logger.info("Items: %s", items)
+    # Arguments are interpolated when the record is queued, not when it is written
+    items.append("b")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+    for _ in range(3):
+        logger.info("Overflow")
+    assert handler.dropped == 3
+
+    lines = _Lines(JSONFormatter())
+    listener = QueueListener(handler.queue, lines)
+    listener.start()
+    listener.stop()
+    print(lines.lines)
+    assert json.loads(lines.lines[0])["message"] == "Items: ['a']"
+    assert "ValueError: boom" in json.loads(lines.lines[1])["exception"]
+
+def test_request_sampling():
+    print("\nTesting Per-Request Sampling")
+    print("-" * 50)
+
+    lines = _Lines(JSONFormatter())
+    sampler = RecordSampler()
+    lines.addFilter(sampler)
+    logger = _logger("test.log.sampling", lines)
+
+    async def endpoint(scope, receive, send):
+        logger.info("Processing SMS")
+        logger.warning("Shedding SMS")
+
+    async def run(sample_rate):
+        await RequestLogContext(endpoint, sample_rate)({"type": "http"}, None, None)
+
+    asyncio.run(run(0.0))
+    asyncio.run(run(1.0))
+    logger.info("Outside any request")
+    messages = [json.loads(line) for line in lines.lines]
+    print(messages)
+    # The unsampled request keeps only its warning; every record from a request carries its id
+    assert [entry["message"] for entry in messages] == ["Shedding SMS", "Processing SMS", "Shedding SMS",
+                                                         "Outside any request"]
+    assert messages[0]["request_id"] != messages[1]["request_id"] == messages[2]["request_id"]
+    assert "request_id" not in messages[3] and sampler.sampled_out == 1
+
+def test_shutdown_and_restart():
+    print("\nTesting Logging Shutdown and Restart")
+    print("-" * 50)
+
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    try:
+        setup_logging()
+        assert any(isinstance(handler, BoundedQueueHandler) for handler in root.handlers)
+        shutdown_logging()
+        # Records logged after the listener stopped are written directly, not queued and dropped
+        assert not any(isinstance(handler, BoundedQueueHandler) for handler in root.handlers) and root.handlers
+        dropped = log_stats()["dropped"]
+        logging.getLogger("test.log.shutdown").error("Logged after shutdown")
+        stats = log_stats()
+        assert stats["queued"] == 0 and stats["dropped"] == dropped
+
+        # A restarted app queues again, with a single handler on the root logger
+        setup_logging()
+        print(root.handlers)
+        assert len(root.handlers) == 1 and isinstance(root.handlers[0], BoundedQueueHandler)
+        shutdown_logging()
+        shutdown_logging()
+    finally:
+        root.handlers, root.level = saved
+
+if __name__ == "__main__":
+    test_redaction_and_caps()
+    test_queue_never_blocks()
+    test_request_sampling()
+    test_shutdown_and_restart()
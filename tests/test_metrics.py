@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.metrics import Gauge, Histogram, Metrics
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def test_histogram():
+    print("Testing Latency Histogram")
+    print("-" * 50)
+
+    histogram = Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 2.0):
+        histogram.observe(value, ("generate",))
+    lines = histogram.render()
+    print("\n".join(lines))
+    # Buckets are cumulative and "le" is inclusive
+    assert 'demo_seconds_bucket{stage="generate",le="0.01"} 2' in lines
+    assert 'demo_seconds_bucket{stage="generate",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{stage="generate",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="generate"} 4' in lines
+    assert lines[1] == "# TYPE demo_seconds histogram"
+
+def test_traces_and_slow_log():
+    print("\nTesting Pipeline Traces")
+    print("-" * 50)
+
+    metrics = Metrics(slow_request_ms=20, slow_request_sample_rate=1.0)
+    metrics.register(Gauge("demo_queue_depth", "Demo gauge", lambda: 3))
+    handler = _Records()
+    logging.getLogger("app.slow_requests").addHandler(handler)
+
+    @metrics.traced("sms")
+    async def handle(slow: bool) -> str:
+        with metrics.span("intent"):
+            pass
+        metrics.annotate("reply", "model" if slow else "rule")
+        if slow:
+            with metrics.span("generate"):
+                await asyncio.sleep(0.03)
+        return "ok"
+
+    async def run():
+        # Concurrent requests keep their own traces
+        assert await asyncio.gather(handle(True), handle(False), handle(False)) == ["ok"] * 3
+
+    asyncio.run(run())
+    # Spans outside any request still count, under the "other" pipeline
+    with metrics.span("stt"):
+        pass
+    text = metrics.render()
+    print(text)
+    assert 'agent_request_duration_seconds_count{pipeline="sms",reply="rule"} 2' in text
+    assert 'agent_request_duration_seconds_count{pipeline="sms",reply="model"} 1' in text
+    assert 'agent_stage_duration_seconds_count{pipeline="sms",stage="intent"} 3' in text
+    assert 'agent_stage_duration_seconds_count{pipeline="other",stage="stt"} 1' in text
+    assert 'agent_slow_requests_total{pipeline="sms"} 1' in text
+    assert "demo_queue_depth 3" in text
+
+    # Only the slow request is logged, with its spans
+    assert len(handler.messages) == 1 and '"stage": "generate"' in handler.messages[0]
+    print(f"Slow request log: {handler.messages[0]}")
+
+if __name__ == "__main__":
+    test_histogram()
+    test_traces_and_slow_log()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.registry import registry
+from app.services.prompt_bank import PromptBank
+from app.services.tts_service import AudioCache, TTSService
+from tests.test_tts import _ToneVoice
+
+def test_prompt_bank():
+    print("Testing Prompt Bank")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.services.knowledge_service import KnowledgeService
+        from app.services.language_service import LanguageService
+
+        knowledge_service = KnowledgeService()
+        language_service = LanguageService()
+        # Point the language service at this test's knowledge base rather than the shared one
+        registry.release("knowledge_service")
+        language_service.knowledge_service = knowledge_service
+        tts = TTSService(AudioCache(os.path.join(directory, "cache"), 10 * 1024 * 1024, 1024 * 1024))
+        voice = _ToneVoice()
+        tts.models[tts.voice] = voice
+        greeting = "Hello! Thanks for calling."
+        now = [0.0]
+        bank = PromptBank(tts, language_service, os.path.join(directory, "prompts"), [greeting], "https://example.com",
+                          grace_seconds=600, clock=lambda: now[0])
+
+        async def run():
+            first = await bank.build()
+            print(f"First build: {first}")
+            texts = bank.texts()
+            assert first["rendered"] == len(texts) == voice.calls
+            assert bank.url(greeting).startswith("https://example.com/prompts/")
+            dessert_line = language_service._handle_menu_category("desserts")
+            assert "Tiramisu" in dessert_line and bank.url(dessert_line) is not None
+            assert bank.url("Something the model generated") is None
+
+            # A restart finds the rendered files and synthesizes nothing
+            restarted = PromptBank(tts, language_service, bank.directory, [greeting], "https://example.com")
+            assert (await restarted.build())["rendered"] == 0
+
+            # Another voice's files share the directory and are never touched by this bank
+            other_voice = os.path.join(bank.directory, "en_GB-alan-low")
+            os.makedirs(other_voice)
+            open(os.path.join(other_voice, "prompt.wav"), "wb").close()
+
+            # A menu change re-renders only the dessert line...
+            await knowledge_service.update_knowledge_base(
+                {"menu": {"desserts": [{"name": "Gelato", "price": 4.99}]}})
+            assert bank._dirty.is_set()
+            second = await bank.build()
+            print(f"After a menu update: {second}")
+            assert second == {"prompts": len(texts), "rendered": 1, "removed": 0}
+            assert bank.url(dessert_line) is None
+            assert "Gelato" in language_service._handle_menu_category("desserts")
+            # ...and keeps the old file for workers that haven't reloaded yet, until the grace period is over
+            voice_directory = os.path.dirname(os.path.join(bank.directory, bank._filename(tts.voice, greeting)))
+            assert len(os.listdir(voice_directory)) == len(texts) + 1
+            now[0] += 601
+            assert (await bank.build())["removed"] == 1
+            assert len(os.listdir(voice_directory)) == len(texts)
+            assert os.listdir(other_voice) == ["prompt.wav"]
+
+        asyncio.run(run())
+        knowledge_service.close()
+    finally:
+        os.chdir(previous)
+
+if __name__ == "__main__":
+    test_prompt_bank()
@@ -0,0 +1,83 @@
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.conversation import ConversationLog
+from app.services.prompt_builder import PromptBuilder
+
+class CountingTokenizer:
+    """One token per character, counting how many characters were encoded"""
+    def __init__(self):
+        self.encoded_chars = 0
+
+    def encode(self, text, add_special_tokens=False):
+        self.encoded_chars += len(text)
+        return [ord(c) for c in text]
+
+def test_prompt_builder():
+    print("Testing Prompt Builder")
+    print("-" * 50)
+
+    tokenizer = CountingTokenizer()
+    builder = PromptBuilder(tokenizer, context_tokens=200, max_new_tokens=50, max_sessions=10)
+    history = []
+    for turn in range(20):
+        history.append({"role": "user", "content": f"question {turn}"})
+        before = tokenizer.encoded_chars
+        prompt = builder.build("session", history, f"question {turn}")
+        encoded = tokenizer.encoded_chars - before
+        history.append({"role": "assistant", "content": f"answer {turn}"})
+        assert len(prompt) <= 200 - 50
+        # Only the newest turns are tokenized, never the whole history
+        assert encoded <= len("assistant: answer 99\n") + len("user: question 99\n")
+
+    text = "".join(chr(t) for t in prompt)
+    print(f"Final prompt ({len(prompt)} tokens): {text!r}")
+    assert text.startswith("Conversation:\n")
+    assert text.endswith("user: question 19\nassistant:")
+    assert "question 0\n" not in text
+    print(f"Builder stats: {builder.stats()}")
+
+    # A recorded user turn longer than the whole budget is cut down, never dropped
+    history.append({"role": "user", "content": "x" * 300 + " the actual question"})
+    prompt = builder.build("session", history, history[-1]["content"])
+    text = "".join(chr(t) for t in prompt)
+    print(f"Oversized turn prompt ({len(prompt)} tokens): {text[-60:]!r}")
+    assert len(prompt) <= 200 - 50 and text.endswith("the actual question\nassistant:")
+    print("-" * 50)
+
+def test_repeated_messages():
+    print("\nTesting Repeated Identical Messages")
+    print("-" * 50)
+
+    tokenizer = CountingTokenizer()
+    builder = PromptBuilder(tokenizer, context_tokens=400, max_new_tokens=50, max_sessions=10)
+    log = ConversationLog()
+    for turn in range(6):
+        log.append("user", "yes", timestamp=turn)
+        before = tokenizer.encoded_chars
+        prompt = builder.build("session", log.last(20), "yes")
+        # The same text again is still just the new turn, not a reason to start over
+        assert tokenizer.encoded_chars - before <= len("assistant: ok\n") + len("user: yes\n")
+        log.append("assistant", "ok", timestamp=turn + 0.5)
+    text = "".join(chr(t) for t in prompt)
+    print(f"Prompt after six identical turns: {text!r}")
+    assert text.count("user: yes\n") == 6 and text.endswith("user: yes\nassistant:")
+
+    # A new conversation on the same session whose latest turn repeats the old text
+    replaced = ConversationLog()
+    replaced.append("user", "hello", timestamp=100)
+    for offset in range(1, len(log) - 2):
+        replaced.append("assistant" if offset % 2 else "user", "ok" if offset % 2 else "hi", timestamp=100 + offset)
+    replaced.append("user", "yes", timestamp=200)
+    assert len(replaced) == len(log) - 1
+    text = "".join(chr(t) for t in builder.build("session", replaced.last(20), "yes"))
+    print(f"Prompt for the replaced conversation: {text!r}")
+    assert text.startswith("Conversation:\nuser: hello\n") and text.count("user: yes\n") == 1
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_prompt_builder()
+    test_repeated_messages()
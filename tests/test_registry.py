@@ -0,0 +1,41 @@
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.registry import ModelRegistry
+
+def test_registry():
+    print("Testing Model Registry")
+    print("-" * 50)
+
+    loads = []
+    registry = ModelRegistry()
+    registry.register("model", lambda: loads.append(1) or object())
+
+    first = registry.acquire("model")
+    second = registry.acquire("model")
+    print(f"Loads after two acquires: {len(loads)}")
+    assert first is second
+    assert len(loads) == 1
+
+    registry.release("model")
+    registry.release("model")
+    print(f"Loaded after releasing all references: {registry.peek('model') is not None}")
+    assert registry.peek("model") is None
+
+    registry.startup()
+    registry.acquire("model")
+    registry.release("model")
+    print(f"Loaded while serving with no references: {registry.peek('model') is not None}")
+    assert registry.peek("model") is not None
+
+    report = registry.memory_report()
+    print(f"Memory report: {report}")
+    registry.shutdown()
+    assert registry.peek("model") is None
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_registry()
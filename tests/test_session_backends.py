@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.conversation_manager import ConversationManager
+from app.services.session_backends import SQLiteSessionBackend, decode_conversation, encode_conversation
+
+def test_sqlite_backend():
+    print("Testing SQLite Session Backend")
+    print("-" * 50)
+
+    path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    now = [1000.0]
+    clock = lambda: now[0]
+    # Two managers on one file stand in for two uvicorn workers
+    worker_a = ConversationManager(SQLiteSessionBackend(path, 100, 1 << 20, 600, clock=clock))
+    worker_b = ConversationManager(SQLiteSessionBackend(path, 100, 1 << 20, 600, clock=clock))
+    ended = []
+    worker_b.add_end_listener(ended.append)
+
+    with worker_a.turn("+15551234567", "restaurant") as conversation:
+        conversation.add_message("user", "Do you have vegan options?")
+        conversation.update_context("sentiment", {"label": "neutral"})
+        conversation.add_message("assistant", "Yes, several.")
+
+    with worker_b.turn("+15551234567", "restaurant") as conversation:
+        print(f"Worker B sees {len(conversation.messages)} messages")
+        assert [m.role for m in conversation.messages] == ["user", "assistant"]
+        assert conversation.context["sentiment"] == {"label": "neutral"}
+        conversation.add_message("user", "Great, book a table")
+
+    history = worker_a.get_conversation_history("+15551234567")
+    assert history[-1]["content"] == "Great, book a table"
+
+    stats = worker_a.stats()
+    print(f"Worker A stats: {stats}")
+    assert stats["reads"] == 2 and stats["writes"] == 1
+
+    now[0] += 601
+    assert worker_b.backend.sweep() == 1
+    assert ended == ["+15551234567"]
+    assert worker_a.get_conversation("+15551234567") is None
+    print("-" * 50)
+
+def test_encoding():
+    manager = ConversationManager()
+    conversation = manager.create_conversation("restaurant", "session")
+    for i in range(50):
+        conversation.add_message("user" if i % 2 else "assistant", f"turn {i} about the menu")
+    data = encode_conversation(conversation)
+    print(f"50-message conversation encodes to {len(data)} bytes")
+    restored = decode_conversation("session", data)
+    assert [m.content for m in restored.messages] == [m.content for m in conversation.messages]
+    assert restored.messages[3].timestamp.timestamp() == round(conversation.messages[3].timestamp.timestamp(), 3)
+
+def test_overlapping_turns():
+    print("\nTesting Overlapping Turns on Two Workers")
+    print("-" * 50)
+
+    path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    worker_a = ConversationManager(SQLiteSessionBackend(path, 100, 1 << 20, 600))
+    worker_b = ConversationManager(SQLiteSessionBackend(path, 100, 1 << 20, 600))
+    with worker_a.turn("+15551234567", "restaurant") as conversation:
+        conversation.add_message("user", "Hi")
+        conversation.add_message("assistant", "Hello!")
+
+    # Both workers load the conversation before either stores its reply
+    with worker_a.turn("+15551234567", "restaurant") as first:
+        with worker_b.turn("+15551234567", "restaurant") as second:
+            second.add_message("user", "Is the patio open?")
+            second.add_message("assistant", "Yes, until 9pm.")
+            second.update_context("topic", "patio")
+        first.add_message("user", "Table for two at 7?")
+        first.add_message("assistant", "Booked.")
+
+    history = [entry["content"] for entry in worker_b.get_conversation_history("+15551234567")]
+    print(f"Stored history: {history}")
+    assert history == ["Hi", "Hello!", "Is the patio open?", "Yes, until 9pm.", "Table for two at 7?", "Booked."]
+    assert worker_a.get_conversation("+15551234567").context["topic"] == "patio"
+    assert worker_a.backend.conflicts == 1 and [m.content for m in first.messages] == history
+
+if __name__ == "__main__":
+    test_sqlite_backend()
+    test_encoding()
+    test_overlapping_turns()
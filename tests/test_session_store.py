@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.session_store import SessionStore
+from app.services.conversation_manager import ConversationManager
+from app.services.session_backends import MemorySessionBackend
+
+def test_session_store():
+    print("Testing Session Store")
+    print("-" * 50)
+
+    now = [0.0]
+    evicted = []
+    store = SessionStore(max_sessions=3, max_bytes=1000, idle_ttl_seconds=60,
+                         on_evict=lambda key, reason: evicted.append((key, reason)),
+                         clock=lambda: now[0])
+    for key in "abcd":
+        store.set(key, key.upper(), 100)
+    assert evicted == [("a", "sessions")]
+
+    store.get("b")
+    store.resize("c", 850)
+    assert evicted[-1] == ("d", "bytes")
+
+    now[0] = 30.0
+    store.get("c")
+    now[0] = 70.0
+    assert store.sweep() == 1
+    assert evicted[-1] == ("b", "idle")
+    assert store.get("c") == "C"
+
+    print(f"Evicted: {evicted}")
+    print(f"Stats: {store.stats()}")
+    print("-" * 50)
+
+def test_conversation_compaction():
+    print("Testing Conversation Compaction")
+    print("-" * 50)
+
+    manager = ConversationManager(MemorySessionBackend(max_sessions=2, max_bytes=1 << 28, idle_ttl_seconds=1800),
+                                  max_messages=8)
+    ended = []
+    manager.add_end_listener(ended.append)
+
+    manager.create_conversation("restaurant", "caller")
+    for i in range(20):
+        manager.add_message("caller", "user", f"message {i}")
+    conversation = manager.get_conversation("caller")
+    print(f"Kept {len(conversation.messages)} messages, compacted {conversation.compacted_messages}")
+    assert len(conversation.messages) <= 8
+    assert conversation.compacted_messages + len(conversation.messages) == 20
+    assert conversation.messages[-1].content == "message 19"
+
+    manager.create_conversation("restaurant", "second")
+    manager.create_conversation("restaurant", "third")
+    assert ended == ["caller"]
+
+    async def sweep():
+        manager.backend.store.idle_ttl_seconds = 0.01
+        manager.start_sweeper(0.02)
+        await asyncio.sleep(0.1)
+        manager.stop_sweeper()
+
+    asyncio.run(sweep())
+    print(f"Stats: {manager.stats()}")
+    assert sorted(ended) == ["caller", "second", "third"]
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_session_store()
+    test_conversation_compaction()
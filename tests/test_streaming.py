@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.streaming_transcriber import AudioRingBuffer, StreamingTranscriber
+
+def tone(seconds, amplitude, sample_rate=16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes()
+
+async def run_streaming_checks():
+    events = []
+
+    async def transcribe(samples):
+        await asyncio.sleep(0.001)
+        return f"{len(samples) / 16000:.1f}s of speech"
+
+    async def send(event):
+        events.append(event)
+
+    transcriber = StreamingTranscriber(transcribe, send)
+    audio = tone(0.3, 0.0) + tone(1.5, 0.5) + tone(1.0, 0.0) + tone(0.8, 0.5)
+    chunk = 640  # 20 ms of 16-bit audio
+    for offset in range(0, len(audio), chunk):
+        transcriber.feed(audio[offset:offset + chunk])
+        await asyncio.sleep(0.002)
+    await transcriber.close()
+
+    for event in events:
+        print(event)
+    finals = [event for event in events if event["type"] == "final"]
+    partials = [event for event in events if event["type"] == "partial"]
+    assert len(finals) == 2
+    assert [event["segment"] for event in finals] == [0, 1]
+    assert partials and partials[0]["segment"] == 0
+    assert finals[0]["start"] < 0.3 < finals[0]["end"] <= 1.9
+
+def test_ring_buffer():
+    ring = AudioRingBuffer(capacity=5)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 7, dtype=np.float32))
+    assert ring.read(0, 7).tolist() == [2, 3, 4, 5, 6]
+    ring.write(np.arange(7, 20, dtype=np.float32))
+    assert ring.read(15, 20).tolist() == [15, 16, 17, 18, 19]
+
+def test_streaming():
+    print("Testing Streaming Transcription")
+    print("-" * 50)
+    asyncio.run(run_streaming_checks())
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_ring_buffer()
+    test_streaming()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.audio import parse_wav_header, pcm16_to_wav
+from app.services.tts_service import AudioCache, TTSService, split_sentences
+
+class _Config:
+    sample_rate = 22050
+
+class _ToneVoice:
+    """Stands in for a PiperVoice: 10ms of samples per character, counting calls"""
+    config = _Config()
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize_stream_raw(self, text):
+        self.calls += 1
+        time.sleep(0.01)
+        for sentence in split_sentences(text):
+            yield b"\x01\x00" * (len(sentence) * 220)
+
+def test_audio_cache():
+    print("Testing TTS Audio Cache")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    cache = AudioCache(directory, max_disk_bytes=3000, max_memory_bytes=2000)
+    keys = [cache.key("amy", f"line {i}") for i in range(4)]
+    assert len(set(keys)) == 4 and cache.key("amy", "line 0") != cache.key("lessac", "line 0")
+    for key in keys:
+        cache.put(key, bytes(1000))
+    # Three files fit on disk and two in memory; the oldest go first
+    stats = cache.stats()
+    print(f"After 4 puts: {stats}")
+    assert stats["disk_entries"] == 3 and stats["memory_entries"] == 2
+    assert not os.path.exists(cache.path(keys[0]))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) == bytes(1000) and cache.stats()["hits"]["disk"] == 1
+    assert cache.get(keys[1]) is not None and cache.stats()["hits"]["memory"] == 1
+
+    # A restart picks the files back up
+    restarted = AudioCache(directory, max_disk_bytes=3000, max_memory_bytes=2000)
+    assert restarted.stats()["disk_entries"] == 3 and restarted.get(keys[3]) == bytes(1000)
+
+def test_synthesis_is_cached():
+    print("\nTesting TTS Synthesis Cache and Streaming")
+    print("-" * 50)
+
+    service = TTSService(AudioCache(tempfile.mkdtemp(), 10 * 1024 * 1024, 1024 * 1024))
+    voice = _ToneVoice()
+    service.models[service.voice] = voice
+    greeting = "Hello! Welcome to our restaurant. How can I help you today?"
+    assert split_sentences(greeting) == ["Hello!", "Welcome to our restaurant.", "How can I help you today?"]
+
+    async def run():
+        # Concurrent requests for the same greeting share one synthesis
+        results = await asyncio.gather(*(service.synthesize(greeting) for _ in range(5)))
+        assert voice.calls == 1 and len({audio for _, audio in results}) == 1
+        fmt = parse_wav_header(results[0][1])
+        assert fmt.sample_rate == 22050 and fmt.sample_width == 2 and fmt.channels == 1
+
+        path = await service.text_to_speech(greeting)
+        with open(path, "rb") as f:
+            assert f.read() == results[0][1]
+        assert voice.calls == 1
+
+        # Streaming yields one chunk per sentence, then serves the cached utterance
+        menu = "We have pasta. We have salmon."
+        chunks = [chunk async for chunk in service.stream(menu)]
+        assert len(chunks) == 2 and voice.calls == 3
+        replayed = b"".join([chunk async for chunk in service.stream(menu)])
+        assert replayed == b"".join(chunks) and voice.calls == 3
+        _, audio = await service.synthesize(menu)
+        assert audio == pcm16_to_wav(replayed, 22050) and voice.calls == 3
+
+    asyncio.run(run())
+    print(f"Stats: {service.stats()}")
+
+if __name__ == "__main__":
+    test_audio_cache()
+    test_synthesis_is_cached()
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.knowledge_retriever import HashingEmbedder, KnowledgeRetriever
+from app.services.vector_index import LocalVectorIndex
+
+class FlakyRemoteIndex(LocalVectorIndex):
+    """A 'remote' index that fails every call while ``down``"""
+    remote = True
+    down = True
+
+    def upsert(self, vectors):
+        if self.down:
+            raise ConnectionError("index unreachable")
+        super().upsert(vectors)
+
+class CountingEmbedder(HashingEmbedder):
+    """Hashed embeddings, counting how many texts were embedded"""
+    def __init__(self, dimension):
+        super().__init__(dimension)
+        self.texts = 0
+
+    def embed(self, texts):
+        self.texts += len(texts)
+        return super().embed(texts)
+
+def test_local_index():
+    print("Testing Local Vector Index")
+    print("-" * 50)
+
+    index = LocalVectorIndex(3)
+    index.upsert([("a", [1, 0, 0], {"kind": "x"}), ("b", [0, 1, 0], {"kind": "y"}), ("c", [1, 1, 0], {"kind": "x"})])
+    matches = index.query([1, 0.1, 0], top_k=2)["matches"]
+    print(f"Matches: {matches}")
+    assert [m["id"] for m in matches] == ["a", "c"]
+    assert [m["id"] for m in index.query([0, 1, 0], top_k=1, filter={"kind": "x"})["matches"]] == ["c"]
+    assert [m["id"] for m in index.query([0, 1, 0], top_k=3, filter={"kind": {"$in": ["y"]}})["matches"]] == ["b"]
+
+    # Deleting moves the last row into the hole; ids must still resolve
+    index.delete(["a"])
+    index.upsert([("b", [0, 0, 1], None)])
+    assert index.describe_index_stats()["total_vector_count"] == 2
+    assert index.query([0, 0, 1], top_k=1)["matches"][0]["id"] == "b"
+    assert index.query([1, 1, 0], top_k=1)["matches"][0]["id"] == "c"
+
+def test_ann_recall():
+    print("\nTesting Clustered (ANN) Search")
+    print("-" * 50)
+
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(50, 64))
+    vectors = centers[rng.integers(0, 50, 20000)] + rng.normal(scale=0.3, size=(20000, 64))
+    exact = LocalVectorIndex(64, ann_min_vectors=10 ** 9)
+    ann = LocalVectorIndex(64, ann_min_vectors=10000, ann_probes=8)
+    records = [(str(i), vector, None) for i, vector in enumerate(vectors)]
+    exact.upsert(records)
+    ann.upsert(records)
+    assert ann.describe_index_stats()["ann_clusters"] > 0
+
+    queries = centers[rng.integers(0, 50, 200)] + rng.normal(scale=0.3, size=(200, 64))
+    started = time.perf_counter()
+    expected = exact.query_batch(queries, top_k=10)
+    exact_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    found = ann.query_batch(queries, top_k=10)
+    ann_ms = (time.perf_counter() - started) * 1000
+    recall = np.mean([len({m["id"] for m in e["matches"]} & {m["id"] for m in f["matches"]}) / 10
+                      for e, f in zip(expected, found)])
+    print(f"200 queries over 20,000 vectors: exact {exact_ms:.0f} ms, clustered {ann_ms:.0f} ms, recall@10 {recall:.2f}")
+    assert recall >= 0.9
+
+def test_incremental_sync():
+    print("\nTesting Incremental Re-embedding")
+    print("-" * 50)
+
+    embedder = CountingEmbedder(256)
+    retriever = KnowledgeRetriever(embedder, LocalVectorIndex(256))
+    documents = {f"menu:{name}": (f"{name} {description}", {"name": name}) for name, description in [
+        ("Tiramisu", "Classic Italian dessert with coffee and mascarpone"),
+        ("Calamari", "Fried squid rings with marinara sauce"),
+        ("Grilled Salmon", "Fresh salmon with lemon butter sauce"),
+    ]}
+    print(f"Initial sync: {retriever.sync(documents)}")
+    assert embedder.texts == 3
+    assert retriever.search("coffee dessert", top_k=1)[0]["name"] == "Tiramisu"
+    assert retriever.search("squid", top_k=1)[0]["name"] == "Calamari"
+
+    documents["menu:Calamari"] = ("Calamari Grilled squid with lemon", {"name": "Calamari"})
+    del documents["menu:Grilled Salmon"]
+    before = embedder.texts
+    result = retriever.sync(documents)
+    print(f"After changing one entry and removing one: {result}")
+    # Only the changed entry is embedded again
+    assert embedder.texts - before == 1 and result == {"embedded": 1, "removed": 1, "total": 2}
+    assert "Grilled Salmon" not in [match["name"] for match in retriever.search("salmon", top_k=5)]
+
+def test_digests_survive_restart():
+    print("\nTesting Re-embedding After a Restart")
+    print("-" * 50)
+
+    # A remote index outlives the process; two retrievers stand in for two runs
+    index = FlakyRemoteIndex(256)
+    index.down = False
+    digests_path = os.path.join(tempfile.mkdtemp(), "knowledge_restaurant.vectors.json")
+    documents = {f"menu:{name}": (name, {"name": name}) for name in ["Tiramisu", "Calamari", "Grilled Salmon"]}
+    KnowledgeRetriever(CountingEmbedder(256), index, digests_path=digests_path).sync(documents)
+
+    # Meanwhile one entry changed and one was removed
+    documents["menu:Calamari"] = ("Calamari Grilled squid", {"name": "Calamari"})
+    del documents["menu:Grilled Salmon"]
+    embedder = CountingEmbedder(256)
+    result = KnowledgeRetriever(embedder, index, digests_path=digests_path).sync(documents)
+    print(f"First sync after the restart: {result}")
+    assert embedder.texts == 1 and result == {"embedded": 1, "removed": 1, "total": 2}
+    assert index.describe_index_stats()["total_vector_count"] == 2
+
+    # Digests saved for another embedding are not trusted
+    embedder, other_index = CountingEmbedder(128), FlakyRemoteIndex(128)
+    other_index.down = False
+    KnowledgeRetriever(embedder, other_index, digests_path=digests_path).sync(documents)
+    assert embedder.texts == 2
+
+def test_startup_with_index_down():
+    print("\nTesting Startup With the Remote Index Down")
+    print("-" * 50)
+
+    directory = tempfile.mkdtemp()
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.services.knowledge_service import KnowledgeService
+
+        async def run():
+            service = KnowledgeService()
+            index = FlakyRemoteIndex(service.retriever.embedder.dimension)
+            service.retriever.index = index
+            # Startup neither waits for nor fails on the index
+            await service.start(interval=0.05)
+            await asyncio.sleep(0.01)
+            assert await service.semantic_search("something sweet with coffee") == []
+
+            # The watcher keeps retrying until the index is back
+            index.down = False
+            await asyncio.sleep(0.2)
+            matches = await service.semantic_search("something sweet with coffee", top_k=1)
+            print(f"After the index came back: {matches}")
+            assert matches and matches[0]["name"] == "Tiramisu"
+            service.close()
+
+        asyncio.run(run())
+    finally:
+        os.chdir(previous)
+
+if __name__ == "__main__":
+    test_local_index()
+    test_ann_recall()
+    test_incremental_sync()
+    test_digests_survive_restart()
+    test_startup_with_index_down()
@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.whisper_tiers import WhisperTierRouter, tier_rank
+
+def test_whisper_tiers():
+    print("Testing Whisper Tier Routing")
+    print("-" * 50)
+
+    assert tier_rank("tiny.en") < tier_rank("base") < tier_rank("large-v3")
+
+    now = [0.0]
+    depth = [0]
+    router = WhisperTierRouter("small", ["tiny", "base", "medium"], queue_depth=lambda: depth[0],
+                               queue_threshold=4, p95_threshold_ms=1000, window_seconds=60,
+                               clock=lambda: now[0])
+    print(f"Tiers: {router.tiers}")
+    assert router.tiers == ["tiny", "base", "small"]
+    assert router.choose() == "small"
+
+    depth[0] = 5
+    assert router.choose() == "base"
+
+    router.record("small", 2.5, 5.0, {"segments": [{"avg_logprob": -0.3}]})
+    assert router.choose() == "tiny"
+    depth[0] = 0
+    assert router.choose() == "base"
+
+    # Once the slow samples age out, traffic returns to the primary
+    now[0] = 61.0
+    assert router.choose() == "small"
+
+    stats = router.stats()["tiers"]
+    print(f"Stats: {stats}")
+    assert stats["base"]["routed_by_downgrade"] == 2
+    assert stats["small"]["avg_logprob"] == -0.3
+    print("-" * 50)
+
+if __name__ == "__main__":
+    test_whisper_tiers()